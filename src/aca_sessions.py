@@ -0,0 +1,182 @@
+import asyncio
+import atexit
+import threading
+from pathlib import Path
+from typing import Any, Callable, List
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock, CodeExecutor, CodeResult
+from autogen_ext.code_executors.azure import ACADynamicSessionsCodeExecutor
+from azure.core.credentials import AccessToken
+
+from executor_pool import CodeExecutorPool
+from token_cache import CachedTokenCredential
+
+DYNAMIC_SESSIONS_SCOPE = "https://dynamicsessions.io/.default"
+
+# Run in a returned session so the next task starts from an empty kernel and `/mnt/data`
+SESSION_RESET_CODE = """\
+import os, shutil
+os.chdir("/mnt/data")
+for _entry in os.listdir("."):
+    if os.path.isdir(_entry) and not os.path.islink(_entry):
+        shutil.rmtree(_entry, ignore_errors=True)
+    else:
+        os.remove(_entry)
+get_ipython().run_line_magic("reset", "-f")
+import os
+os.chdir("/mnt/data")
+"""
+
+
+class _CachedTokenProvider:
+    """
+    The synchronous `TokenProvider` the ACA executor expects, served from a `CachedTokenCredential`.
+
+    The token must have been fetched asynchronously beforehand, see `PinnedSessionExecutor.refresh_token`.
+    """
+
+    def __init__(self, credential: CachedTokenCredential) -> None:
+        self.credential = credential
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        token = self.credential.peek_token(DYNAMIC_SESSIONS_SCOPE)
+        if token is None:
+            raise RuntimeError("No dynamic sessions token was fetched before use.")
+        return token
+
+
+class PinnedSessionExecutor(ACADynamicSessionsCodeExecutor):
+    """
+    An `ACADynamicSessionsCodeExecutor` bound to one session identifier for its whole lifetime, so all
+    turns of a task, and the tasks that reuse it from a `CodeExecutorPool`, run in the same warm session.
+
+    The access token is refreshed from the shared credential before each execution instead of being
+    fetched once and kept past its expiry.
+    """
+
+    def __init__(
+        self,
+        pool_management_endpoint: str,
+        credential: CachedTokenCredential,
+        work_dir: Path,
+        session_id: str | None = None,
+        timeout: int = 60,
+    ) -> None:
+        """
+        Args:
+            pool_management_endpoint (str): The pool management endpoint of the ACA session pool.
+            credential (CachedTokenCredential): Provides the dynamic sessions tokens.
+            work_dir (Path): The local directory files are uploaded from and downloaded to.
+            session_id (str, optional): The session identifier. Defaults to a new one.
+            timeout (int, optional): Seconds a code block may run. Defaults to 60.
+        """
+        super().__init__(
+            pool_management_endpoint=pool_management_endpoint,
+            credential=_CachedTokenProvider(credential),
+            timeout=timeout,
+            work_dir=work_dir,
+        )
+        self._cached_credential = credential
+        if session_id is not None:
+            self._session_id = session_id
+
+    @property
+    def session_id(self) -> str:
+        return self._session_id
+
+    async def refresh_token(self) -> None:
+        """Fetches (or reuses) the dynamic sessions token and hands it to the executor."""
+        token = await self._cached_credential.get_token(DYNAMIC_SESSIONS_SCOPE)
+        self._access_token = token.token
+
+    async def start(self) -> None:
+        """Allocates the remote session, so its cold start happens while the pool is warmed."""
+        await self.execute_code_blocks(
+            [CodeBlock(code="print('ok')", language="python")], CancellationToken()
+        )
+
+    async def execute_code_blocks(
+        self, code_blocks: List[CodeBlock], cancellation_token: CancellationToken
+    ) -> CodeResult:
+        await self.refresh_token()
+        return await super().execute_code_blocks(code_blocks, cancellation_token)
+
+    async def restart(self) -> None:
+        # Keeps the session identifier; only the kernel and files are cleared
+        result = await self.execute_code_blocks(
+            [CodeBlock(code=SESSION_RESET_CODE, language="python")],
+            CancellationToken(),
+        )
+        if result.exit_code != 0:
+            raise RuntimeError(f"Failed to reset session: {result.output.strip()}")
+
+
+async def reset_session(executor: CodeExecutor) -> None:
+    await executor.restart()
+
+
+def create_aca_session_pool(
+    pool_management_endpoint: str,
+    credential: CachedTokenCredential,
+    executor_factory: Callable[..., CodeExecutor] = PinnedSessionExecutor,
+    **pool_options: Any,
+) -> CodeExecutorPool:
+    """
+    Creates a pool of ACA dynamic sessions, each with a persistent local workspace.
+
+    Args:
+        pool_management_endpoint (str): The pool management endpoint of the ACA session pool, or
+            of a local stand-in that implements its `code/execute` route.
+        credential (CachedTokenCredential): Provides the dynamic sessions tokens.
+        executor_factory (Callable[..., CodeExecutor], optional): Creates an executor from the endpoint,
+            credential and workspace. Defaults to `PinnedSessionExecutor`.
+        **pool_options (Any): Passed to `CodeExecutorPool`.
+
+    Returns:
+        CodeExecutorPool: The pool.
+    """
+    # Sessions are reclaimed by ACA after its cooldown period (5 minutes by default), so idle
+    # sessions are dropped before that rather than handed out cold
+    pool_options.setdefault("idle_timeout", 240)
+    pool_options.setdefault("health_check_interval", 120)
+    return CodeExecutorPool(
+        lambda work_dir: executor_factory(
+            pool_management_endpoint=pool_management_endpoint,
+            credential=credential,
+            work_dir=work_dir,
+        ),
+        reset=reset_session,
+        **pool_options,
+    )
+
+
+_aca_pools: dict[str, CodeExecutorPool] = {}
+_aca_pools_lock = threading.Lock()
+
+
+def get_aca_session_pool(
+    pool_management_endpoint: str,
+    credential: CachedTokenCredential,
+    min_idle: int = 0,
+) -> CodeExecutorPool:
+    """
+    Returns the process-wide pool of sessions of an ACA session pool, creating it on first use.
+
+    Args:
+        pool_management_endpoint (str): The pool management endpoint of the ACA session pool.
+        credential (CachedTokenCredential): Provides the dynamic sessions tokens.
+        min_idle (int, optional): The sessions the pool keeps warm ahead of the runs, if it is created
+            by this call. Defaults to 0.
+
+    Returns:
+        CodeExecutorPool: The pool.
+    """
+    with _aca_pools_lock:
+        pool = _aca_pools.get(pool_management_endpoint)
+        if pool is None:
+            pool = _aca_pools[pool_management_endpoint] = create_aca_session_pool(
+                pool_management_endpoint, credential, min_idle=min_idle
+            )
+            atexit.register(lambda pool=pool: asyncio.run(pool.close()))
+        return pool
@@ -0,0 +1,353 @@
+import asyncio
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+import asyncio_atexit
+from autogen_agentchat.base import ChatAgent
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient
+
+from client_wrappers import DelegatingChatCompletionClient
+
+if TYPE_CHECKING:
+    from magentic_one_helper import MagenticOneHelper
+
+AgentBuilder = Callable[
+    ["MagenticOneHelper", dict, ChatCompletionClient], Awaitable[ChatAgent]
+]
+"""Builds an agent from its configuration, given the helper of the run and the agent's model client."""
+
+
+async def reset_agent(agent: ChatAgent) -> None:
+    """
+    The default reset hook: clears what the agent remembers of its last run, e.g. its model context.
+
+    Args:
+        agent (ChatAgent): The agent.
+    """
+    await agent.on_reset(CancellationToken())
+
+
+@dataclass(frozen=True)
+class AgentFactory:
+    """How an agent type is built, and reset to be reused by the next run."""
+
+    build: AgentBuilder
+    reset: Callable[[ChatAgent], Awaitable[None]] | None = reset_agent
+    """Prepares the agent for another run, or None to build the agent for every run."""
+    settings: Callable[["MagenticOneHelper"], Any] | None = None
+    """The settings of the helper the builder uses besides the configuration, which a reused agent must share."""
+    streamed: bool = False
+    """Whether the agent's responses are streamed when the helper's `stream_model_output` is set."""
+
+
+@dataclass
+class AgentLease:
+    """An agent checked out of the `AgentRegistry` for a run."""
+
+    agent: ChatAgent
+    factory: AgentFactory
+    handle: DelegatingChatCompletionClient
+    """The agent's model client, pointed to the client of the run it is leased to."""
+    key: str | None
+    """The hash of the agent's configuration, or None if it is not reused."""
+    reused: bool = False
+    loop: asyncio.AbstractEventLoop | None = None
+
+
+class AgentRegistry:
+    """
+    A process-wide registry of agent types and of the agents idle between runs.
+
+    Each agent type registers an `AgentFactory`. Returned agents are reset and kept, keyed on the hash
+    of their configuration and on their event loop (e.g. the WebSurfer's browser is bound to it), so
+    a run with the same agent configuration reuses them instead of building them again. At most
+    `max_idle` agents are kept; the least recently returned are closed first.
+    """
+
+    def __init__(self, max_idle: int = 16) -> None:
+        """
+        Args:
+            max_idle (int, optional): The agents kept between runs. Defaults to 16.
+        """
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._factories: dict[tuple[str, str | None], AgentFactory] = {}
+        # Least recently returned first
+        self._idle: list[AgentLease] = []
+        self._hooked_loops: set[int] = set()
+        self._builds = 0
+        self._reuses = 0
+
+    def register(
+        self, agent_type: str, factory: AgentFactory, name: str | None = None
+    ) -> None:
+        """
+        Registers how to build the agents of a type, replacing any previous factory.
+
+        Args:
+            agent_type (str): The `type` of the agents' configurations.
+            factory (AgentFactory): The factory.
+            name (str, optional): Only for the agents of this `name`, e.g. the `MagenticOne` agents.
+                Defaults to None (any name).
+        """
+        with self._lock:
+            self._factories[(agent_type, name)] = factory
+
+    def factory(self, agent: dict) -> AgentFactory:
+        """
+        Returns the factory of an agent's configuration.
+
+        Args:
+            agent (dict): The agent's configuration.
+
+        Raises:
+            ValueError: Raises a ValueError if no factory is registered for the agent.
+
+        Returns:
+            AgentFactory: The factory.
+        """
+        with self._lock:
+            factory = self._factories.get(
+                (agent.get("type"), agent.get("name"))
+            ) or self._factories.get((agent.get("type"), None))
+        if factory is None:
+            raise ValueError(
+                f"Unknown agent {agent.get('name')!r} of type {agent.get('type')!r}."
+            )
+        return factory
+
+    def validate(self, agents: list[dict]) -> None:
+        """
+        Checks that every agent has a factory, before any of them is built.
+
+        Args:
+            agents (list[dict]): The agents' configurations.
+
+        Raises:
+            ValueError: Raises a ValueError naming all the unknown agents.
+        """
+        errors = []
+        for agent in agents:
+            try:
+                self.factory(agent)
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            raise ValueError(" ".join(errors))
+
+    async def acquire(
+        self,
+        helper: "MagenticOneHelper",
+        agent: dict,
+        model_client: ChatCompletionClient,
+    ) -> AgentLease:
+        """
+        Checks out an idle agent with the same configuration, or builds one.
+
+        Args:
+            helper (MagenticOneHelper): The helper of the run.
+            agent (dict): The agent's configuration.
+            model_client (ChatCompletionClient): The model client of the agent for this run.
+
+        Raises:
+            ValueError: Raises a ValueError if no factory is registered for the agent.
+
+        Returns:
+            AgentLease: The agent; return it with `release`.
+        """
+        factory = self.factory(agent)
+        loop = asyncio.get_running_loop()
+        key = None
+        if factory.reset is not None:
+            settings = factory.settings(helper) if factory.settings else None
+            key = hashlib.sha256(
+                json.dumps([agent, settings], sort_keys=True, default=str).encode()
+            ).hexdigest()
+            with self._lock:
+                for lease in reversed(self._idle):
+                    if lease.key == key and lease.loop is loop:
+                        self._idle.remove(lease)
+                        self._reuses += 1
+                        lease.handle.client = model_client
+                        lease.reused = True
+                        return lease
+
+        handle = DelegatingChatCompletionClient(model_client)
+        built = await factory.build(helper, agent, handle)
+        with self._lock:
+            self._builds += 1
+            if id(loop) not in self._hooked_loops:
+                self._hooked_loops.add(id(loop))
+                asyncio_atexit.register(self.aclose, loop=loop)
+        return AgentLease(built, factory, handle, key, loop=loop)
+
+    async def release(self, lease: AgentLease) -> None:
+        """
+        Resets an agent after its run and keeps it for the next one, or closes it if it is not reused
+        or its reset fails.
+
+        Args:
+            lease (AgentLease): The agent from `acquire`.
+        """
+        keep = lease.key is not None and lease.loop is asyncio.get_running_loop()
+        if keep:
+            try:
+                await lease.factory.reset(lease.agent)
+            except Exception as e:
+                print(f"Could not reset {lease.agent.name}, closing it: {e}")
+                keep = False
+        if not keep:
+            await lease.agent.close()
+            return
+
+        with self._lock:
+            self._idle.append(lease)
+            excess = len(self._idle) - self.max_idle
+            # Only the agents of this loop can be closed here; those of others go with their loop
+            evicted = [idle for idle in self._idle if idle.loop is lease.loop][
+                : max(0, excess)
+            ]
+            for idle in evicted:
+                self._idle.remove(idle)
+        for idle in evicted:
+            await idle.agent.close()
+
+    async def aclose(self) -> None:
+        """Closes and forgets the idle agents of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            closing = [lease for lease in self._idle if lease.loop is loop]
+            self._idle = [
+                lease
+                for lease in self._idle
+                if lease.loop is not loop and not lease.loop.is_closed()
+            ]
+            self._hooked_loops.discard(id(loop))
+        for lease in closing:
+            await lease.agent.close()
+
+    def stats(self) -> dict:
+        """Returns the number of agents built, reused and idle."""
+        with self._lock:
+            return {
+                "builds": self._builds,
+                "reuses": self._reuses,
+                "idle": len(self._idle),
+            }
+
+
+async def build_coder(
+    helper: "MagenticOneHelper", agent: dict, model_client: ChatCompletionClient
+) -> ChatAgent:
+    from autogen_ext.agents.magentic_one import MagenticOneCoderAgent
+
+    return MagenticOneCoderAgent("Coder", model_client=model_client)
+
+
+async def build_executor(
+    helper: "MagenticOneHelper", agent: dict, model_client: ChatCompletionClient
+) -> ChatAgent:
+    from autogen_agentchat.agents import CodeExecutorAgent
+
+    # The executors are pooled themselves, and each run leases its own
+    return CodeExecutorAgent("Executor", code_executor=await helper.lease_executor())
+
+
+async def build_web_surfer(
+    helper: "MagenticOneHelper", agent: dict, model_client: ChatCompletionClient
+) -> ChatAgent:
+    from browser_pool import PooledWebSurfer, get_browser_pool
+    from web_cache import get_http_cache
+
+    # Browses in a context of the loop's shared browser, from the page the helper is set to; the
+    # browser's HTTP cache is that of the helper that launched it
+    http_cache = (
+        get_http_cache(helper.web_cache_path) if helper.web_cache_path else None
+    )
+    return PooledWebSurfer(
+        "WebSurfer",
+        pool=get_browser_pool(http_cache=http_cache),
+        model_client=model_client,
+        start_page=helper.start_page,
+    )
+
+
+async def build_file_surfer(
+    helper: "MagenticOneHelper", agent: dict, model_client: ChatCompletionClient
+) -> ChatAgent:
+    from autogen_ext.agents.file_surfer import FileSurfer
+
+    return FileSurfer("FileSurfer", model_client=model_client)
+
+
+async def build_custom_agent(
+    helper: "MagenticOneHelper", agent: dict, model_client: ChatCompletionClient
+) -> ChatAgent:
+    # A simple SYSTEM message and DESCRIPTION, inherited from AssistantAgent
+    from magentic_one_custom_agent import MagenticOneCustomAgent
+
+    return MagenticOneCustomAgent(
+        agent["name"],
+        model_client=model_client,
+        system_message=agent["system_message"],
+        description=agent["description"],
+    )
+
+
+async def build_rag_agent(
+    helper: "MagenticOneHelper", agent: dict, model_client: ChatCompletionClient
+) -> ChatAgent:
+    # Searches the `index_name` of the Azure AI Search service of the .env file, or with
+    # `"backend": "local"` the local vector index at `index_path`. With `cache_embedder`, a missed
+    # search is answered by the cached result of a query that embeds almost the same
+    from magentic_one_custom_rag_agent import MagenticOneRAGAgent
+    from rag_backends import LocalSearchBackend, RAGSearchOptions
+    from search_cache import get_search_cache
+
+    backend = (
+        LocalSearchBackend(agent["index_path"])
+        if agent.get("backend") == "local"
+        else None
+    )
+    return MagenticOneRAGAgent(
+        agent["name"],
+        model_client=model_client,
+        index_name=agent.get("index_name") or agent.get("index_path"),
+        description=agent["description"],
+        search_key=helper.search_key,
+        search_endpoint=helper.search_endpoint,
+        cache=get_search_cache(agent.get("cache_embedder")),
+        search_options=RAGSearchOptions.from_config(agent),
+        backend=backend,
+    )
+
+
+def search_settings(helper: "MagenticOneHelper") -> Any:
+    return [helper.search_endpoint, helper.search_key]
+
+
+def web_surfer_settings(helper: "MagenticOneHelper") -> Any:
+    return helper.start_page
+
+
+agent_registry = AgentRegistry()
+agent_registry.register("MagenticOne", AgentFactory(build_coder), name="Coder")
+agent_registry.register(
+    "MagenticOne", AgentFactory(build_executor, reset=None), name="Executor"
+)
+agent_registry.register(
+    "MagenticOne",
+    AgentFactory(build_web_surfer, settings=web_surfer_settings),
+    name="WebSurfer",
+)
+agent_registry.register(
+    "MagenticOne", AgentFactory(build_file_surfer), name="FileSurfer"
+)
+agent_registry.register("Custom", AgentFactory(build_custom_agent, streamed=True))
+agent_registry.register(
+    "RAG", AgentFactory(build_rag_agent, settings=search_settings, streamed=True)
+)
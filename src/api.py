@@ -0,0 +1,258 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+from autogen_agentchat.base import TaskResult
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient
+from pydantic import BaseModel
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from agent_registry import agent_registry
+from magentic_one_helper import MAGENTIC_ONE_DEFAULT_AGENTS, MagenticOneHelper
+from run_budget import RunBudget
+from run_manager import FINISHED, RunManager
+
+ModelClientFactory = Callable[[], ChatCompletionClient]
+
+
+def message_to_dict(message: Any) -> dict:
+    """
+    Converts a message of a run to JSON-compatible data.
+
+    Args:
+        message (Any): An `AgentEvent`, `ChatMessage` or `TaskResult`.
+
+    Returns:
+        dict: The message fields; images are base64-encoded.
+    """
+    if isinstance(message, TaskResult):
+        return {
+            "type": "TaskResult",
+            "messages": [message_to_dict(m) for m in message.messages],
+            "stop_reason": message.stop_reason,
+        }
+    if isinstance(message, BaseModel):
+        return message.model_dump(mode="json")
+    return {"type": type(message).__name__, "content": str(message)}
+
+
+def validate_task(body: Any) -> str | None:
+    """Returns what is wrong with a task submission, or None if it is valid."""
+    if not isinstance(body, dict):
+        return "The body must be a JSON object."
+    if not isinstance(body.get("task"), str) or not body["task"].strip():
+        return "`task` must be a non-empty string."
+    agents = body.get("agents", MAGENTIC_ONE_DEFAULT_AGENTS)
+    if not isinstance(agents, list) or not agents:
+        return "`agents` must be a non-empty list."
+    for agent in agents:
+        if not isinstance(agent, dict) or not {"type", "name"} <= agent.keys():
+            return "Each agent must be an object with a `type` and a `name`."
+        for key in ("model", "deployment"):
+            if agent.get(key) is not None and not isinstance(agent[key], str):
+                return f"An agent's `{key}` must be a string."
+    try:
+        agent_registry.validate(agents)
+    except ValueError as e:
+        return str(e)
+    if "start_page" in body and not isinstance(body["start_page"], str):
+        return "`start_page` must be a string."
+    for key in ("max_rounds", "max_time", "max_tokens"):
+        if key in body and (not isinstance(body[key], int) or body[key] <= 0):
+            return f"`{key}` must be a positive integer."
+    return None
+
+
+def create_app(
+    manager: RunManager | None = None,
+    max_concurrent: int = 4,
+    max_queued: int = 16,
+    logs_dir: str = "./logs",
+    model_client_factory: ModelClientFactory | None = None,
+) -> Starlette:
+    """
+    Creates the ASGI application that runs `MagenticOneHelper` tasks over HTTP.
+
+    - `POST /tasks` submits a task, `{"task": ..., "agents": [...]}` with agents shaped like
+      `MAGENTIC_ONE_DEFAULT_AGENTS` and optionally `run_locally`, `max_rounds`, `max_time` (minutes),
+      `max_tokens`, `start_page` (the WebSurfer's first page) and `stream` (to also get the responses
+      as `ModelStreamChunk` events while they are generated). It answers `202` with the run ID, or
+      `429` when `max_concurrent` runs are running and `max_queued` more are waiting.
+    - `GET /tasks/{run_id}/events` streams the run's messages as server-sent events, resuming after
+      the `Last-Event-ID` header, and ends with an `end` event.
+    - `GET /tasks/{run_id}` returns the run's status and, once finished, its `TaskResult`.
+    - `DELETE /tasks/{run_id}` cancels the run.
+
+    Args:
+        manager (RunManager, optional): Executes the runs. Defaults to a new one limited to `max_concurrent` runs.
+        max_concurrent (int, optional): The runs executed at once. Defaults to 4.
+        max_queued (int, optional): The runs accepted beyond those, waiting for a slot. Defaults to 16.
+        logs_dir (str, optional): The directory to store logs and downloads. Defaults to "./logs".
+        model_client_factory (ModelClientFactory, optional): Creates the model client of each run
+            instead of the Azure OpenAI one, e.g. a fake one for tests and benchmarks. Defaults to None.
+
+    Returns:
+        Starlette: The application.
+    """
+    owns_manager = manager is None
+    manager = manager or RunManager(max_concurrent=max_concurrent)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        yield
+        if owns_manager:
+            await asyncio.to_thread(manager.close)
+
+    def start(body: dict) -> str:
+        agents = body.get("agents", MAGENTIC_ONE_DEFAULT_AGENTS)
+        budget = RunBudget()
+        if "max_time" in body:
+            budget.max_time = body["max_time"] * 60
+        budget.max_tokens = body.get("max_tokens")
+
+        async def run(cancellation_token: CancellationToken) -> AsyncIterator[Any]:
+            helper = MagenticOneHelper.from_env(
+                logs_dir=logs_dir, run_locally=bool(body.get("run_locally", False))
+            )
+            helper.max_rounds = body.get("max_rounds", helper.max_rounds)
+            helper.start_page = body.get("start_page", helper.start_page)
+            helper.budget = budget
+            helper.stream_model_output = bool(body.get("stream", False))
+            await helper.initialize(
+                agents,
+                model_client=model_client_factory() if model_client_factory else None,
+            )
+            async for message in helper.main(
+                task=body["task"], cancellation_token=cancellation_token
+            ):
+                yield message
+
+        return manager.submit(run, task=body["task"])
+
+    async def submit_task(request: Request) -> Response:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            body = None
+        error = validate_task(body)
+        if error is not None:
+            return JSONResponse({"error": error}, status_code=400)
+        if manager.active >= max_concurrent + max_queued:
+            return JSONResponse(
+                {"error": "Too many tasks, try again later."},
+                status_code=429,
+                headers={"Retry-After": "30"},
+            )
+        run_id = start(body)
+        return JSONResponse(
+            {
+                "run_id": run_id,
+                "events_url": f"/tasks/{run_id}/events",
+                "result_url": f"/tasks/{run_id}",
+            },
+            status_code=202,
+        )
+
+    def find_run(request: Request):
+        try:
+            # Polling any endpoint of a run counts as following it
+            return manager.touch(request.path_params["run_id"])
+        except KeyError:
+            return None
+
+    async def stream_events(request: Request) -> Response:
+        run = find_run(request)
+        if run is None:
+            return JSONResponse({"error": "Unknown run."}, status_code=404)
+        try:
+            after = int(request.headers.get("last-event-id", -1))
+        except ValueError:
+            after = -1
+
+        async def events() -> AsyncIterator[str]:
+            async for event in manager.subscribe(run.run_id, after):
+                data = message_to_dict(event.message)
+                yield f"id: {event.seq}\nevent: {data['type']}\ndata: {json.dumps(data)}\n\n"
+            yield f"event: end\ndata: {json.dumps({'status': run.status, 'error': run.error})}\n\n"
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def get_result(request: Request) -> Response:
+        run = find_run(request)
+        if run is None:
+            return JSONResponse({"error": "Unknown run."}, status_code=404)
+        result = None
+        if (
+            run.finished
+            and run.events
+            and isinstance(run.events[-1].message, TaskResult)
+        ):
+            result = message_to_dict(run.events[-1].message)
+        return JSONResponse(
+            {
+                "run_id": run.run_id,
+                "task": run.task,
+                "status": run.status,
+                "error": run.error,
+                "result": result,
+            },
+            status_code=200 if run.status in FINISHED else 202,
+        )
+
+    async def cancel_task(request: Request) -> Response:
+        run = find_run(request)
+        if run is None:
+            return JSONResponse({"error": "Unknown run."}, status_code=404)
+        manager.cancel(run.run_id)
+        return JSONResponse(
+            {"run_id": run.run_id, "status": run.status}, status_code=202
+        )
+
+    return Starlette(
+        routes=[
+            Route("/tasks", submit_task, methods=["POST"]),
+            Route("/tasks/{run_id}", get_result, methods=["GET"]),
+            Route("/tasks/{run_id}", cancel_task, methods=["DELETE"]),
+            Route("/tasks/{run_id}/events", stream_events, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(
+        description="Serve the HTTP/SSE API for running `MagenticOneHelper` tasks.",
+        epilog="Example: python api.py --port 8000 --max-concurrent 4",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-concurrent", type=int, default=4)
+    parser.add_argument("--max-queued", type=int, default=16)
+    parser.add_argument("--logs-dir", default=os.getenv("LOGS_DIR", "./logs"))
+
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(
+            max_concurrent=args.max_concurrent,
+            max_queued=args.max_queued,
+            logs_dir=args.logs_dir,
+        ),
+        host=args.host,
+        port=args.port,
+    )
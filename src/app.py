@@ -3,14 +3,17 @@ import os
 import random
 import string
 import sys
+import time
 
 import streamlit as st
 
+from autogen_core import CancellationToken
 from dotenv import load_dotenv
 
-from magentic_one_custom_rag_agent import MAGENTIC_ONE_RAG_DESCRIPTION
 from magentic_one_helper import MagenticOneHelper
-from utils import display_log_message, generate_random_agent_emoji
+from run_budget import RunBudget
+from run_manager import FAILED, FINISHED, RunManager, RunSnapshot
+from utils import EventLog, generate_random_agent_emoji
 
 load_dotenv()
 
@@ -18,9 +21,6 @@ load_dotenv()
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-# Initialize a global cancellation event
-cancel_event = asyncio.Event()
-
 MAGENTIC_ONE_DEFAULT_AGENTS = [
     {
         "input_key": "0001",
@@ -83,6 +83,8 @@ if "start_page" not in st.session_state:
     st.session_state["start_page"] = "https://www.bing.com"
 if "save_screenshots" not in st.session_state:
     st.session_state["save_screenshots"] = True
+if "stream_model_output" not in st.session_state:
+    st.session_state["stream_model_output"] = False
 
 st.set_page_config(layout="wide")
 st.write("### Dream Team powered by Magentic 1")
@@ -108,6 +110,11 @@ def add_agent(item=None):
     agent_name = st.text_input("Name", value=None)
     system_message = st.text_area("System Message", value=None)
     description = st.text_area("Description", value=None)
+    model = st.text_input(
+        "Model",
+        value=None,
+        help="A model of `MODEL_DEPLOYMENTS`, e.g. a cheaper one. Defaults to the main model.",
+    )
 
     if st.button("Submit"):
         # st.session_state.vote = {"item": item, "reason": reason}
@@ -120,6 +127,7 @@ def add_agent(item=None):
                 "system_message": system_message,
                 "description": description,
                 "icon": generate_random_agent_emoji(),
+                "model": model,
             }
         )
         st.rerun()
@@ -127,6 +135,9 @@ def add_agent(item=None):
 
 @st.dialog("Add RAG agent")
 def add_rag_agent(item=None):
+    # Imported here, as the RAG agent's Azure AI Search dependencies would slow down the app's start
+    from magentic_one_custom_rag_agent import MAGENTIC_ONE_RAG_DESCRIPTION
+
     # st.write(f"Setuup your agent:")
     st.caption(
         """
@@ -156,6 +167,17 @@ def add_rag_agent(item=None):
     description = st.text_area("Description", value=MAGENTIC_ONE_RAG_DESCRIPTION)
 
     index_name = st.text_input("Index Name", value=None)
+    model = st.text_input(
+        "Model",
+        value=None,
+        help="A model of `MODEL_DEPLOYMENTS`, e.g. a cheaper one. Defaults to the main model.",
+    )
+    k = st.number_input("Chunks to retrieve", min_value=1, max_value=50, value=3)
+    exhaustive = st.checkbox(
+        "Exhaustive search",
+        value=False,
+        help="Scans every vector instead of using the approximate (HNSW) index. Slower on large indexes.",
+    )
 
     if st.button("Submit"):
         # st.session_state.vote = {"item": item, "reason": reason}
@@ -169,6 +191,10 @@ def add_rag_agent(item=None):
                 "description": description,
                 "icon": "🔍",
                 "index_name": index_name,
+                "k": k,
+                "top": k,
+                "exhaustive": exhaustive,
+                "model": model,
             }
         )
         st.rerun()
@@ -244,9 +270,17 @@ with st.sidebar:
         st.session_state["max_stalls_before_replan"] = st.number_input(
             "Max Stalls Before Replan", min_value=1, max_value=10, value=5
         )
+        st.session_state["max_tokens"] = st.number_input(
+            "Max Tokens (0 for no limit)", min_value=0, value=0, step=10000
+        )
         st.session_state["return_final_answer"] = st.checkbox(
             "Return Final Answer", value=True
         )
+        st.session_state["stream_model_output"] = st.checkbox(
+            "Stream Model Output",
+            value=False,
+            help="Shows the orchestrator's and custom agents' responses as they are generated.",
+        )
 
         st.session_state["start_page"] = st.text_input(
             "Start Page URL", value="https://www.bing.com"
@@ -332,66 +366,117 @@ if not st.session_state["running"]:
 else:
     run_button_text = "Cancel Run"
 
+@st.cache_resource
+def get_run_manager() -> RunManager:
+    # Shared by all sessions; runs outlive the reruns and disconnects of the session that started them
+    return RunManager()
+
+
+def start_run(task: str, logs_dir: str = "./logs") -> str:
+    # The session state is read here, as the run executes on the run manager's thread
+    agents = st.session_state["saved_agents"]
+    save_screenshots = st.session_state["save_screenshots"]
+    stream_model_output = st.session_state["stream_model_output"]
+    run_locally = st.session_state["run_mode_locally"]
+    max_rounds = st.session_state["max_rounds"]
+    max_stalls_before_replan = st.session_state["max_stalls_before_replan"]
+    start_page = st.session_state["start_page"]
+    budget = RunBudget(
+        max_time=st.session_state["max_time"] * 60,
+        max_tokens=st.session_state["max_tokens"] or None,
+    )
+
+    # Create folder for logs if not exists
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir)
+
+    async def run(cancellation_token: CancellationToken):
+        # Initialize the MagenticOne system
+        magentic_one = MagenticOneHelper.from_env(
+            logs_dir=logs_dir,
+            save_screenshots=save_screenshots,
+            run_locally=run_locally,
+        )
+        magentic_one.max_rounds = max_rounds
+        magentic_one.max_stalls_before_replan = max_stalls_before_replan
+        magentic_one.start_page = start_page
+        magentic_one.budget = budget
+        magentic_one.stream_model_output = stream_model_output
+        await magentic_one.initialize(agents=agents)
+
+        # Start the MagenticOne system
+        async for message in magentic_one.main(
+            task=task, cancellation_token=cancellation_token
+        ):
+            yield message
+
+    return get_run_manager().submit(run, task=task)
+
+
+def follow_run(run_id: str, logs_dir: str = "./logs") -> RunSnapshot:
+    # Draws the buffered messages of the run, then the new ones as they arrive. A rerun or a
+    # disconnect of this session only stops following; the run goes on and is picked up again.
+    manager = get_run_manager()
+    after = -1
+    elapsed = st.empty()
+    with st.container(border=True):
+        event_log = EventLog(run_id, logs_dir)
+        while True:
+            snapshot = manager.poll(run_id, after, timeout=1)
+            if snapshot.missed:
+                st.caption(f"{snapshot.missed} earlier messages are not shown.")
+            event_log.extend(snapshot.events)
+            if snapshot.events:
+                after = snapshot.events[-1].seq
+            if snapshot.status in FINISHED:
+                elapsed.empty()
+                return snapshot
+            run = manager.get(run_id)
+            elapsed.caption(
+                f"Running for {int(time.time() - (run.started_at or run.created_at))}s"
+            )
+
+
 if st.button(run_button_text, type="primary"):
     if not st.session_state["running"]:
         st.session_state["instructions"] = instructions
         st.session_state["running"] = True
         st.session_state["final_answer"] = None
-        cancel_event.clear()  # Clear the cancellation event
+        st.session_state["run_id"] = start_run(instructions)
         st.rerun()
     else:
         st.session_state["running"] = False
         st.session_state["instructions"] = ""
         st.session_state["final_answer"] = None
         st.session_state["run_mode_locally"] = True
-        cancel_event.set()  # Set the cancellation event
+        try:
+            get_run_manager().cancel(st.session_state["run_id"])
+        except KeyError:
+            pass
         st.rerun()
 
 
-async def main(task, logs_dir="./logs"):
-
-    # Create folder for logs if not exists
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
-
-    # Initialize the MagenticOne system
-    magentic_one = MagenticOneHelper(
-        model=os.getenv("AZURE_OPENAI_MODEL"),
-        azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        search_endpoint=os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        search_key=os.getenv("AZURE_SEARCH_ADMIN_KEY"),
-        logs_dir=logs_dir,
-        save_screenshots=st.session_state["save_screenshots"],
-        run_locally=st.session_state["run_mode_locally"],
-    )
-    await magentic_one.initialize(agents=st.session_state["saved_agents"])
-
-    # Start the MagenticOne system
-    stream = magentic_one.main(task=task)
-
-    # Stream and process logs
-    with st.container(border=True):
-        async for log_entry in stream:
-            display_log_message(log_entry=log_entry, logs_dir=logs_dir)
-
-
 if st.session_state["running"]:
     assert st.session_state["instructions"] != "", "Instructions can't be empty."
 
-    with st.spinner("Dream Team is running..."):
-        asyncio.run(main(st.session_state["instructions"]))
+    try:
+        with st.spinner("Dream Team is running..."):
+            snapshot = follow_run(st.session_state["run_id"])
+    except KeyError:
+        st.session_state["running"] = False
+        st.warning("The run is no longer available.")
+        st.stop()
 
     final_answer = st.session_state["final_answer"]
-    if final_answer:
+    if snapshot.status == FAILED:
+        st.error("Task failed.")
+        st.write(snapshot.error)
+    elif final_answer:
         st.success("Task completed successfully.")
         st.write("## Final answer:")
         st.write(final_answer)
         st.write("## Stop reason:")
         st.write(st.session_state["stop_reason"])
-        cancel_event.set()  # Set the cancellation event
     else:
         st.error("Task failed.")
         st.write("Final answer not found.")
@@ -0,0 +1,78 @@
+"""Compares per-run fresh ACA dynamic sessions with pooled, warm sessions against a local fake endpoint.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_aca_sessions --runs 10 --allocation-delay 0.5
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock
+
+from aca_sessions import PinnedSessionExecutor, create_aca_session_pool
+from benchmarks.fake_sessions import FakeCredential, FakeSessionPool
+from token_cache import CachedTokenCredential
+
+TURNS = [CodeBlock(code=f"print({turn})", language="python") for turn in range(3)]
+
+
+async def run_task(executor: PinnedSessionExecutor) -> None:
+    for block in TURNS:
+        await executor.execute_code_blocks([block], CancellationToken())
+
+
+async def run(runs: int, allocation_delay: float) -> None:
+    fake = FakeSessionPool(allocation_delay)
+    runner, endpoint = await fake.start()
+    credential = CachedTokenCredential(FakeCredential())
+
+    fresh = []
+    with tempfile.TemporaryDirectory() as work_root:
+        for run_number in range(runs):
+            start = time.perf_counter()
+            await run_task(
+                PinnedSessionExecutor(
+                    endpoint, credential, Path(work_root) / f"run-{run_number}"
+                )
+            )
+            fresh.append(time.perf_counter() - start)
+    fresh_sessions = len(fake.sessions)
+
+    fake.sessions.clear()
+    pool = create_aca_session_pool(endpoint, credential, max_idle=1)
+    await pool.prewarm(1)
+    pooled = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        async with pool.checkout() as executor:
+            await run_task(executor)
+        pooled.append(time.perf_counter() - start)
+    pooled_sessions = len(fake.sessions)
+    await pool.close()
+
+    await credential.close()
+    await runner.cleanup()
+
+    for label, samples, sessions in (
+        ("fresh", fresh, fresh_sessions),
+        ("pooled", pooled, pooled_sessions),
+    ):
+        print(
+            f"{label}: median={statistics.median(samples) * 1000:.2f}ms "
+            f"max={max(samples) * 1000:.2f}ms sessions={sessions}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--allocation-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.runs, args.allocation_delay))
@@ -0,0 +1,98 @@
+"""Compares the setup time of consecutive runs that rebuild their agents with runs that reuse them.
+
+Besides the Coder and a custom agent, the team has a "Browser" agent type, registered for the
+benchmark, whose construction takes `--launch` seconds like a browser launch and whose reset
+takes 50ms like loading the start page.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_agent_registry --runs 5 --launch 0.8
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from agent_registry import (
+    AgentFactory,
+    agent_registry,
+    build_custom_agent,
+    reset_agent,
+)
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from magentic_one_helper import MagenticOneHelper
+
+AGENTS = [
+    {"type": "MagenticOne", "name": "Coder"},
+    {
+        "type": "Custom",
+        "name": "Writer",
+        "system_message": "You write.",
+        "description": "Writes text.",
+    },
+    {
+        "type": "Browser",
+        "name": "Browser",
+        "system_message": "You browse.",
+        "description": "Browses the web.",
+    },
+]
+
+
+def register_browser(launch: float) -> None:
+    async def build(helper, agent, model_client):
+        await asyncio.sleep(launch)
+        return await build_custom_agent(helper, agent, model_client)
+
+    async def reset(agent):
+        await asyncio.sleep(0.05)
+        await reset_agent(agent)
+
+    agent_registry.register("Browser", AgentFactory(build, reset=reset))
+
+
+async def measure(runs: int) -> dict:
+    setups, totals = [], []
+    with tempfile.TemporaryDirectory() as logs_dir:
+        for _ in range(runs):
+            helper = MagenticOneHelper.from_env(logs_dir=logs_dir)
+            start = time.perf_counter()
+            await helper.initialize(
+                AGENTS, model_client=ScriptedChatCompletionClient(speaker="Browser")
+            )
+            setups.append(time.perf_counter() - start)
+            async for _ in helper.main(task="Browse something."):
+                pass
+            totals.append(time.perf_counter() - start)
+        await agent_registry.aclose()
+    return {
+        "first": setups[0],
+        "setup": statistics.median(setups[1:]),
+        "total": statistics.median(totals[1:]),
+    }
+
+
+async def run(runs: int, launch: float) -> None:
+    register_browser(launch)
+    print(f"{runs} consecutive runs, a {launch}s agent launch:")
+    for label, max_idle in (("rebuilt", 0), ("reused", 16)):
+        agent_registry.max_idle = max_idle
+        before = agent_registry.stats()
+        result = await measure(runs)
+        after = agent_registry.stats()
+        print(
+            f"  {label:>7}: first setup {result['first']:.2f}s, then setup "
+            f"{result['setup']:.2f}s and run {result['total']:.2f}s (median), "
+            f"{after['builds'] - before['builds']} agents built, "
+            f"{after['reuses'] - before['reuses']} reused"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--launch", type=float, default=0.8)
+    args = parser.parse_args()
+    asyncio.run(run(args.runs, args.launch))
@@ -0,0 +1,114 @@
+"""Load-tests the HTTP/SSE API with a scripted model client and reports tasks/sec and time-to-first-event.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_api --tasks 50 --concurrency 10 --max-concurrent 8
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+import aiohttp
+import uvicorn
+
+from api import create_app
+from benchmarks.fake_model import ScriptedChatCompletionClient
+
+AGENTS = [{"type": "MagenticOne", "name": "Coder"}]
+
+
+def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_task(
+    session: aiohttp.ClientSession, endpoint: str, number: int
+) -> tuple[float | None, str]:
+    """Submits a task and reads its events; returns the time to the first event and the end status."""
+    started = time.perf_counter()
+    while True:
+        async with session.post(
+            f"{endpoint}/tasks", json={"task": f"Task {number}", "agents": AGENTS}
+        ) as response:
+            if response.status != 429:
+                response.raise_for_status()
+                run = await response.json()
+                break
+        await asyncio.sleep(0.1)
+
+    first_event, status = None, "unknown"
+    async with session.get(endpoint + run["events_url"]) as response:
+        event = None
+        async for line in response.content:
+            line = line.decode().strip()
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+                if first_event is None and event != "end":
+                    first_event = time.perf_counter() - started
+            elif line.startswith("data: ") and event == "end":
+                status = json.loads(line[len("data: ") :])["status"]
+    return first_event, status
+
+
+async def run(args: argparse.Namespace) -> None:
+    app = create_app(
+        max_concurrent=args.max_concurrent,
+        max_queued=args.max_queued,
+        model_client_factory=lambda: ScriptedChatCompletionClient(
+            rounds=args.rounds, delay=args.delay
+        ),
+    )
+    server = serve(app, args.port)
+    endpoint = f"http://127.0.0.1:{args.port}"
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(session: aiohttp.ClientSession, number: int):
+        async with semaphore:
+            return await run_task(session, endpoint, number)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=None)
+    ) as session:
+        results = await asyncio.gather(
+            *(limited(session, number) for number in range(args.tasks))
+        )
+    elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    first_events = sorted(first for first, _ in results if first is not None)
+    completed = sum(status == "completed" for _, status in results)
+    p95 = first_events[max(0, int(len(first_events) * 0.95) - 1)]
+    print(
+        f"tasks={args.tasks} completed={completed} elapsed={elapsed:.2f}s "
+        f"tasks/sec={args.tasks / elapsed:.2f}"
+    )
+    print(
+        f"time-to-first-event: median={statistics.median(first_events) * 1000:.1f}ms "
+        f"p95={p95 * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--max-concurrent", type=int, default=8)
+    parser.add_argument("--max-queued", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
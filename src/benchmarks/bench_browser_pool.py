@@ -0,0 +1,144 @@
+"""Compares the time WebSurfers take to open their start page with a browser each and from a `BrowserPool`.
+
+Each run builds a WebSurfer, opens its start page, served locally with its stylesheet, script and
+images after `--latency` seconds each, and ends the run: a `MultimodalWebSurfer` launches a browser
+of its own and closes it, a `PooledWebSurfer` checks a context out of the pool and returns it, with
+or without an `HttpCache`. The server allows caching the page for a minute. `--concurrency` runs
+are started at once. Needs the Chromium of Playwright (`playwright install chromium`).
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_browser_pool --runs 10 --concurrency 2 --latency 0.1
+"""
+
+import argparse
+import asyncio
+import functools
+import http.server
+import statistics
+import tempfile
+import threading
+import time
+
+import PIL.Image
+from autogen_core import CancellationToken
+from autogen_ext.agents.web_surfer import MultimodalWebSurfer
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from browser_pool import BrowserPool, PooledWebSurfer
+from web_cache import HttpCache
+
+PAGE = (
+    '<html><head><title>Start</title><link rel="stylesheet" href="style.css">'
+    '<script src="app.js"></script></head><body>{}{}</body></html>'
+).format(
+    "<p>Some text to render.</p>" * 200,
+    "".join(f'<img src="image{i}.png">' for i in range(4)),
+)
+
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    # Slow, like a remote site, and cacheable for a minute
+    latency = 0.0
+
+    def end_headers(self) -> None:
+        self.send_header("Cache-Control", "public, max-age=60")
+        super().end_headers()
+
+    def send_head(self):
+        time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, *args) -> None:
+        # Quiet, the benchmark prints its own results
+        pass
+
+
+def serve(directory: str, latency: float) -> http.server.ThreadingHTTPServer:
+    with open(f"{directory}/index.html", "w") as f:
+        f.write(PAGE)
+    with open(f"{directory}/style.css", "w") as f:
+        f.write("p { font-family: sans-serif; }" * 500)
+    with open(f"{directory}/app.js", "w") as f:
+        f.write("var text = 'some script';\n" * 2000)
+    for i in range(4):
+        PIL.Image.effect_noise((200, 200), 60).save(f"{directory}/image{i}.png")
+    handler = functools.partial(Handler, directory=directory)
+    Handler.latency = latency
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def browse(start_page: str, pool: BrowserPool | None) -> float:
+    start = time.perf_counter()
+    if pool is None:
+        surfer = MultimodalWebSurfer(
+            "WebSurfer",
+            model_client=ScriptedChatCompletionClient(),
+            start_page=start_page,
+        )
+        await surfer._lazy_init()
+        await surfer.close()
+    else:
+        surfer = PooledWebSurfer(
+            "WebSurfer",
+            pool=pool,
+            model_client=ScriptedChatCompletionClient(),
+            start_page=start_page,
+        )
+        await surfer._lazy_init()
+        await surfer.on_reset(CancellationToken())
+    return time.perf_counter() - start
+
+
+async def measure(
+    start_page: str, runs: int, concurrency: int, pool: BrowserPool | None
+) -> list[float]:
+    times = []
+    for _ in range(0, runs, concurrency):
+        times += await asyncio.gather(
+            *(browse(start_page, pool) for _ in range(concurrency))
+        )
+    return times
+
+
+async def run(runs: int, concurrency: int, latency: float) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        server = serve(directory, latency)
+        start_page = f"http://127.0.0.1:{server.server_address[1]}/index.html"
+        print(f"{runs} runs, {concurrency} at once, to open {start_page}:")
+        try:
+            times = await measure(start_page, runs, concurrency, None)
+            print(
+                f"  browser per run: first {times[0]:.2f}s, then "
+                f"{statistics.median(times[concurrency:] or times):.2f}s (median)"
+            )
+            for label, http_cache in (
+                ("pooled context", None),
+                ("with web cache", HttpCache(f"{directory}/web_cache.sqlite")),
+            ):
+                pool = BrowserPool(max_contexts=concurrency, http_cache=http_cache)
+                times = await measure(start_page, runs, concurrency, pool)
+                stats = pool.stats()
+                await pool.close()
+                print(
+                    f"  {label:>15}: first {times[0]:.2f}s, then "
+                    f"{statistics.median(times[concurrency:] or times):.2f}s (median), "
+                    f"{stats['launches']} browser launched, {stats['created']} contexts "
+                    f"created, {stats['reused']} reused"
+                    + (f", cache {http_cache.stats}" if http_cache else "")
+                )
+                if http_cache is not None:
+                    http_cache.close()
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args.runs, args.concurrency, args.latency))
@@ -0,0 +1,54 @@
+"""Compares cold and warm `MagenticOneHelper.initialize()` latency with the pooled model client.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_client_registry --runs 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from magentic_one_helper import MagenticOneHelper, client_registry
+
+
+def make_helper() -> MagenticOneHelper:
+    # An API key keeps `azd` out of the measurement; no request is sent during `initialize()`
+    return MagenticOneHelper(
+        model="gpt-4o",
+        azure_deployment="gpt-4o",
+        api_version="2024-08-01-preview",
+        azure_endpoint="https://example.openai.azure.com/",
+        search_endpoint="https://example.search.windows.net",
+        api_key="benchmark",
+        logs_dir="./logs",
+    )
+
+
+async def time_initialize() -> float:
+    start = time.perf_counter()
+    await make_helper().initialize(agents=[])
+    return time.perf_counter() - start
+
+
+async def run(runs: int) -> None:
+    cold, warm = [], []
+    for _ in range(runs):
+        await client_registry.aclose()
+        cold.append(await time_initialize())
+        warm.append(await time_initialize())
+
+    for label, samples in (("cold", cold), ("warm", warm)):
+        print(
+            f"{label}: median={statistics.median(samples) * 1000:.2f}ms "
+            f"max={max(samples) * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.runs))
@@ -0,0 +1,124 @@
+"""Measures the page the event log of a long run renders, with one expander per event and with `EventLog`.
+
+The run has the rounds of a WebSurfer task: a streamed orchestrator instruction, then a WebSurfer
+message and a screenshot. The page is rendered in Streamlit's `AppTest` as on a rerun of the app,
+with the run's events drawn from its buffer.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_event_log --rounds 50
+"""
+
+import argparse
+
+from streamlit.testing.v1 import AppTest
+
+
+def script():
+    # Runs as the app's script, so it imports what it uses itself
+    import random
+    import time
+
+    import PIL.Image
+    import PIL.ImageDraw
+    import streamlit as st
+    from autogen_agentchat.messages import MultiModalMessage, TextMessage
+    from autogen_core import Image
+    from streamlit.runtime import Runtime
+
+    from run_manager import RunEvent
+    from streaming import ModelStreamChunk
+    from utils import EventLog, display_log_message, get_agent_icon
+
+    def screenshot(seed: int) -> Image:
+        # A page of text lines around a noisy picture, which PNG compresses as badly as a photo
+        rng = random.Random(seed)
+        page = PIL.Image.new("RGB", (1280, 720), "white")
+        draw = PIL.ImageDraw.Draw(page)
+        for y in range(20, 720, 24):
+            draw.rectangle((40, y, 40 + rng.randint(200, 700), y + 10), fill="gray")
+        page.paste(PIL.Image.effect_noise((400, 300), 60).convert("RGB"), (820, 60))
+        return Image(page)
+
+    events = []
+    for round in range(st.session_state["rounds"]):
+        for chunk in ("Please ", "open the ", f"page {round}."):
+            events.append(
+                ModelStreamChunk(
+                    source="MagenticOneOrchestrator",
+                    stream_id=str(round),
+                    content=chunk,
+                )
+            )
+        events.append(
+            TextMessage(
+                source="MagenticOneOrchestrator",
+                content=f"Please open the page {round}.",
+            )
+        )
+        events.append(
+            TextMessage(source="WebSurfer", content=f"I opened page {round}.")
+        )
+        events.append(
+            MultiModalMessage(
+                source="WebSurfer",
+                content=[f"Screenshot of page {round}.", screenshot(round)],
+            )
+        )
+    events = [RunEvent(seq, message) for seq, message in enumerate(events)]
+
+    storage = Runtime.instance().media_file_mgr._storage
+    storage._files_by_id.clear()
+    start = time.perf_counter()
+    if st.session_state["event_log"]:
+        EventLog("bench", "./logs").extend(events)
+    else:
+        # Every message in its own expander, its screenshot at full resolution
+        for event in events:
+            message = event.message
+            if isinstance(message, ModelStreamChunk):
+                continue
+            with st.expander(f"{get_agent_icon(message.source)} {message.source}"):
+                if isinstance(message, MultiModalMessage):
+                    st.write("Message:")
+                    st.write(message.content[0])
+                    st.image(message.content[1].image)
+                else:
+                    display_log_message(message, "./logs")
+    st.session_state["elapsed"] = time.perf_counter() - start
+    st.session_state["image_bytes"] = sum(
+        len(file.content) for file in storage._files_by_id.values()
+    )
+
+
+def measure(rounds: int, event_log: bool) -> dict:
+    app = AppTest.from_function(script, default_timeout=300)
+    app.session_state["rounds"] = rounds
+    app.session_state["event_log"] = event_log
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return {
+        "expanders": len(app.expander),
+        "images": app.session_state["image_bytes"],
+        "elapsed": app.session_state["elapsed"],
+    }
+
+
+def run(rounds: int) -> None:
+    print(
+        f"Rerun of a run of {rounds} rounds ({3 * rounds} messages with {rounds} screenshots):"
+    )
+    for label, event_log in (("expander per event", False), ("EventLog", True)):
+        result = measure(rounds, event_log)
+        print(
+            f"  {label:>18}: {result['expanders']} expanders, "
+            f"{result['images'] / 1024:.0f} KiB of images, rendered in {result['elapsed']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    run(args.rounds)
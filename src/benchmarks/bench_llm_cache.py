@@ -0,0 +1,76 @@
+"""Records a full orchestration with a scripted model client and replays it offline from the response cache.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_llm_cache --runs 5 --delay 0.5
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from autogen_agentchat.base import TaskResult
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from llm_cache import RECORD, REPLAY, CachingChatCompletionClient, ResponseStore
+from magentic_one_helper import MagenticOneHelper
+
+AGENTS = [{"type": "MagenticOne", "name": "Coder"}]
+TASK = "Write a haiku about caching."
+
+
+async def run_task(
+    store: ResponseStore, mode: str, delay: float, logs_dir: str
+) -> tuple[float, int, str]:
+    """Runs the task once; returns its duration, its number of messages and its final answer."""
+    helper = MagenticOneHelper.from_env(logs_dir=logs_dir)
+    start = time.perf_counter()
+    await helper.initialize(
+        AGENTS,
+        model_client=CachingChatCompletionClient(
+            ScriptedChatCompletionClient(delay=delay), store, mode=mode, model="fake"
+        ),
+    )
+    result = None
+    async for message in helper.main(task=TASK):
+        if isinstance(message, TaskResult):
+            result = message
+    return (
+        time.perf_counter() - start,
+        len(result.messages),
+        result.messages[-1].content,
+    )
+
+
+async def run(runs: int, delay: float) -> None:
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = ResponseStore(Path(work_dir) / "responses.sqlite")
+        recorded, messages, answer = await run_task(store, RECORD, delay, work_dir)
+        print(f"Recorded {len(store)} responses in {recorded * 1000:.0f}ms")
+
+        replayed = []
+        for _ in range(runs):
+            elapsed, replay_messages, replay_answer = await run_task(
+                store, REPLAY, delay, work_dir
+            )
+            assert (replay_messages, replay_answer) == (messages, answer)
+            replayed.append(elapsed)
+        store.close()
+
+    print(
+        f"Replayed {runs} times: median {statistics.median(replayed) * 1000:.0f}ms "
+        f"({recorded / statistics.median(replayed):.0f}x faster), identical results"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--delay", type=float, default=0.5, help="Seconds per model call"
+    )
+    args = parser.parse_args()
+    asyncio.run(run(args.runs, args.delay))
@@ -0,0 +1,137 @@
+"""Compares least-outstanding-requests routing with random routing over fake deployments, and shows failover.
+
+One of the deployments is slower than the others, and in the failover scenario another one answers
+`503` to every call.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_model_router --calls 200 --concurrency 24
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Mapping, Optional, Sequence
+
+import httpx
+import openai
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from model_router import Deployment, ModelRouter, Route
+
+
+class FakeDeployment(ScriptedChatCompletionClient):
+    """Answers after `delay` seconds, or fails with `503` if `failing`."""
+
+    def __init__(self, delay: float, failing: bool = False) -> None:
+        super().__init__(delay=delay)
+        self.failing = failing
+        self.calls = 0
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        self.calls += 1
+        if self.failing:
+            await asyncio.sleep(0.01)
+            request = httpx.Request("POST", "https://fake.openai.azure.com/chat")
+            raise openai.InternalServerError(
+                "Service unavailable.",
+                response=httpx.Response(503, request=request),
+                body=None,
+            )
+        return await super().create(messages)
+
+
+class RandomRouter(ModelRouter):
+    """Picks a deployment at random, ignoring their load."""
+
+    async def _pick(self) -> Route:
+        route = random.choice(self.routes)
+        with route.state.lock:
+            route.state.outstanding += 1
+        return route
+
+
+def make_routes(name: str, delays: list[float], failing: int | None) -> list[Route]:
+    return [
+        Route(
+            Deployment(
+                azure_endpoint=f"https://{name}-{index}.openai.azure.com/",
+                azure_deployment=f"gpt-4o-{index}",
+                api_version="2024-10-21",
+                model="gpt-4o",
+            ),
+            FakeDeployment(delay, failing=index == failing),
+        )
+        for index, delay in enumerate(delays)
+    ]
+
+
+async def measure(router: ModelRouter, calls: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def call() -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await router.create([])
+                latencies.append(time.perf_counter() - start)
+            except openai.APIError:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "completed": len(latencies),
+        "failed": failures,
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "calls": [route.client.calls for route in router.routes],
+    }
+
+
+async def run(calls: int, concurrency: int) -> None:
+    delays = [0.1, 0.1, 0.5]
+    print(
+        f"{calls} calls, {concurrency} at once, over deployments answering in {delays}s:"
+    )
+    for scenario, failing in (("healthy", None), ("one failing", 0)):
+        for label, router_class in (
+            ("random", RandomRouter),
+            ("least outstanding", ModelRouter),
+        ):
+            routes = make_routes(
+                f"{scenario}-{label}".replace(" ", "-"), delays, failing
+            )
+            result = await measure(router_class(routes), calls, concurrency)
+            print(
+                f"  {scenario:>11}, {label:>17}: {result['completed']} completed, {result['failed']} failed, "
+                f"{result['throughput']:.1f} calls/s, p50 {result['p50']:.2f}s, p95 {result['p95']:.2f}s, "
+                f"calls per deployment {result['calls']}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=24)
+    args = parser.parse_args()
+    asyncio.run(run(args.calls, args.concurrency))
@@ -0,0 +1,164 @@
+"""Measures the screenshots the orchestrator sends to the model in a WebSurfer task, with and without deduplication.
+
+The orchestrator's context holds every message of the run, so each of its requests carries all the
+WebSurfer's screenshots so far. In `--unchanged` of the rounds the viewport did not change (a
+failed click, a scroll past the end of the page), at most by a blinking cursor. The requests are
+encoded as the OpenAI client does, and their vision tokens counted as it counts them. A ticker
+measures how long the event loop was blocked meanwhile; the fake client encodes in a thread, so the
+blocking measured is the deduplication's.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_screenshot_dedup --rounds 30 --unchanged 0.3
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Mapping, Optional, Sequence
+
+import PIL.Image
+import PIL.ImageDraw
+from autogen_core import CancellationToken, Image
+from autogen_core.models import (
+    AssistantMessage,
+    CreateResult,
+    LLMMessage,
+    RequestUsage,
+    UserMessage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from autogen_ext.models.openai._openai_client import calculate_vision_tokens
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from screenshot_dedup import ScreenshotDedupChatCompletionClient
+
+
+def screenshot(seed: int, cursor: bool) -> Image:
+    # A page of text lines, with or without a blinking cursor in its search box
+    rng = random.Random(seed)
+    page = PIL.Image.new("RGB", (1440, 900), "white")
+    draw = PIL.ImageDraw.Draw(page)
+    draw.rectangle((400, 20, 1040, 56), outline="gray")
+    if cursor:
+        draw.rectangle((410, 28, 411, 48), fill="black")
+    for y in range(80, 900, 24):
+        draw.rectangle((40, y, 40 + rng.randint(200, 1200), y + 10), fill="gray")
+    return Image(page)
+
+
+class EncodingClient(ScriptedChatCompletionClient):
+    """Encodes the images of each request, as the OpenAI client does before sending it, off the loop."""
+
+    def __init__(self) -> None:
+        super().__init__(delay=0)
+        self.images = 0
+        self.uploaded = 0
+        self.vision_tokens = 0
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        await asyncio.to_thread(self.encode, messages)
+        return CreateResult(
+            finish_reason="stop",
+            content="Scripted answer.",
+            usage=RequestUsage(prompt_tokens=0, completion_tokens=0),
+            cached=False,
+        )
+
+    def encode(self, messages: Sequence[LLMMessage]) -> None:
+        for message in messages:
+            if isinstance(message.content, list):
+                for item in message.content:
+                    if isinstance(item, Image):
+                        self.images += 1
+                        self.uploaded += len(
+                            item.to_openai_format()["image_url"]["url"]
+                        )
+                        self.vision_tokens += calculate_vision_tokens(item)
+
+
+class Ticker:
+    """Wakes up every `interval`, and records by how much later than that the loop let it."""
+
+    def __init__(self, interval: float = 0.001) -> None:
+        self.interval = interval
+        self.blocked = 0.0
+        self.longest = 0.0
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            late = time.perf_counter() - start - self.interval
+            # Timer granularity makes every wake-up a little late
+            if late > 0.005:
+                self.blocked += late
+                self.longest = max(self.longest, late)
+
+
+async def measure(rounds: int, unchanged: float, dedup: bool) -> dict:
+    rng = random.Random(0)
+    encoding = EncodingClient()
+    client = ScreenshotDedupChatCompletionClient(encoding) if dedup else encoding
+    thread: list[LLMMessage] = []
+    page = 0
+    elapsed = 0.0
+    ticker = Ticker()
+    ticking = asyncio.create_task(ticker.run())
+    for round in range(rounds):
+        if round > 0 and rng.random() >= unchanged:
+            page += 1
+        thread.append(AssistantMessage(content=f"Step {round}.", source="Orchestrator"))
+        thread.append(
+            UserMessage(
+                content=[f"I acted {round}.", screenshot(page, cursor=round % 2 == 0)],
+                source="WebSurfer",
+            )
+        )
+        start = time.perf_counter()
+        await client.create(thread)
+        elapsed += time.perf_counter() - start
+    ticking.cancel()
+    return {
+        "pages": page + 1,
+        "images": encoding.images,
+        "uploaded": encoding.uploaded,
+        "vision_tokens": encoding.vision_tokens,
+        "elapsed": elapsed,
+        "blocked": ticker.blocked,
+        "longest_stall": ticker.longest,
+    }
+
+
+async def run(rounds: int, unchanged: float) -> None:
+    for label, dedup in (("every screenshot", False), ("deduplicated", True)):
+        result = await measure(rounds, unchanged, dedup)
+        if not dedup:
+            print(
+                f"{rounds} orchestrator requests over {rounds} screenshots of "
+                f"{result['pages']} distinct viewports:"
+            )
+        print(
+            f"  {label:>16}: {result['images']} images, "
+            f"{result['uploaded'] / 2**20:.1f} MiB uploaded, "
+            f"{result['vision_tokens']} vision tokens, "
+            f"requests prepared in {result['elapsed']:.2f}s, "
+            f"loop blocked {result['blocked']:.2f}s (at most {result['longest_stall'] * 1000:.0f}ms)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--unchanged", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(run(args.rounds, args.unchanged))
@@ -0,0 +1,112 @@
+"""Measures how long saving a run's screenshots blocks the event loop, and the disk they take.
+
+A run's messages arrive every 20ms, each with a screenshot, `--repeated` of them the same as the
+one before (an unchanged viewport). They are saved as PNG on the event loop, as `MultimodalWebSurfer`
+saves its debug screenshots, or by a `ScreenshotSink`. Meanwhile a task that wakes every 5ms
+records how late it is: the event loop's lag, which delays every agent of the run.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_screenshot_sink --messages 40 --repeated 0.3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import PIL.Image
+import PIL.ImageDraw
+from autogen_agentchat.messages import MultiModalMessage
+from autogen_core import Image
+
+from screenshot_sink import ScreenshotSink
+
+
+def screenshot(seed: int) -> Image:
+    # A page of text lines around a noisy picture, which compresses as badly as a photo; the same
+    # for the same seed
+    rng = random.Random(seed)
+    page = PIL.Image.new("RGB", (1440, 900), "white")
+    draw = PIL.ImageDraw.Draw(page)
+    for y in range(20, 900, 24):
+        draw.rectangle((40, y, 40 + rng.randint(200, 800), y + 10), fill="gray")
+    noise = PIL.Image.frombytes("L", (400, 300), rng.randbytes(400 * 300))
+    page.paste(noise.convert("RGB"), (960, 60))
+    return Image(page)
+
+
+async def measure(
+    messages: list[MultiModalMessage], directory: str, format: str | None
+) -> dict:
+    lags = []
+    running = True
+
+    async def tick() -> None:
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    ticker = asyncio.create_task(tick())
+    sink = ScreenshotSink(directory, format=format) if format else None
+    start = time.perf_counter()
+    for number, message in enumerate(messages):
+        if sink is None:
+            message.content[1].image.save(os.path.join(directory, f"{number}.png"))
+        else:
+            sink.submit(message)
+        await asyncio.sleep(0.02)
+    if sink is not None:
+        await sink.aclose()
+    elapsed = time.perf_counter() - start
+    running = False
+    await ticker
+    return {
+        "max_lag": max(lags),
+        "mean_lag": statistics.mean(lags),
+        "files": len(os.listdir(directory)),
+        "bytes": sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)
+        ),
+        "elapsed": elapsed,
+    }
+
+
+async def run(count: int, repeated: float) -> None:
+    rng = random.Random(0)
+    page = 0
+    messages = []
+    for number in range(count):
+        if number > 0 and rng.random() >= repeated:
+            page += 1
+        messages.append(
+            MultiModalMessage(
+                content=[f"Screenshot {number}.", screenshot(page)], source="WebSurfer"
+            )
+        )
+    print(f"{count} screenshots of {page + 1} distinct pages:")
+    for label, format in (
+        ("PNG on the loop", None),
+        ("sink, WebP", "webp"),
+        ("sink, JPEG", "jpeg"),
+    ):
+        with tempfile.TemporaryDirectory() as directory:
+            result = await measure(messages, directory, format)
+        print(
+            f"  {label:>15}: event loop lag max {result['max_lag'] * 1000:.0f}ms, "
+            f"mean {result['mean_lag'] * 1000:.1f}ms; {result['files']} files, "
+            f"{result['bytes'] / 1024:.0f} KiB, done in {result['elapsed']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--repeated", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.repeated))
@@ -0,0 +1,62 @@
+"""Compares per-call `do_search` latency with a fresh `SearchClient` per call and with the agent's persistent client.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_search_client --calls 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.fake_search import make_model_client, start_fake_search
+from magentic_one_custom_rag_agent import MagenticOneRAGAgent
+
+
+async def fresh_client_search(agent: MagenticOneRAGAgent, query: str) -> None:
+    # The previous behaviour: a new client and connection for every tool call
+    async with agent.backend.config_search() as search_client:
+        results = await search_client.search(search_text=query, top=1)
+        async for _ in results:
+            pass
+
+
+async def measure(call, calls: int) -> list[float]:
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        await call(f"query {i}")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(calls: int) -> None:
+    runner, endpoint = await start_fake_search()
+    agent = MagenticOneRAGAgent(
+        "RAG",
+        model_client=make_model_client(),
+        index_name="benchmark",
+        search_endpoint=endpoint,
+        search_key="benchmark",
+    )
+    try:
+        before = await measure(lambda q: fresh_client_search(agent, q), calls)
+        after = await measure(agent.do_search, calls)
+    finally:
+        await agent.close()
+        await runner.cleanup()
+
+    for label, samples in (("fresh client", before), ("persistent client", after)):
+        print(
+            f"{label}: median={statistics.median(samples) * 1000:.2f}ms "
+            f"p95={statistics.quantiles(samples, n=20)[-1] * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.calls))
@@ -0,0 +1,106 @@
+"""Measures the import time of the app's and CLI's modules, and checks the agents' dependencies stay deferred.
+
+Each module is imported in a fresh interpreter with `python -X importtime`. The dependencies of the
+agent types and PromptFlow tracing must only be imported once `setup_agents` needs them: the script
+exits with status 1 if importing a module, or setting up a custom agent, loads any of them, or if an
+import takes longer than `--max-ms`.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = ["magentic_one_helper", "api", "utils"]
+
+# The modules only the agent types that use them, or tracing, may load
+DEFERRED = [
+    "autogen_ext.agents.file_surfer",
+    "autogen_ext.agents.magentic_one",
+    "autogen_ext.agents.web_surfer",
+    "autogen_ext.code_executors.azure",
+    "autogen_ext.code_executors.docker",
+    "azure.search.documents",
+    "markitdown",
+    "playwright",
+    "promptflow",
+]
+
+SETUP_CUSTOM_AGENT = """
+import asyncio, json, sys, tempfile
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from magentic_one_helper import MagenticOneHelper
+
+async def setup():
+    helper = MagenticOneHelper.from_env(logs_dir=tempfile.mkdtemp())
+    await helper.initialize(
+        [{"type": "Custom", "name": "Writer", "system_message": "", "description": "Writes."}],
+        model_client=ScriptedChatCompletionClient(),
+    )
+
+asyncio.run(setup())
+"""
+
+
+def loaded_deferred(code: str) -> list[str]:
+    # The deferred modules in `sys.modules` after running `code` in a fresh interpreter
+    check = f"\nprint(json.dumps([m for m in {DEFERRED!r} if m in sys.modules]))"
+    output = subprocess.run(
+        [sys.executable, "-c", "import json, sys\n" + code + check],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_time(module: str) -> float:
+    # The cumulative import time of `module` in milliseconds, as `-X importtime` reports it
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    for line in reversed(stderr.splitlines()):
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise RuntimeError(f"No import time reported for {module}.")
+
+
+def run(repeat: int, max_ms: float | None) -> int:
+    failures = 0
+    print(f"Import times, median of {repeat}:")
+    for module in MODULES:
+        median = statistics.median(import_time(module) for _ in range(repeat))
+        loaded = loaded_deferred(f"import {module}")
+        print(
+            f"  {module:>19}: {median:.0f}ms, deferred modules loaded: {loaded or 'none'}"
+        )
+        if loaded or (max_ms is not None and median > max_ms):
+            failures += 1
+
+    loaded = loaded_deferred(SETUP_CUSTOM_AGENT)
+    print(f"Deferred modules loaded by setting up a custom agent: {loaded or 'none'}")
+    if loaded:
+        failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Fails if the median import time of a module is longer",
+    )
+    args = parser.parse_args()
+    sys.exit(run(args.repeat, args.max_ms))
@@ -0,0 +1,132 @@
+"""Measures the time until the first response text is shown, with and without streaming model output.
+
+A scripted model client produces each response word by word; the orchestrator and a custom agent
+use it. Without streaming, nothing is shown until an agent's whole response is done.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_streaming --words 60 --word-delay 0.02
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_agentchat.base import TaskResult
+from autogen_agentchat.messages import TextMessage
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from magentic_one_helper import MagenticOneHelper
+from streaming import ModelStreamChunk
+
+AGENTS = [
+    {
+        "type": "Custom",
+        "name": "Writer",
+        "system_message": "You write.",
+        "description": "Writes text.",
+    }
+]
+
+
+class WordByWordClient(ScriptedChatCompletionClient):
+    """Produces `words` words per text response, one every `word_delay` seconds."""
+
+    def __init__(self, words: int, word_delay: float) -> None:
+        super().__init__(speaker="Writer", delay=0)
+        self.words = words
+        self.word_delay = word_delay
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        if json_output:
+            return await super().create(messages, json_output=True)
+        await asyncio.sleep(self.words * self.word_delay)
+        return self._text()
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        for word in range(self.words):
+            await asyncio.sleep(self.word_delay)
+            yield f"word{word} "
+        yield self._text()
+
+    def _text(self) -> CreateResult:
+        return CreateResult(
+            finish_reason="stop",
+            content="".join(f"word{word} " for word in range(self.words)),
+            usage=RequestUsage(prompt_tokens=100, completion_tokens=self.words),
+            cached=False,
+        )
+
+
+async def run_task(stream: bool, words: int, word_delay: float) -> dict:
+    with tempfile.TemporaryDirectory() as logs_dir:
+        helper = MagenticOneHelper.from_env(logs_dir=logs_dir)
+        helper.stream_model_output = stream
+        await helper.initialize(
+            AGENTS, model_client=WordByWordClient(words, word_delay)
+        )
+        start = time.perf_counter()
+        first_text = None
+        # The delay between the first text of a response and its complete message
+        first_chunk_at: dict[str, float] = {}
+        waits = []
+        async for message in helper.main(task="Write something."):
+            now = time.perf_counter()
+            if isinstance(message, ModelStreamChunk):
+                first_chunk_at.setdefault(message.source, now)
+                first_text = first_text or now - start
+            elif isinstance(message, TextMessage) and message.source != "user":
+                first_text = first_text or now - start
+                if message.source in first_chunk_at:
+                    waits.append(now - first_chunk_at.pop(message.source))
+            elif isinstance(message, TaskResult):
+                total = now - start
+    return {
+        "first_text": first_text,
+        "total": total,
+        "hidden": statistics.mean(waits) if waits else 0.0,
+    }
+
+
+async def run(words: int, word_delay: float) -> None:
+    print(
+        f"Responses of {words} words at {word_delay * 1000:.0f}ms per word "
+        f"({words * word_delay:.1f}s per response):"
+    )
+    for stream in (False, True):
+        result = await run_task(stream, words, word_delay)
+        print(
+            f"  {'streaming' if stream else 'complete messages':>17}: first text after "
+            f"{result['first_text']:.2f}s, run {result['total']:.2f}s, text shown "
+            f"{result['hidden']:.2f}s before its message on average"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=60)
+    parser.add_argument("--word-delay", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(run(args.words, args.word_delay))
@@ -0,0 +1,129 @@
+"""Checks the checkout timeout, waiter wake-up, workspace export and background reaper of `CodeExecutorPool`.
+
+The pool serves `LocalCommandLineCodeExecutor`s, so no Docker is needed. Each check prints `ok`
+or fails with an `AssertionError`.
+
+Run from the `src` directory:
+
+    python -m benchmarks.check_executor_pool
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock
+from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
+
+from executor_pool import CodeExecutorPool
+
+
+def write(name: str, text: str) -> CodeBlock:
+    return CodeBlock(
+        code=f"with open({name!r}, 'w') as f:\n    f.write({text!r})",
+        language="python",
+    )
+
+
+async def check_timeout(pool: CodeExecutorPool) -> None:
+    held = await pool.acquire()
+    start = time.perf_counter()
+    try:
+        await pool.acquire(timeout=0.2)
+        raise AssertionError("acquire returned from a full pool")
+    except asyncio.TimeoutError:
+        pass
+    waited = time.perf_counter() - start
+    assert 0.2 <= waited < 1, waited
+    assert pool.metrics["waiting"] == 0, pool.metrics
+    await pool.release(held)
+
+
+async def check_wake_up(pool: CodeExecutorPool) -> None:
+    held = await pool.acquire()
+    cancelled = asyncio.create_task(pool.acquire())
+    waiting = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0.1)
+    assert pool.metrics["waiting"] == 2, pool.metrics
+    # The first waiter is woken, and gives up before it runs; it must wake the second one instead
+    await pool.release(held)
+    cancelled.cancel()
+    pooled = await asyncio.wait_for(waiting, 1)
+    assert pooled.executor is held.executor
+    assert pool.metrics["waiting"] == 0, pool.metrics
+    await pool.release(pooled)
+
+
+async def check_export(pool: CodeExecutorPool, export_dir: Path) -> None:
+    for run_number in range(2):
+        pooled = await pool.acquire()
+        assert not any(pooled.work_dir.iterdir()), list(pooled.work_dir.iterdir())
+        result = await pooled.executor.execute_code_blocks(
+            [write("answer.txt", f"run {run_number}")], CancellationToken()
+        )
+        assert result.exit_code == 0, result.output
+        await pool.release(pooled, export_dir=export_dir)
+        assert not any(pooled.work_dir.iterdir()), list(pooled.work_dir.iterdir())
+        # A later run's output replaces the earlier one of the same name
+        assert (export_dir / "answer.txt").read_text() == f"run {run_number}"
+
+
+async def check_reaper(work_root: Path) -> None:
+    pool = CodeExecutorPool(
+        lambda work_dir: LocalCommandLineCodeExecutor(work_dir=work_dir),
+        work_root=work_root,
+        max_size=3,
+        max_idle=2,
+        idle_timeout=0.3,
+        reap_interval=0.1,
+        min_idle=1,
+    )
+    # The first checkout starts the background task, which prewarms an executor
+    held = await pool.acquire()
+    await asyncio.sleep(0.05)
+    assert pool.metrics["idle"] == 1 and pool.metrics["created"] == 2, pool.metrics
+    await pool.release(held)
+    assert pool.metrics["idle"] == 2, pool.metrics
+    # Both expire; the task stops them without a checkout, and starts a fresh one
+    await asyncio.sleep(0.6)
+    metrics = pool.metrics
+    assert metrics["evicted"] >= 2 and metrics["idle"] == 1, metrics
+    assert metrics["checkouts"] == 1, metrics
+    reaper = pool._reaper
+    await pool.close()
+    await asyncio.sleep(0)
+    assert reaper.cancelled() and pool.metrics["size"] == 0, pool.metrics
+
+
+async def run() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        pool = CodeExecutorPool(
+            lambda work_dir: LocalCommandLineCodeExecutor(work_dir=work_dir),
+            work_root=Path(directory) / "pool",
+            max_size=1,
+            max_idle=1,
+        )
+        for label, check in (
+            ("checkout timeout", lambda: check_timeout(pool)),
+            ("waiter wake-up", lambda: check_wake_up(pool)),
+            (
+                "workspace export",
+                lambda: check_export(pool, Path(directory) / "export"),
+            ),
+        ):
+            await check()
+            print(f"  {label:>17}: ok")
+        print(f"  {'metrics':>17}: {pool.metrics}")
+        await pool.close()
+
+        await check_reaper(Path(directory) / "reaped")
+        print(f"  {'background reaper':>17}: ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    asyncio.run(run())
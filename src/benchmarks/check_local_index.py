@@ -0,0 +1,167 @@
+"""Checks the ranking, `top` and `k` handling and reloading of `LocalVectorIndex` and `LocalSearchBackend`.
+
+A small index of one chunk per topic is built with the `HashingEmbedder`. Each check prints `ok` or
+fails with an `AssertionError`.
+
+Run from the `src` directory:
+
+    python -m benchmarks.check_local_index
+"""
+
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from local_vector_index import LocalVectorIndex
+from rag_backends import LocalSearchBackend, RAGSearchOptions
+from rag_embeddings import HashingEmbedder
+
+TOPICS = {
+    "returns": "Items can be returned within 30 days for a full refund.",
+    "shipping": "Orders ship within two business days by ground courier.",
+    "warranty": "The warranty covers manufacturing defects for one year.",
+    "offices": "Our offices are in Lisbon, Oslo and Toronto.",
+    "support": "Support is available by chat and phone on weekdays.",
+}
+MORE_TOPICS = {
+    "payments": "We accept credit cards, bank transfers and vouchers.",
+    "privacy": "Personal data is never sold and is deleted on request.",
+}
+
+
+async def build(path: Path, embedder: HashingEmbedder, topics: dict) -> range:
+    index = (
+        LocalVectorIndex(path)
+        if LocalVectorIndex.exists(path)
+        else LocalVectorIndex.create(path, embedder.dimensions, embedder.name)
+    )
+    chunks = [
+        {"parent_id": topic, "chunk_id": f"{topic}-0", "chunk": text}
+        for topic, text in topics.items()
+    ]
+    return index.append(chunks, await embedder.embed(list(topics.values())))
+
+
+async def search(
+    backend: LocalSearchBackend, query: str, hybrid: bool = False, **options
+) -> list[str]:
+    return [
+        document["parent_id"]
+        async for document in backend.search(
+            query, RAGSearchOptions(**options), hybrid=hybrid
+        )
+    ]
+
+
+async def check_ranking(backend: LocalSearchBackend) -> None:
+    for topic, query in (
+        ("returns", "Can I get a refund if I return an item?"),
+        ("offices", "Where are your offices?"),
+        ("warranty", "what does the warranty cover"),
+    ):
+        found = await search(backend, query, top=3)
+        assert found[0] == topic, (query, found)
+        assert len(set(found)) == len(found), found
+    query_vector = (await backend.embedder.embed(["refund for a returned item"]))[0]
+    scores = [score for _, score in backend.index.search(query_vector, 5)]
+    assert scores == sorted(scores, reverse=True), scores
+    # The scan in a worker thread, as for large indexes, ranks the same
+    backend.THREAD_THRESHOLD = 0
+    threaded = await search(backend, "Where are your offices?", top=3)
+    del backend.THREAD_THRESHOLD
+    assert threaded == await search(backend, "Where are your offices?", top=3)
+
+
+async def check_top_and_k(backend: LocalSearchBackend) -> None:
+    query = "When will my order ship?"
+    assert len(await search(backend, query, top=2)) == 2
+    # A vector search finds the `k` nearest neighbors, and returns up to `top` of them
+    assert len(await search(backend, query, top=4, k=2)) == 2
+    assert (
+        await search(backend, query, top=4, k=2)
+        == (await search(backend, query, top=4, k=4))[:2]
+    )
+    assert await search(backend, query, top=0) == []
+    # More than the index holds returns every row once
+    assert sorted(await search(backend, query, top=50, k=50)) == sorted(TOPICS)
+    # A hybrid search re-ranks `k` candidates, and still returns `top`
+    assert len(await search(backend, query, hybrid=True, top=1, k=4)) == 1
+    hybrid = await search(backend, "ship order ground courier", hybrid=True, top=3)
+    assert hybrid[0] == "shipping", hybrid
+    # Deleted rows are skipped, and do not count towards `top`
+    backend.index.delete([0])
+    assert "returns" not in await search(backend, "refund returned", top=50, k=50)
+    assert len(await search(backend, query, top=50, k=50)) == len(TOPICS) - 1
+
+
+async def check_reload(path: Path, embedder: HashingEmbedder) -> None:
+    before = LocalVectorIndex(path)
+    query_vector = (await embedder.embed(["chat support on weekdays"]))[0]
+    expected = before.search(query_vector, 3)
+    # An append that crashed before its commit leaves bytes past the committed sizes
+    with open(path / LocalVectorIndex.VECTORS_FILE, "ab") as file:
+        file.write(np.ones(embedder.dimensions, dtype=np.float32).tobytes())
+    with open(path / LocalVectorIndex.CHUNKS_FILE, "ab") as file:
+        file.write(b'{"parent_id": "partial"')
+
+    reloaded = LocalVectorIndex(path)
+    assert isinstance(reloaded.vectors, np.memmap), type(reloaded.vectors)
+    # The row deleted above stays deleted
+    assert len(reloaded) == len(before) and reloaded.deleted == {0}
+    assert reloaded.search(query_vector, 3) == expected
+    assert reloaded.get([row for row, _ in expected]) == before.get(
+        [row for row, _ in expected]
+    )
+
+    # The next append overwrites the partial one
+    rows = await build(path, embedder, MORE_TOPICS)
+    reloaded = LocalVectorIndex(path)
+    assert len(reloaded) == len(before) + len(MORE_TOPICS)
+    assert [chunk["parent_id"] for chunk in reloaded.get(rows)] == list(MORE_TOPICS)
+    backend = LocalSearchBackend(reloaded)
+    assert (await search(backend, "Do you accept credit cards?"))[0] == "payments"
+    assert (await search(backend, "chat support on weekdays"))[0] == "support"
+
+
+async def check_refresh(path: Path, embedder: HashingEmbedder) -> None:
+    backend = LocalSearchBackend(path)
+    assert not backend.refresh()
+    # Another process, such as `rag_ingest`, deletes a chunk and appends another
+    writer = LocalVectorIndex(path)
+    writer.delete([len(writer) - 1])
+    await build(path, embedder, {"loyalty": "Members earn points on every order."})
+    # The RAG agent refreshes its backend before each search
+    assert backend.refresh()
+    found = await search(backend, "earn loyalty points", top=50, k=50)
+    assert found[0] == "loyalty" and "privacy" not in found, found
+    assert not backend.refresh()
+    # A compaction renumbers the rows; searches of the previous generation still work until a refresh
+    LocalVectorIndex(path).compact()
+    assert await search(backend, "earn loyalty points", top=50, k=50) == found
+    assert backend.refresh() and not backend.index.deleted
+    assert await search(backend, "earn loyalty points", top=50, k=50) == found
+
+
+async def run() -> None:
+    embedder = HashingEmbedder(256)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "index"
+        await build(path, embedder, TOPICS)
+        backend = LocalSearchBackend(path)
+        for label, check in (
+            ("ranking", lambda: check_ranking(backend)),
+            ("top and k", lambda: check_top_and_k(backend)),
+            ("memmap reload", lambda: check_reload(path, embedder)),
+            ("live refresh", lambda: check_refresh(path, embedder)),
+        ):
+            await check()
+            print(f"  {label:>13}: ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    asyncio.run(run())
@@ -0,0 +1,165 @@
+"""Checks that `rag_ingest.ingest` re-embeds changed files only, prunes deleted ones and compacts the index.
+
+The documents are small text files, split into several chunks each and embedded in small batches by
+a fake embedder, which records the chunks it was asked to embed. Each check prints `ok` or fails
+with an `AssertionError`.
+
+Run from the `src` directory:
+
+    python -m benchmarks.check_rag_ingest
+"""
+
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from local_vector_index import LocalVectorIndex
+from rag_embeddings import HashingEmbedder
+from rag_ingest import _Manifest, ingest
+
+DOCUMENTS = {
+    "returns.txt": "Items can be returned within 30 days for a full refund. " * 8,
+    "shipping.md": "Orders ship within two business days by ground courier. " * 8,
+    "warranty.txt": "The warranty covers manufacturing defects for one year. " * 8,
+}
+OPTIONS = {"batch_size": 3, "chunk_size": 200, "overlap": 20}
+
+
+class FakeEmbedder(HashingEmbedder):
+    """Embeds like the `HashingEmbedder`, a little later, and records the texts it embedded."""
+
+    def __init__(self) -> None:
+        super().__init__(64)
+        self.texts: list[str] = []
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        self.texts += texts
+        await asyncio.sleep(0.01)
+        return await super().embed(texts)
+
+
+def live_chunks(index_dir: Path) -> dict[str, list[str]]:
+    # The chunks a search can return, by file
+    index = LocalVectorIndex(index_dir)
+    rows = [row for row in range(len(index)) if row not in index.deleted]
+    chunks: dict[str, list[str]] = {}
+    for document in index.get(rows):
+        chunks.setdefault(Path(document["parent_id"]).name, []).append(
+            document["chunk"]
+        )
+    return chunks
+
+
+def check_manifest(index_dir: Path) -> LocalVectorIndex:
+    # Every file's rows in the manifest are live and hold its chunks
+    index = LocalVectorIndex(index_dir)
+    manifest = _Manifest(index_dir)
+    assert manifest.generation == index.generation, manifest.generation
+    for parent_id in manifest.sources:
+        rows = manifest.rows(parent_id)
+        assert rows and not index.deleted & set(rows), (parent_id, rows)
+        assert {d["parent_id"] for d in index.get(rows)} == {parent_id}, parent_id
+    return index
+
+
+async def check_first_run(index_dir: Path, docs: Path) -> None:
+    embedder = FakeEmbedder()
+    stats = await ingest(index_dir, [docs], embedder, **OPTIONS)
+    assert stats.files_indexed == 3 and stats.files_unchanged == 0, stats
+    assert stats.chunks_embedded == len(embedder.texts) > 3, stats
+    assert sorted(live_chunks(index_dir)) == sorted(DOCUMENTS)
+
+
+async def check_unchanged(index_dir: Path, docs: Path) -> None:
+    before = live_chunks(index_dir)
+    embedder = FakeEmbedder()
+    stats = await ingest(index_dir, [docs], embedder, **OPTIONS)
+    assert stats.files_unchanged == 3 and stats.files_indexed == 0, stats
+    assert embedder.texts == [], embedder.texts
+    assert live_chunks(index_dir) == before
+
+
+async def check_changed(index_dir: Path, docs: Path) -> None:
+    before = live_chunks(index_dir)
+    text = "Orders ship the same day by express courier. " * 8
+    (docs / "shipping.md").write_text(text)
+    embedder = FakeEmbedder()
+    stats = await ingest(index_dir, [docs], embedder, **OPTIONS)
+    assert stats.files_indexed == 1 and stats.files_unchanged == 2, stats
+    # Only the changed file is embedded, and its previous chunks are no longer found
+    assert all("express" in chunk for chunk in embedder.texts), embedder.texts
+    after = live_chunks(index_dir)
+    assert after["shipping.md"] == embedder.texts, after["shipping.md"]
+    assert after["returns.txt"] == before["returns.txt"]
+    assert after["warranty.txt"] == before["warranty.txt"]
+
+
+async def check_deleted(index_dir: Path, docs: Path) -> None:
+    (docs / "warranty.txt").unlink()
+    embedder = FakeEmbedder()
+    # Without pruning, a file that is no longer found stays in the index
+    stats = await ingest(index_dir, [docs], embedder, **OPTIONS)
+    assert stats.files_removed == 0 and "warranty.txt" in live_chunks(index_dir)
+    stats = await ingest(index_dir, [docs], embedder, prune=True, **OPTIONS)
+    assert stats.files_removed == 1 and stats.files_unchanged == 2, stats
+    assert embedder.texts == [], embedder.texts
+    assert sorted(live_chunks(index_dir)) == ["returns.txt", "shipping.md"]
+    manifest = _Manifest(index_dir)
+    assert not any(name.endswith("warranty.txt") for name in manifest.sources)
+
+
+async def check_compaction(index_dir: Path, docs: Path) -> None:
+    # The changed and pruned files left deleted rows behind, which the runs compacted away
+    index = check_manifest(index_dir)
+    assert index.generation >= 1 and not index.deleted, index.deleted
+    live = sum(map(len, live_chunks(index_dir).values()))
+    assert len(index) == live, (len(index), live)
+
+    text = "Items can be returned within 60 days, unused. " * 8
+    (docs / "returns.txt").write_text(text)
+    # Below the threshold, the deleted rows stay
+    stats = await ingest(
+        index_dir, [docs], FakeEmbedder(), compact_threshold=2, **OPTIONS
+    )
+    assert stats.rows_compacted == 0 and LocalVectorIndex(index_dir).deleted
+    before = live_chunks(index_dir)
+    # A run that was interrupted after compacting the index leaves the manifest a generation behind
+    LocalVectorIndex(index_dir).compact()
+    stats = await ingest(index_dir, [docs], FakeEmbedder(), **OPTIONS)
+    assert stats.files_unchanged == 2 and stats.rows_compacted == 0, stats
+    check_manifest(index_dir)
+    assert live_chunks(index_dir) == before
+
+
+async def run() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        docs = Path(directory) / "docs"
+        docs.mkdir()
+        for name, text in DOCUMENTS.items():
+            (docs / name).write_text(text)
+        index_dir = Path(directory) / "index"
+        for label, check in (
+            ("first run", check_first_run),
+            ("unchanged files", check_unchanged),
+            ("changed file", check_changed),
+            ("deleted file", check_deleted),
+            ("compaction", check_compaction),
+        ):
+            await check(index_dir, docs)
+            print(f"  {label:>15}: ok")
+        index = LocalVectorIndex(index_dir)
+        print(
+            f"  {'index':>15}: {len(index)} rows, {len(index.deleted)} deleted, "
+            f"{len(_Manifest(index_dir).sources)} files, generation {index.generation}"
+        )
+        print(f"  {'files':>15}: {sorted(p.name for p in index_dir.iterdir())}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    asyncio.run(run())
@@ -0,0 +1,152 @@
+"""Checks the retries and token accounting of `RateLimitedChatCompletionClient`, streaming or not.
+
+The fake deployment throttles its first calls with a `429` and a `retry-after-ms` header, like Azure
+OpenAI, or fails a stream after its first chunk. Each check prints `ok` or fails with an
+`AssertionError`.
+
+Run from the `src` directory:
+
+    python -m benchmarks.check_rate_limit
+"""
+
+import argparse
+import asyncio
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+import httpx
+import openai
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from client_wrappers import RateLimitedChatCompletionClient, RateLimiter
+
+# The client reserves its expected completion tokens, as the fake deployment counts no prompt tokens
+RESERVED = 500
+USED = 120
+
+
+def error(status: int) -> openai.APIStatusError:
+    request = httpx.Request("POST", "https://fake.openai.azure.com/chat")
+    response = httpx.Response(status, headers={"retry-after-ms": "20"}, request=request)
+    return openai.APIStatusError(f"Status {status}.", response=response, body=None)
+
+
+class FlakyDeployment(ScriptedChatCompletionClient):
+    """Fails its first `failures` calls with `status`, or with `mid_stream` fails streams after a chunk."""
+
+    def __init__(
+        self, failures: int = 0, status: int = 429, mid_stream: bool = False
+    ) -> None:
+        super().__init__(delay=0)
+        self.failures = failures
+        self.status = status
+        self.mid_stream = mid_stream
+        self.calls = 0
+
+    async def create(
+        self, messages: Sequence[LLMMessage], **kwargs: Any
+    ) -> CreateResult:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise error(self.status)
+        return await super().create(messages, **kwargs)
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        result = await self.create(messages)
+        yield "Scripted "
+        if self.mid_stream:
+            raise error(503)
+        yield result
+
+
+def client(deployment: FlakyDeployment) -> RateLimitedChatCompletionClient:
+    # A token bucket that barely refills while a check runs
+    limiter = RateLimiter(tokens_per_minute=600, burst=60)
+    return RateLimitedChatCompletionClient(
+        deployment, limiter, expected_completion_tokens=RESERVED
+    )
+
+
+async def stream(wrapped: RateLimitedChatCompletionClient) -> list:
+    return [chunk async for chunk in wrapped.create_stream([])]
+
+
+def level(wrapped: RateLimitedChatCompletionClient) -> float:
+    return wrapped.limiter.tokens._level
+
+
+async def check_create() -> None:
+    deployment = FlakyDeployment(failures=2)
+    wrapped = client(deployment)
+    result = await wrapped.create([])
+    assert result.content == "Scripted answer." and deployment.calls == 3
+    assert wrapped.limiter.throttled == 2 and wrapped.limiter.retries == 2
+    capacity = wrapped.limiter.tokens.capacity
+    # Only the call that succeeded used tokens
+    assert capacity - USED <= level(wrapped) < capacity - USED + 5, level(wrapped)
+
+
+async def check_stream_before_first_chunk() -> None:
+    for status in (429, 503):
+        deployment = FlakyDeployment(failures=2, status=status)
+        wrapped = client(deployment)
+        chunks = await stream(wrapped)
+        assert chunks[0] == "Scripted " and isinstance(chunks[-1], CreateResult)
+        assert deployment.calls == 3 and wrapped.limiter.retries == 2
+        assert wrapped.limiter.throttled == (2 if status == 429 else 0)
+        capacity = wrapped.limiter.tokens.capacity
+        assert capacity - USED <= level(wrapped) < capacity - USED + 5, level(wrapped)
+
+
+async def check_stream_after_first_chunk() -> None:
+    deployment = FlakyDeployment(mid_stream=True)
+    wrapped = client(deployment)
+    chunks = []
+    try:
+        async for chunk in wrapped.create_stream([]):
+            chunks.append(chunk)
+        raise AssertionError("a stream cut short was not raised")
+    except openai.APIStatusError as e:
+        assert e.status_code == 503
+    # Not retried, as its first chunk was already passed on
+    assert chunks == ["Scripted "] and deployment.calls == 1
+    assert level(wrapped) >= wrapped.limiter.tokens.capacity - 1, level(wrapped)
+
+
+async def check_not_retryable() -> None:
+    deployment = FlakyDeployment(failures=1, status=400)
+    wrapped = client(deployment)
+    try:
+        await stream(wrapped)
+        raise AssertionError("a 400 was retried")
+    except openai.APIStatusError as e:
+        assert e.status_code == 400
+    assert deployment.calls == 1 and wrapped.limiter.retries == 0
+    assert level(wrapped) >= wrapped.limiter.tokens.capacity - 1, level(wrapped)
+
+
+async def run() -> None:
+    for label, check in (
+        ("429 on create", check_create),
+        ("429 and 503 before a stream", check_stream_before_first_chunk),
+        ("503 mid-stream", check_stream_after_first_chunk),
+        ("400 on a stream", check_not_retryable),
+    ):
+        await check()
+        print(f"  {label:>27}: ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    asyncio.run(run())
@@ -0,0 +1,180 @@
+"""Checks the hits, misses, expiry, eviction and similarity tier of the RAG agent's `SearchResultCache`.
+
+The agent searches an in-memory `FakeSearchClient`, which counts the searches that reached it. The
+similarity tier is enabled by an agent configuration with a local index and the `HashingEmbedder`,
+whose cached results are dropped once the index changes.
+Each check prints `ok` or fails with an `AssertionError`.
+
+Run from the `src` directory:
+
+    python -m benchmarks.check_search_cache
+"""
+
+import argparse
+import asyncio
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+from agent_registry import build_rag_agent
+from benchmarks.fake_search import FakeSearchClient, make_model_client
+from local_vector_index import LocalVectorIndex
+from magentic_one_custom_rag_agent import MagenticOneRAGAgent
+from rag_embeddings import HashingEmbedder
+from search_cache import SearchResultCache, get_search_cache
+
+TTL = 0.2
+
+
+async def search(
+    agent: MagenticOneRAGAgent, client: FakeSearchClient, query: str
+) -> tuple[str, bool]:
+    # The answer, and whether it came from the cache
+    before = client.searches
+    answer = await agent.do_search(query)
+    return answer, client.searches == before
+
+
+async def check_miss_and_hit(
+    agent: MagenticOneRAGAgent, client: FakeSearchClient, cache: SearchResultCache
+) -> None:
+    answer, cached = await search(agent, client, "What is the return policy?")
+    assert not cached and "return policy" in answer, answer
+    assert cache.stats["misses"] == 1, cache.stats
+    # Differently cased and punctuated, the same query
+    again, cached = await search(agent, client, "what is the  return policy")
+    assert cached and again == answer, again
+    assert cache.stats["hits"] == 1, cache.stats
+
+
+async def check_ttl(
+    agent: MagenticOneRAGAgent, client: FakeSearchClient, cache: SearchResultCache
+) -> None:
+    await asyncio.sleep(TTL * 1.5)
+    _, cached = await search(agent, client, "What is the return policy?")
+    assert not cached, cache.stats
+    _, cached = await search(agent, client, "What is the return policy?")
+    assert cached, cache.stats
+
+
+async def check_eviction(
+    agent: MagenticOneRAGAgent, client: FakeSearchClient, cache: SearchResultCache
+) -> None:
+    # The cache holds two results; the least recently used goes first
+    await search(agent, client, "Where are the offices?")
+    _, cached = await search(agent, client, "What is the return policy?")
+    assert cached, cache.stats
+    await search(agent, client, "Who is the CEO?")
+    assert cache.stats["evictions"] == 1, cache.stats
+    _, cached = await search(agent, client, "What is the return policy?")
+    assert cached, cache.stats
+    _, cached = await search(agent, client, "Where are the offices?")
+    assert not cached, cache.stats
+
+
+async def check_services(
+    agent: MagenticOneRAGAgent, client: FakeSearchClient, cache: SearchResultCache
+) -> None:
+    # An index of the same name on another search service has results of its own
+    other_client = FakeSearchClient()
+    other = rag_agent(other_client, cache, "https://other.search.windows.net")
+    try:
+        _, cached = await search(other, other_client, "Where are the offices?")
+        assert not cached, cache.stats
+        _, cached = await search(agent, client, "Where are the offices?")
+        assert cached, cache.stats
+    finally:
+        await other.close()
+
+
+async def check_similarity(directory: str) -> SearchResultCache:
+    embedder = HashingEmbedder(1024)
+    index = LocalVectorIndex.create(
+        Path(directory) / "index", embedder.dimensions, embedder.name
+    )
+    texts = ["Damaged items can be returned for a full refund.", "Offices: Oslo."]
+    index.append(
+        [
+            {"parent_id": "kb", "chunk_id": f"kb-{i}", "chunk": text}
+            for i, text in enumerate(texts)
+        ],
+        await embedder.embed(texts),
+    )
+    helper = SimpleNamespace(search_endpoint=None, search_key=None)
+    config = {
+        "type": "RAG",
+        "name": "RAG",
+        "description": "Searches the knowledge base.",
+        "backend": "local",
+        "index_path": str(index.path),
+        "cache_embedder": embedder.name,
+    }
+    agent = await build_rag_agent(helper, config, make_model_client())
+    cache = agent.cache
+    try:
+        assert cache is get_search_cache(embedder.name) and cache.embedder is not None
+        query = "what is the return policy for damaged items bought online"
+        answer = await agent.do_search(query)
+        # Almost the same query embeds almost the same, and is answered from the cache
+        assert await agent.do_search(query + " today") == answer
+        assert cache.stats["semantic_hits"] == 1, cache.stats
+        await agent.do_search("where are your offices")
+        assert cache.stats["semantic_hits"] == 1, cache.stats
+        assert cache.stats["misses"] == 2, cache.stats
+        # Re-ingesting drops the index's cached results, so the live agent answers from the new rows
+        writer = LocalVectorIndex(index.path)
+        writer.delete([0])
+        text = "Damaged items bought online can be exchanged, not refunded."
+        writer.append(
+            [{"parent_id": "kb", "chunk_id": "kb-2", "chunk": text}],
+            await embedder.embed([text]),
+        )
+        answer = await agent.do_search(query)
+        assert "exchanged" in answer and "full refund" not in answer, answer
+        assert cache.stats["misses"] == 3, cache.stats
+    finally:
+        await agent.close()
+    return cache
+
+
+def rag_agent(
+    client: FakeSearchClient, cache: SearchResultCache, endpoint: str
+) -> MagenticOneRAGAgent:
+    return MagenticOneRAGAgent(
+        "RAG",
+        model_client=make_model_client(),
+        index_name="check",
+        search_endpoint=endpoint,
+        search_key="check",
+        cache=cache,
+        search_client=client,
+    )
+
+
+async def run() -> None:
+    client = FakeSearchClient()
+    cache = SearchResultCache(max_entries=2, ttl=TTL)
+    agent = rag_agent(client, cache, "https://fake.search.windows.net")
+    try:
+        for label, check in (
+            ("miss and hit", check_miss_and_hit),
+            ("expiry", check_ttl),
+            ("eviction", check_eviction),
+            ("services", check_services),
+        ):
+            await check(agent, client, cache)
+            print(f"  {label:>12}: ok")
+        print(f"  {'cache':>12}: {cache.stats}, {client.searches} searches")
+    finally:
+        await agent.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = await check_similarity(directory)
+    print(f"  {'similarity':>12}: ok")
+    print(f"  {'cache':>12}: {cache.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+    asyncio.run(run())
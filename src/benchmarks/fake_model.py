@@ -0,0 +1,113 @@
+"""A scripted `ChatCompletionClient` that drives a `MagenticOneGroupChat` without a model, used by the benchmarks."""
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+
+class ScriptedChatCompletionClient(ChatCompletionClient):
+    """
+    Answers every call after `delay` seconds. The orchestrator's progress ledger hands `rounds` turns
+    to `speaker` and then reports the request as satisfied; all other calls get a short text.
+    """
+
+    def __init__(
+        self, speaker: str = "Coder", rounds: int = 2, delay: float = 0.05
+    ) -> None:
+        self.speaker = speaker
+        self.rounds = rounds
+        self.delay = delay
+        self.ledgers = 0
+        self.usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+
+    def _ledger(self) -> str:
+        self.ledgers += 1
+        done = self.ledgers > self.rounds
+        answers = {
+            "is_request_satisfied": done,
+            "is_in_loop": False,
+            "is_progress_being_made": True,
+            "next_speaker": self.speaker,
+            "instruction_or_question": f"Work on step {self.ledgers}.",
+        }
+        return json.dumps(
+            {
+                key: {"reason": "Scripted.", "answer": answer}
+                for key, answer in answers.items()
+            }
+        )
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        await asyncio.sleep(self.delay)
+        usage = RequestUsage(prompt_tokens=100, completion_tokens=20)
+        self.usage = RequestUsage(
+            prompt_tokens=self.usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self.usage.completion_tokens + usage.completion_tokens,
+        )
+        return CreateResult(
+            finish_reason="stop",
+            content=self._ledger() if json_output else "Scripted answer.",
+            usage=usage,
+            cached=False,
+        )
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        result = await self.create(messages, json_output=json_output)
+        yield result.content
+        yield result
+
+    def actual_usage(self) -> RequestUsage:
+        return self.usage
+
+    def total_usage(self) -> RequestUsage:
+        return self.usage
+
+    def count_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return 0
+
+    def remaining_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return 128000
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return {"vision": True, "function_calling": True, "json_output": True}
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return {
+            "vision": True,
+            "function_calling": True,
+            "json_output": True,
+            "family": "gpt-4o",
+        }
@@ -0,0 +1,84 @@
+"""A local stand-in for the Azure AI Search documents endpoint, used by the benchmarks."""
+
+from typing import Any, AsyncIterator
+
+from aiohttp import web
+from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+
+
+def _results(query: str, top: int) -> list[dict]:
+    return [
+        {
+            "@search.score": 1.0 / (i + 1),
+            "parent_id": "parent-0",
+            "chunk_id": f"chunk-{i}",
+            "chunk": f"Chunk {i} for '{query}'. ",
+        }
+        for i in range(top)
+    ]
+
+
+async def _search(request: web.Request) -> web.Response:
+    body = await request.json()
+    return web.json_response(
+        {"value": _results(body.get("search") or "", body.get("top") or 1)}
+    )
+
+
+class FakeSearchClient:
+    """An in-memory stand-in for `SearchClient`, which counts the searches it answers."""
+
+    def __init__(self) -> None:
+        self.searches = 0
+
+    async def search(
+        self,
+        search_text: str | None = None,
+        vector_queries: list | None = None,
+        top: int | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[dict]:
+        self.searches += 1
+        query = search_text or (vector_queries[0].text if vector_queries else "")
+
+        async def results() -> AsyncIterator[dict]:
+            for result in _results(query, top or 1):
+                yield result
+
+        return results()
+
+    async def close(self) -> None:
+        pass
+
+
+async def start_fake_search(port: int = 0) -> tuple[web.AppRunner, str]:
+    """
+    Starts the fake search service on localhost.
+
+    Args:
+        port (int, optional): The port to listen on, 0 picks a free one. Defaults to 0.
+
+    Returns:
+        tuple[web.AppRunner, str]: The runner (call `cleanup()` to stop it) and the service endpoint.
+    """
+    app = web.Application()
+    app.router.add_post("/indexes('{index}')/docs/search.post.search", _search)
+    app.router.add_post("/indexes/{index}/docs/search.post.search", _search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def make_model_client() -> AzureOpenAIChatCompletionClient:
+    """Returns a model client that is never called, to satisfy the agents' constructors."""
+    return AzureOpenAIChatCompletionClient(
+        model="gpt-4o",
+        azure_deployment="gpt-4o",
+        api_version="2024-08-01-preview",
+        azure_endpoint="https://example.openai.azure.com/",
+        api_key="benchmark",
+        model_info={"vision": True, "function_calling": True, "json_output": True},
+    )
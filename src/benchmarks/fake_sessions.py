@@ -0,0 +1,68 @@
+"""A local stand-in for the pool management endpoint of an ACA dynamic sessions pool, used by the benchmarks."""
+
+import asyncio
+import time
+
+from aiohttp import web
+from azure.core.credentials import AccessToken
+
+
+class FakeSessionPool:
+    """
+    Answers `code/execute` requests, taking `allocation_delay` seconds for the first request
+    of each session identifier to mimic a session cold start.
+    """
+
+    def __init__(self, allocation_delay: float = 0.5) -> None:
+        self.allocation_delay = allocation_delay
+        self.sessions: dict[str, int] = {}
+
+    async def execute(self, request: web.Request) -> web.Response:
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return web.json_response({"error": "Unauthorized"}, status=401)
+        identifier = request.query["identifier"]
+        if identifier not in self.sessions:
+            await asyncio.sleep(self.allocation_delay)
+        self.sessions[identifier] = self.sessions.get(identifier, 0) + 1
+        body = await request.json()
+        return web.json_response(
+            {
+                "properties": {
+                    "status": "Success",
+                    "stdout": "",
+                    "stderr": "",
+                    "result": (
+                        "[]" if "pkg_resources" in body["properties"]["code"] else ""
+                    ),
+                }
+            }
+        )
+
+    async def start(self, port: int = 0) -> tuple[web.AppRunner, str]:
+        """
+        Starts the fake pool management endpoint on localhost.
+
+        Args:
+            port (int, optional): The port to listen on, 0 picks a free one. Defaults to 0.
+
+        Returns:
+            tuple[web.AppRunner, str]: The runner (call `cleanup()` to stop it) and the endpoint.
+        """
+        app = web.Application()
+        app.router.add_post("/code/execute", self.execute)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        await site.start()
+        host, port = runner.addresses[0][:2]
+        return runner, f"http://{host}:{port}"
+
+
+class FakeCredential:
+    """Issues placeholder tokens valid for an hour."""
+
+    async def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        return AccessToken("fake", int(time.time()) + 3600)
+
+    async def close(self) -> None:
+        pass
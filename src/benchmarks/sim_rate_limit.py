@@ -0,0 +1,250 @@
+"""Simulates concurrent runs against a throttling Azure OpenAI deployment, with and without the shared rate limiter.
+
+The fake deployment enforces request and token quotas over a sliding window and answers `429` with
+a `retry-after-ms` header when they are exceeded, like Azure OpenAI. It also answers `--unavailable`
+of the calls with a transient `503` and a `retry-after` header, and counts the retries that came
+sooner than it asked. The window is shortened to keep the simulation quick; the limiter is sized
+with the equivalent per-minute quotas.
+
+Run from the `src` directory:
+
+    python -m benchmarks.sim_rate_limit --workers 32 --calls 10 --unavailable 0.05
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import deque
+from typing import Any, Mapping, Optional, Sequence
+
+import httpx
+import openai
+from autogen_core import CancellationToken
+from autogen_core.models import CreateResult, LLMMessage, RequestUsage
+from autogen_core.tools import Tool, ToolSchema
+
+from benchmarks.fake_model import ScriptedChatCompletionClient
+from client_wrappers import RateLimitedChatCompletionClient, RateLimiter
+
+PROMPT_TOKENS = 1000
+COMPLETION_TOKENS = 200
+
+
+class ThrottledDeployment(ScriptedChatCompletionClient):
+    """
+    Accepts `requests` calls and `tokens` tokens per `window` seconds, and throttles the rest. Fails
+    `unavailable` of the calls with a 503 asking to retry after `unavailable_for` seconds.
+    """
+
+    def __init__(
+        self,
+        requests: int,
+        tokens: int,
+        window: float,
+        delay: float = 0.2,
+        unavailable: float = 0.0,
+        unavailable_for: float = 1.0,
+    ) -> None:
+        super().__init__(delay=delay)
+        self.requests = requests
+        self.tokens = tokens
+        self.window = window
+        self.unavailable = unavailable
+        self.unavailable_for = unavailable_for
+        self.accepted: deque[tuple[float, int]] = deque()
+        self.throttled = 0
+        self.failed = 0
+        self.early_retries = 0
+        self._rng = random.Random(0)
+        # When each caller (task) was told it may retry
+        self._retry_at: dict[asyncio.Task, float] = {}
+
+    def _fail(self) -> None:
+        # Like a deployment that is briefly overloaded, or being updated
+        now = time.monotonic()
+        task = asyncio.current_task()
+        if now < self._retry_at.pop(task, now):
+            self.early_retries += 1
+        if self._rng.random() >= self.unavailable:
+            return
+        self.failed += 1
+        self._retry_at[task] = now + self.unavailable_for
+        request = httpx.Request("POST", "https://fake.openai.azure.com/chat")
+        response = httpx.Response(
+            503,
+            headers={"retry-after": f"{self.unavailable_for:g}"},
+            request=request,
+        )
+        raise openai.InternalServerError(
+            "Service unavailable.", response=response, body=None
+        )
+
+    def _admit(self, tokens: int) -> None:
+        now = time.monotonic()
+        while self.accepted and self.accepted[0][0] <= now - self.window:
+            self.accepted.popleft()
+        used = sum(amount for _, amount in self.accepted)
+        if len(self.accepted) < self.requests and used + tokens <= self.tokens:
+            self.accepted.append((now, tokens))
+            return
+        self.throttled += 1
+        # Like Azure OpenAI, tell the caller when the oldest call leaves the window
+        wait = self.accepted[0][0] + self.window - now if self.accepted else 0
+        request = httpx.Request("POST", "https://fake.openai.azure.com/chat")
+        response = httpx.Response(
+            429,
+            headers={"retry-after-ms": str(int(wait * 1000) + 1)},
+            request=request,
+        )
+        raise openai.RateLimitError(
+            "Rate limit exceeded.", response=response, body=None
+        )
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        await asyncio.sleep(0.01)
+        self._fail()
+        self._admit(PROMPT_TOKENS + COMPLETION_TOKENS)
+        await asyncio.sleep(self.delay)
+        return CreateResult(
+            finish_reason="stop",
+            content="Simulated answer.",
+            usage=RequestUsage(
+                prompt_tokens=PROMPT_TOKENS, completion_tokens=COMPLETION_TOKENS
+            ),
+            cached=False,
+        )
+
+    def count_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return PROMPT_TOKENS
+
+
+async def naive_create(deployment: ThrottledDeployment, max_retries: int) -> None:
+    # A per-caller retry loop with plain exponential backoff, as without the shared limiter
+    for attempt in range(max_retries + 1):
+        try:
+            await deployment.create([])
+            return
+        except (openai.RateLimitError, openai.InternalServerError):
+            if attempt == max_retries:
+                raise
+            await asyncio.sleep(0.5 * 2**attempt)
+
+
+async def simulate(label: str, create, workers: int, calls: int) -> dict:
+    latencies: list[float] = []
+    failures = 0
+
+    async def worker() -> None:
+        nonlocal failures
+        for _ in range(calls):
+            start = time.perf_counter()
+            try:
+                await create()
+                latencies.append(time.perf_counter() - start)
+            except (openai.RateLimitError, openai.InternalServerError):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "label": label,
+        "completed": len(latencies),
+        "failed": failures,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "p95": (
+            latencies[int(len(latencies) * 0.95) - 1] if latencies else float("nan")
+        ),
+    }
+
+
+async def run(
+    workers: int,
+    calls: int,
+    requests: int,
+    tokens: int,
+    window: float,
+    max_retries: int,
+    unavailable: float,
+) -> None:
+    naive_deployment = ThrottledDeployment(
+        requests, tokens, window, unavailable=unavailable
+    )
+    naive = await simulate(
+        "naive retries",
+        lambda: naive_create(naive_deployment, max_retries),
+        workers,
+        calls,
+    )
+    naive["deployment"] = naive_deployment
+
+    limited_deployment = ThrottledDeployment(
+        requests, tokens, window, unavailable=unavailable
+    )
+    limiter = RateLimiter(
+        requests_per_minute=requests * 60 / window,
+        tokens_per_minute=tokens * 60 / window,
+        burst=window,
+    )
+    client = RateLimitedChatCompletionClient(
+        limited_deployment, limiter, max_retries=max_retries
+    )
+    limited = await simulate(
+        "shared rate limiter", lambda: client.create([]), workers, calls
+    )
+    limited["deployment"] = limited_deployment
+
+    print(
+        f"{workers} workers x {calls} calls against {requests} requests and {tokens} tokens "
+        f"per {window:g}s, {unavailable:.0%} unavailable, {max_retries} retries:"
+    )
+    for result in (naive, limited):
+        deployment = result["deployment"]
+        print(
+            f"  {result['label']:>20}: {result['completed']} completed, {result['failed']} failed, "
+            f"{deployment.throttled} throttled, {deployment.failed} unavailable "
+            f"({deployment.early_retries} retried early), {result['throughput']:.1f} calls/s, "
+            f"p50 {result['p50']:.2f}s, p95 {result['p95']:.2f}s"
+        )
+    print(
+        f"  final concurrency limit {limiter.concurrency.limit:.1f}, "
+        f"{limiter.retries} retries"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--tokens", type=int, default=30000)
+    parser.add_argument("--window", type=float, default=2.0)
+    parser.add_argument("--max-retries", type=int, default=6)
+    parser.add_argument("--unavailable", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(
+        run(
+            args.workers,
+            args.calls,
+            args.requests,
+            args.tokens,
+            args.window,
+            args.max_retries,
+            args.unavailable,
+        )
+    )
@@ -0,0 +1,344 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import asyncio_atexit
+from autogen_core import CancellationToken
+from autogen_ext.agents.web_surfer import MultimodalWebSurfer
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+from web_cache import HttpCache
+
+# The user agent `MultimodalWebSurfer` gives the contexts it creates itself
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/122.0.0.0 Safari/537.36 Edg/122.0.0.0"
+)
+
+
+@dataclass
+class PooledContext:
+    """A browser context checked out of a `BrowserPool`."""
+
+    context: BrowserContext
+    pages: int = 0
+    """The pages opened in the context since it was created."""
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    uses: int = 0
+
+
+class BrowserPool:
+    """
+    A pool of isolated browser contexts of one headless Chromium, started on first use.
+
+    Runs check a context out instead of launching a browser of their own. Returned contexts are
+    emptied (their pages closed, their cookies cleared) and reused, unless they opened
+    `max_pages_per_context` pages or their pages' JavaScript heap exceeds
+    `max_context_memory_mb`; those are closed and replaced by fresh ones. Idle contexts are closed
+    after `idle_timeout`. A browser that crashed is relaunched. With an `http_cache`, the contexts load
+    the responses it holds from disk. Playwright objects are bound to the event loop that created
+    them, so a pool serves one loop; see `get_browser_pool`.
+    """
+
+    def __init__(
+        self,
+        max_contexts: int = 8,
+        max_pages_per_context: int = 50,
+        max_context_memory_mb: float | None = 512,
+        idle_timeout: float = 300,
+        headless: bool = True,
+        launch_options: dict[str, Any] | None = None,
+        http_cache: HttpCache | None = None,
+    ) -> None:
+        """
+        Args:
+            max_contexts (int, optional): The maximum number of contexts checked out at once. Defaults to 8.
+            max_pages_per_context (int, optional): The pages a context opens before it is replaced. Defaults to 50.
+            max_context_memory_mb (float, optional): The JavaScript heap of a returned context's pages beyond
+                which it is replaced, or None for no limit. Defaults to 512.
+            idle_timeout (float, optional): Seconds an idle context is kept. Defaults to 300.
+            headless (bool, optional): Whether the browser is headless. Defaults to True.
+            launch_options (dict[str, Any], optional): Further options of `chromium.launch`, e.g. `channel`.
+                Defaults to None.
+            http_cache (HttpCache, optional): The cache of the contexts' responses. Defaults to None.
+        """
+        self.max_contexts = max_contexts
+        self.max_pages_per_context = max_pages_per_context
+        self.max_context_memory_mb = max_context_memory_mb
+        self.idle_timeout = idle_timeout
+        self.launch_options = {"headless": headless, **(launch_options or {})}
+        self.http_cache = http_cache
+        self.playwright: Playwright | None = None
+        self.browser: Browser | None = None
+        self._launch_lock = asyncio.Lock()
+        self._available = asyncio.Condition()
+        # Most recently used last
+        self._idle: list[PooledContext] = []
+        self._leased = 0
+        self._closed = False
+        self._launches = 0
+        self._created = 0
+        self._reused = 0
+        self._recycled = 0
+        self._evicted = 0
+
+    async def _ensure_browser(self) -> Browser:
+        async with self._launch_lock:
+            if self.browser is not None and self.browser.is_connected():
+                return self.browser
+            if self.browser is not None:
+                # The browser crashed or was closed; its idle contexts went with it
+                async with self._available:
+                    self._idle.clear()
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(**self.launch_options)
+            self._launches += 1
+            return self.browser
+
+    async def acquire(self, timeout: float | None = None) -> PooledContext:
+        """
+        Checks out a context, creating one if none is idle, and waiting while `max_contexts` are in use.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a context. Defaults to None (no limit).
+
+        Raises:
+            RuntimeError: Raises a RuntimeError if the pool is closed.
+            TimeoutError: Raises a TimeoutError if no context became available in time.
+
+        Returns:
+            PooledContext: The context; return it with `release`.
+        """
+        async with self._available:
+            await asyncio.wait_for(
+                self._available.wait_for(
+                    lambda: self._closed or self._leased < self.max_contexts
+                ),
+                timeout,
+            )
+            if self._closed:
+                raise RuntimeError("The browser pool is closed.")
+            self._leased += 1
+            expired = self._take_expired()
+            pooled = self._idle.pop() if self._idle else None
+
+        for stale in expired:
+            await self._close_context(stale)
+        try:
+            browser = await self._ensure_browser()
+            if pooled is not None and pooled.context.browser is not browser:
+                pooled = None
+            if pooled is None:
+                pooled = PooledContext(await self._new_context(browser))
+                pooled.context.on(
+                    "page", lambda page, pooled=pooled: self._count(pooled)
+                )
+                self._created += 1
+            else:
+                self._reused += 1
+        except BaseException:
+            async with self._available:
+                self._leased -= 1
+                self._available.notify()
+            raise
+        pooled.uses += 1
+        return pooled
+
+    async def _new_context(self, browser: Browser) -> BrowserContext:
+        if self.http_cache is None:
+            return await browser.new_context(user_agent=USER_AGENT)
+        # Requests answered by service workers would bypass the cache's route
+        context = await browser.new_context(
+            user_agent=USER_AGENT, service_workers="block"
+        )
+        await context.route("**/*", self.http_cache.route)
+        return context
+
+    def _count(self, pooled: PooledContext) -> None:
+        pooled.pages += 1
+
+    async def release(self, pooled: PooledContext, healthy: bool = True) -> None:
+        """
+        Returns a context to the pool, emptied, or closes it if it is worn out.
+
+        Args:
+            pooled (PooledContext): The context from `acquire`.
+            healthy (bool, optional): Whether the context may be reused. Defaults to True.
+        """
+        keep = (
+            healthy
+            and not self._closed
+            and self.browser is not None
+            and self.browser.is_connected()
+            and pooled.context.browser is self.browser
+        )
+        if keep and pooled.pages >= self.max_pages_per_context:
+            keep = False
+            self._recycled += 1
+        if keep and self.max_context_memory_mb is not None:
+            if await self.memory_mb(pooled) > self.max_context_memory_mb:
+                keep = False
+                self._evicted += 1
+        if keep:
+            try:
+                for page in list(pooled.context.pages):
+                    await page.close()
+                await pooled.context.clear_cookies()
+            except Exception:
+                keep = False
+        if not keep:
+            await self._close_context(pooled)
+
+        pooled.last_used = time.monotonic()
+        async with self._available:
+            self._leased -= 1
+            if keep:
+                self._idle.append(pooled)
+            self._available.notify()
+
+    async def memory_mb(self, pooled: PooledContext) -> float:
+        """
+        Returns the JavaScript heap used by the pages of a context, in MiB.
+
+        Args:
+            pooled (PooledContext): The context.
+
+        Returns:
+            float: The heap size, 0 for pages that do not report it.
+        """
+        used = 0
+        for page in list(pooled.context.pages):
+            try:
+                used += await page.evaluate(
+                    "() => performance.memory ? performance.memory.usedJSHeapSize : 0"
+                )
+            except Exception:
+                pass
+        return used / 2**20
+
+    def _take_expired(self) -> list[PooledContext]:
+        now = time.monotonic()
+        expired = [
+            pooled
+            for pooled in self._idle
+            if now - pooled.last_used > self.idle_timeout
+        ]
+        for pooled in expired:
+            self._idle.remove(pooled)
+        return expired
+
+    async def _close_context(self, pooled: PooledContext) -> None:
+        try:
+            await pooled.context.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        """Closes the idle contexts, the browser and Playwright; contexts in use are closed with the browser."""
+        async with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for pooled in idle:
+            await self._close_context(pooled)
+        async with self._launch_lock:
+            if self.browser is not None:
+                try:
+                    await self.browser.close()
+                except Exception:
+                    pass
+                self.browser = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
+
+    def stats(self) -> dict:
+        """Returns the pool's counters: browser launches, contexts created, reused, recycled and evicted."""
+        return {
+            "launches": self._launches,
+            "created": self._created,
+            "reused": self._reused,
+            "recycled": self._recycled,
+            "evicted": self._evicted,
+            "in_use": self._leased,
+            "idle": len(self._idle),
+        }
+
+
+_browser_pools: dict[int, tuple[asyncio.AbstractEventLoop, BrowserPool]] = {}
+_browser_pools_lock = threading.Lock()
+
+
+def get_browser_pool(**options: Any) -> BrowserPool:
+    """
+    Returns the browser pool of the running event loop, creating it on first use. It is closed when
+    the loop shuts down.
+
+    Args:
+        **options: The `BrowserPool` options, used when the pool is created.
+
+    Returns:
+        BrowserPool: The pool.
+    """
+    loop = asyncio.get_running_loop()
+    with _browser_pools_lock:
+        for key, (owner, _) in list(_browser_pools.items()):
+            if owner.is_closed():
+                del _browser_pools[key]
+        entry = _browser_pools.get(id(loop))
+        if entry is not None and entry[0] is loop:
+            return entry[1]
+        pool = BrowserPool(**options)
+        _browser_pools[id(loop)] = (loop, pool)
+        asyncio_atexit.register(pool.close, loop=loop)
+        return pool
+
+
+class PooledWebSurfer(MultimodalWebSurfer):
+    """
+    A `MultimodalWebSurfer` that browses in a context of a `BrowserPool` instead of launching its own
+    browser. The context is checked out on the agent's first turn and returned when the agent is
+    reset or closed, so an idle agent holds no browser resources.
+    """
+
+    def __init__(self, name: str, pool: BrowserPool, **kwargs: Any) -> None:
+        """
+        Args:
+            name (str): The agent's name.
+            pool (BrowserPool): The pool of browser contexts.
+            **kwargs: The `MultimodalWebSurfer` arguments, e.g. `model_client` and `start_page`.
+        """
+        super().__init__(name, **kwargs)
+        self.pool = pool
+        self._pooled: PooledContext | None = None
+
+    async def _lazy_init(self) -> None:
+        if self._context is None:
+            self._pooled = await self.pool.acquire()
+            self._context = self._pooled.context
+            # `MultimodalWebSurfer` would start a Playwright driver of its own otherwise
+            self._playwright = self.pool.playwright
+        await super()._lazy_init()
+
+    async def _return_context(self) -> None:
+        pooled, self._pooled = self._pooled, None
+        self._page = None
+        self._context = None
+        self._playwright = None
+        self._last_download = None
+        self._prior_metadata_hash = None
+        self.did_lazy_init = False
+        if pooled is not None:
+            await self.pool.release(pooled)
+
+    async def on_reset(self, cancellation_token: CancellationToken) -> None:
+        # The next run starts on a fresh page of a clean context, at `start_page`
+        self._chat_history.clear()
+        await self._return_context()
+
+    async def close(self) -> None:
+        await self._return_context()
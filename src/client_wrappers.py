@@ -0,0 +1,486 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    ModelCapabilities,
+    ModelInfo,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+
+# Statuses worth retrying: throttling and transient service errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class DelegatingChatCompletionClient(ChatCompletionClient):
+    """A `ChatCompletionClient` that forwards everything to `client`; subclasses override what they change."""
+
+    def __init__(self, client: ChatCompletionClient) -> None:
+        self.client = client
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self.client.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return self.client.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    def actual_usage(self) -> RequestUsage:
+        return self.client.actual_usage()
+
+    def total_usage(self) -> RequestUsage:
+        return self.client.total_usage()
+
+    def count_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return self.client.count_tokens(messages, tools=tools)
+
+    def remaining_tokens(
+        self, messages: Sequence[LLMMessage], *, tools: Sequence[Tool | ToolSchema] = []
+    ) -> int:
+        return self.client.remaining_tokens(messages, tools=tools)
+
+    @property
+    def capabilities(self) -> ModelCapabilities:  # type: ignore
+        return self.client.capabilities
+
+    @property
+    def model_info(self) -> ModelInfo:
+        return self.client.model_info
+
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at `per_minute`, usable from any thread and event loop.
+
+    The level may go negative when a reservation is corrected upwards, which delays later callers.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None) -> None:
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        # Called with the lock held
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` out of the bucket, going into debt if needed.
+
+        Returns:
+            float: The seconds to wait before the reservation is covered.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._level -= amount
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Returns (positive) or takes (negative) tokens after the fact, e.g. once the actual usage is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits concurrent requests, adapting the limit AIMD-style: it grows by one per `limit` successful
+    requests and halves on throttling, at most once per `decrease_interval` seconds. Usable from any
+    thread and event loop.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease_interval: float = 2.0,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Pass a wakeup this waiter received on to the next one
+                with self._lock:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+                    self._wake()
+                raise
+
+    def _wake(self) -> None:
+        # Called with the lock held
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            loop, future = self._waiters.pop(0)
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(
+                    lambda f=future: f.done() or f.set_result(None)
+                )
+                free -= 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+
+class RateLimiter:
+    """
+    The shared rate limiting state of one deployment: request and token buckets, the adaptive
+    concurrency limit, and the time until which the service asked callers to back off.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        burst: float = 10,
+        initial_concurrency: int = 8,
+        max_concurrency: int = 64,
+    ) -> None:
+        """
+        Args:
+            requests_per_minute (float, optional): The deployment's request quota. Defaults to None (no limit).
+            tokens_per_minute (float, optional): The deployment's token quota. Defaults to None (no limit).
+            burst (float, optional): The seconds of quota that may be spent at once. Azure OpenAI enforces
+                its per-minute quotas over 10 second windows. Defaults to 10.
+            initial_concurrency (int, optional): The initial concurrency limit. Defaults to 8.
+            max_concurrency (int, optional): The maximum concurrency limit. Defaults to 64.
+        """
+        self.requests = (
+            TokenBucket(requests_per_minute, max(1, requests_per_minute * burst / 60))
+            if requests_per_minute
+            else None
+        )
+        self.tokens = (
+            TokenBucket(tokens_per_minute, max(1, tokens_per_minute * burst / 60))
+            if tokens_per_minute
+            else None
+        )
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=initial_concurrency, maximum=max_concurrency
+        )
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    def back_off(self, seconds: float) -> None:
+        """Makes all callers wait `seconds`, e.g. as asked by a `retry-after` header."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def wait(self, tokens: float) -> float:
+        """
+        Waits until the back-off is over and the request and its `tokens` fit the quotas.
+
+        Returns:
+            float: The tokens reserved, which the actual usage is reconciled against.
+        """
+        delay = max(0.0, self.blocked_until - time.monotonic())
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        reserved = 0.0
+        if self.tokens is not None:
+            # Larger requests than the capacity would never fit; they wait for a full bucket instead
+            reserved = min(tokens, self.tokens.capacity)
+            delay = max(delay, self.tokens.reserve(reserved))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return reserved
+
+    @property
+    def metrics(self) -> dict[str, float]:
+        return {
+            "concurrency_limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+            "throttled": self.throttled,
+            "retries": self.retries,
+        }
+
+
+def retry_after(error: Exception) -> float | None:
+    """Returns the seconds the service asked to wait before retrying, if it did."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUSES
+
+
+class RateLimitedChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Throttles calls to a deployment with a shared `RateLimiter`, and retries throttled and transient
+    failures with jittered exponential backoff that honors the `retry-after` headers.
+
+    The wrapped client should not retry itself (e.g. `max_retries=0`), so throttling is seen here.
+    Streaming calls are retried like the others until their first chunk, and not once they started
+    yielding.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        limiter: RateLimiter,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 30,
+        expected_completion_tokens: int = 500,
+    ) -> None:
+        """
+        Args:
+            client (ChatCompletionClient): The client to wrap.
+            limiter (RateLimiter): The limiter of the client's deployment, shared by all its clients.
+            max_retries (int, optional): The retries of a failed call. Defaults to 6.
+            base_delay (float, optional): The first backoff in seconds, doubled per retry. Defaults to 0.5.
+            max_delay (float, optional): The maximum backoff in seconds. Defaults to 30.
+            expected_completion_tokens (int, optional): The completion tokens reserved for a call that does
+                not set `max_tokens`, corrected once the actual usage is known. Defaults to 500.
+        """
+        super().__init__(client)
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expected_completion_tokens = expected_completion_tokens
+
+    def _estimate(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema],
+        extra_create_args: Mapping[str, Any],
+    ) -> int:
+        try:
+            prompt_tokens = self.client.count_tokens(messages, tools=tools)
+        except Exception:
+            prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        return prompt_tokens + extra_create_args.get(
+            "max_tokens", self.expected_completion_tokens
+        )
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        requested = retry_after(error)
+        if requested is not None:
+            # A little jitter keeps the waiting callers from retrying in lockstep
+            return requested + random.uniform(0, min(1.0, requested / 4 + 0.1))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _failed(
+        self, attempt: int, error: Exception, reserved: float
+    ) -> tuple[bool, float]:
+        """
+        Accounts for a failed call: gives its reserved tokens back, and on throttling makes every
+        caller of the deployment back off.
+
+        Returns:
+            tuple[bool, float]: Whether the call was throttled, and the seconds this caller alone
+                waits before retrying.
+        """
+        if self.limiter.tokens is not None:
+            self.limiter.tokens.adjust(reserved)
+        delay = self._backoff(attempt, error)
+        if getattr(error, "status_code", None) == 429:
+            # Every caller waits, this one in `limiter.wait`
+            self.limiter.throttled += 1
+            self.limiter.back_off(delay)
+            return True, 0.0
+        return False, delay
+
+    @staticmethod
+    async def _sleep(
+        delay: float, cancellation_token: Optional[CancellationToken]
+    ) -> None:
+        sleep = asyncio.ensure_future(asyncio.sleep(delay))
+        if cancellation_token is not None:
+            cancellation_token.link_future(sleep)
+        await sleep
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        estimate = self._estimate(messages, tools, extra_create_args)
+        for attempt in range(self.max_retries + 1):
+            reserved = await self.limiter.wait(estimate)
+            await self.limiter.concurrency.acquire()
+            throttled = False
+            delay = 0.0
+            try:
+                result = await self.client.create(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                )
+            except Exception as e:
+                throttled, delay = self._failed(attempt, e, reserved)
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self.limiter.retries += 1
+            else:
+                if self.limiter.tokens is not None:
+                    used = result.usage.prompt_tokens + result.usage.completion_tokens
+                    self.limiter.tokens.adjust(reserved - used)
+                return result
+            finally:
+                self.limiter.concurrency.release(throttled=throttled)
+
+            # A transient failure, e.g. a 503, only delays this caller
+            if delay > 0:
+                await self._sleep(delay, cancellation_token)
+        raise AssertionError("unreachable")
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        estimate = self._estimate(messages, tools, extra_create_args)
+        # Retried only until the first chunk; a stream cut short afterwards is raised
+        for attempt in range(self.max_retries + 1):
+            reserved = await self.limiter.wait(estimate)
+            await self.limiter.concurrency.acquire()
+            throttled = False
+            delay = 0.0
+            started = False
+            try:
+                async for chunk in self.client.create_stream(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                ):
+                    if (
+                        isinstance(chunk, CreateResult)
+                        and self.limiter.tokens is not None
+                    ):
+                        used = chunk.usage.prompt_tokens + chunk.usage.completion_tokens
+                        self.limiter.tokens.adjust(reserved - used)
+                        reserved = 0.0
+                    started = True
+                    yield chunk
+            except Exception as e:
+                throttled, delay = self._failed(attempt, e, reserved)
+                if started or not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self.limiter.retries += 1
+            else:
+                return
+            finally:
+                self.limiter.concurrency.release(throttled=throttled)
+
+            if delay > 0:
+                await self._sleep(delay, cancellation_token)
+        raise AssertionError("unreachable")
+
+
+_limiters: dict[Any, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key: Any, **options: Any) -> RateLimiter:
+    """
+    Returns the process-wide `RateLimiter` of a deployment, creating it with `options` on first use.
+
+    Args:
+        key (Any): Identifies the deployment, e.g. its endpoint and name.
+        **options (Any): Passed to `RateLimiter`.
+
+    Returns:
+        RateLimiter: The limiter.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(**options)
+        return limiter
@@ -0,0 +1,457 @@
+import asyncio
+import atexit
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable
+
+from autogen_core import CancellationToken
+from autogen_core.code_executor import CodeBlock, CodeExecutor
+from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
+
+
+@dataclass
+class PooledExecutor:
+    """A code executor checked out of a `CodeExecutorPool`, with its private workspace."""
+
+    executor: CodeExecutor
+    work_dir: Path
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    last_checked: float = field(default_factory=time.monotonic)
+    uses: int = 0
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class CodeExecutorPool:
+    """
+    A bounded pool of started code executors, e.g. `DockerCommandLineCodeExecutor`s.
+
+    Executors are checked out for a run and returned afterwards, so runs skip the container cold start.
+    Returned workspaces are emptied (their files are moved to an export directory if one is given), idle
+    executors are health-checked before reuse and stopped after `idle_timeout`, and executors older than
+    `max_age` are replaced. A background task, started on the event loop of the first checkout, stops
+    expired idle executors every `reap_interval` and keeps `min_idle` started ahead of checkouts. The
+    pool may be used from several event loops.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[Path], CodeExecutor],
+        work_root: str | Path | None = None,
+        max_size: int = 4,
+        max_idle: int = 2,
+        idle_timeout: float = 300,
+        max_age: float = 3600,
+        health_check_interval: float = 60,
+        health_check_timeout: float = 30,
+        reset: Callable[[CodeExecutor], Awaitable[None]] | None = None,
+        reap_interval: float | None = 60,
+        min_idle: int = 0,
+    ) -> None:
+        """
+        Args:
+            factory (Callable[[Path], CodeExecutor]): Creates an (unstarted) executor for a workspace directory.
+            work_root (str | Path, optional): Where the workspaces are created. Defaults to a temporary directory.
+            max_size (int, optional): The maximum number of executors, idle or in use. Defaults to 4.
+            max_idle (int, optional): The maximum number of idle executors kept warm. Defaults to 2.
+            idle_timeout (float, optional): Seconds after which an idle executor is stopped. Defaults to 300.
+            max_age (float, optional): Seconds after which an executor is replaced. Defaults to 3600.
+            health_check_interval (float, optional): Seconds an executor may sit idle before it is
+                health-checked on checkout. Defaults to 60.
+            health_check_timeout (float, optional): Seconds a health check may take. Defaults to 30.
+            reset (Callable[[CodeExecutor], Awaitable[None]], optional): Clears the state an executor keeps
+                outside its workspace (e.g. a remote session) when it is returned. Defaults to None.
+            reap_interval (float, optional): Seconds between the background evictions of expired idle
+                executors; None to only evict them on checkout. Defaults to 60.
+            min_idle (int, optional): The idle executors the background task starts when the pool is
+                first used and after evictions, within `max_idle`. Defaults to 0.
+        """
+        self.factory = factory
+        self.work_root = Path(work_root or tempfile.mkdtemp(prefix="executor-pool-"))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.reset = reset
+        self.reap_interval = reap_interval
+        self.min_idle = min_idle
+
+        self._lock = threading.Lock()
+        self._idle: list[PooledExecutor] = []
+        self._in_use: list[PooledExecutor] = []
+        self._size = 0
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._ids = itertools.count()
+        self._closed = False
+        self._reaper: asyncio.Task | None = None
+
+        self._checkouts = 0
+        self._created = 0
+        self._evicted = 0
+        self._unhealthy = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def _start(self, executor: CodeExecutor) -> None:
+        start = getattr(executor, "start", None)
+        if start is not None:
+            await start()
+
+    async def _stop(self, pooled: PooledExecutor) -> None:
+        stop = getattr(pooled.executor, "stop", None)
+        try:
+            if stop is not None:
+                await stop()
+        finally:
+            await asyncio.to_thread(shutil.rmtree, pooled.work_dir, True)
+
+    async def _create(self) -> PooledExecutor:
+        work_dir = self.work_root / f"executor-{next(self._ids)}"
+        work_dir.mkdir(parents=True, exist_ok=True)
+        executor = self.factory(work_dir)
+        await self._start(executor)
+        with self._lock:
+            self._created += 1
+        return PooledExecutor(executor=executor, work_dir=work_dir)
+
+    async def _is_healthy(self, pooled: PooledExecutor) -> bool:
+        try:
+            result = await asyncio.wait_for(
+                pooled.executor.execute_code_blocks(
+                    [CodeBlock(code="print('ok')", language="python")],
+                    CancellationToken(),
+                ),
+                self.health_check_timeout,
+            )
+        except Exception:
+            return False
+        # Drop the health check's script before the workspace is handed out
+        await asyncio.to_thread(_reset_workspace, pooled.work_dir, None)
+        pooled.last_checked = time.monotonic()
+        return result.exit_code == 0
+
+    def _wake_one(self) -> None:
+        # Called with the lock held
+        while self._waiters:
+            loop, future = self._waiters.pop(0)
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(
+                    lambda f=future: f.done() or f.set_result(None)
+                )
+                return
+
+    def _take_expired(self) -> list[PooledExecutor]:
+        # Called with the lock held
+        now = time.monotonic()
+        expired = [
+            pooled
+            for pooled in self._idle
+            if now - pooled.last_used > self.idle_timeout or pooled.age > self.max_age
+        ]
+        for pooled in expired:
+            self._idle.remove(pooled)
+            self._size -= 1
+            self._evicted += 1
+            self._wake_one()
+        return expired
+
+    async def evict_idle(self) -> int:
+        """
+        Stops the idle executors that exceeded `idle_timeout` or `max_age`.
+
+        Returns:
+            int: The number of executors stopped.
+        """
+        with self._lock:
+            expired = self._take_expired()
+        for pooled in expired:
+            await self._stop(pooled)
+        return len(expired)
+
+    async def prewarm(self, count: int | None = None) -> None:
+        """
+        Starts executors until `count` (by default `max_idle`) are idle, within `max_size`.
+
+        Args:
+            count (int, optional): The number of idle executors to have. Defaults to `max_idle`.
+        """
+        count = self.max_idle if count is None else min(count, self.max_idle)
+        with self._lock:
+            missing = max(0, min(count - len(self._idle), self.max_size - self._size))
+            if self._closed:
+                missing = 0
+            self._size += missing
+        results = await asyncio.gather(
+            *(self._create() for _ in range(missing)), return_exceptions=True
+        )
+        # Executors started while the pool was closed are stopped again
+        late = []
+        with self._lock:
+            for result in results:
+                if isinstance(result, PooledExecutor) and not self._closed:
+                    self._idle.append(result)
+                else:
+                    self._size -= 1
+                    if isinstance(result, PooledExecutor):
+                        late.append(result)
+                self._wake_one()
+        for pooled in late:
+            await self._stop(pooled)
+
+    def _start_reaper(self) -> None:
+        # Called with the lock held, on the running loop. A loop that closed took its task with it.
+        if self.reap_interval is None and not self.min_idle:
+            return
+        if (
+            self._reaper is None
+            or self._reaper.done()
+            or self._reaper.get_loop().is_closed()
+        ):
+            self._reaper = asyncio.ensure_future(self._reap())
+
+    async def _reap(self) -> None:
+        while True:
+            try:
+                if self.min_idle:
+                    await self.prewarm(self.min_idle)
+            except Exception as e:
+                print(f"Failed to prewarm the executor pool: {e}")
+            if self.reap_interval is None:
+                return
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                print(f"Failed to stop an idle executor: {e}")
+
+    async def acquire(self, timeout: float | None = None) -> PooledExecutor:
+        """
+        Checks out an executor, starting a new one if none is idle and the pool is not full.
+
+        Args:
+            timeout (float, optional): Seconds to wait for an executor when the pool is full. Defaults to None (no limit).
+
+        Raises:
+            RuntimeError: Raises a RuntimeError if the pool is closed.
+            TimeoutError: Raises a TimeoutError if no executor became available in time.
+
+        Returns:
+            PooledExecutor: The executor; return it with `release`.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        while True:
+            pooled, create, waiter = None, False, None
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("The executor pool is closed.")
+                self._start_reaper()
+                expired = self._take_expired()
+                if self._idle:
+                    # Most recently used first, so the others can expire
+                    pooled = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    waiter = loop.create_future()
+                    self._waiters.append((loop, waiter))
+            for stale in expired:
+                await self._stop(stale)
+
+            if pooled is not None:
+                if (
+                    time.monotonic() - pooled.last_checked > self.health_check_interval
+                    and not await self._is_healthy(pooled)
+                ):
+                    with self._lock:
+                        self._size -= 1
+                        self._unhealthy += 1
+                    await self._stop(pooled)
+                    continue
+            elif create:
+                try:
+                    pooled = await self._create()
+                except BaseException:
+                    with self._lock:
+                        self._size -= 1
+                        self._wake_one()
+                    raise
+            else:
+                remaining = (
+                    None if timeout is None else timeout - (time.monotonic() - started)
+                )
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    with self._lock:
+                        if (loop, waiter) in self._waiters:
+                            self._waiters.remove((loop, waiter))
+                        else:
+                            # Woken, though perhaps cancelled before the wake-up arrived: pass
+                            # it on to the next waiter
+                            self._wake_one()
+                    raise
+                continue
+
+            waited = time.monotonic() - started
+            with self._lock:
+                self._in_use.append(pooled)
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            pooled.uses += 1
+            return pooled
+
+    async def release(
+        self,
+        pooled: PooledExecutor,
+        export_dir: str | Path | None = None,
+        healthy: bool = True,
+    ) -> None:
+        """
+        Returns an executor to the pool after emptying its workspace.
+
+        Args:
+            pooled (PooledExecutor): The executor from `acquire`.
+            export_dir (str | Path, optional): Where to move the files left in the workspace. Defaults to None (delete them).
+            healthy (bool, optional): Whether the executor may be reused. Defaults to True.
+        """
+        with self._lock:
+            if pooled in self._in_use:
+                self._in_use.remove(pooled)
+
+        try:
+            await asyncio.to_thread(_reset_workspace, pooled.work_dir, export_dir)
+            if healthy and self.reset is not None:
+                await self.reset(pooled.executor)
+        except Exception:
+            healthy = False
+
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            keep = (
+                healthy
+                and not self._closed
+                and pooled.age < self.max_age
+                and len(self._idle) < self.max_idle
+            )
+            if keep:
+                self._idle.append(pooled)
+            else:
+                self._size -= 1
+            self._wake_one()
+        if not keep:
+            await self._stop(pooled)
+
+    @asynccontextmanager
+    async def checkout(
+        self, timeout: float | None = None, export_dir: str | Path | None = None
+    ) -> AsyncIterator[CodeExecutor]:
+        """Checks out an executor for the duration of the `async with` block."""
+        pooled = await self.acquire(timeout)
+        try:
+            yield pooled.executor
+        finally:
+            await self.release(pooled, export_dir)
+
+    async def close(self) -> None:
+        """Stops all executors, including the ones still checked out, and refuses further checkouts."""
+        with self._lock:
+            self._closed = True
+            reaper, self._reaper = self._reaper, None
+            executors = self._idle + self._in_use
+            self._idle, self._in_use = [], []
+            self._size -= len(executors)
+            for loop, waiter in self._waiters:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(waiter.cancel)
+            self._waiters.clear()
+        if reaper is not None and not reaper.get_loop().is_closed():
+            reaper.get_loop().call_soon_threadsafe(reaper.cancel)
+        for pooled in executors:
+            await self._stop(pooled)
+
+    @property
+    def metrics(self) -> dict[str, float]:
+        """The pool size, checkout and wait time counters and the age of the oldest executor."""
+        with self._lock:
+            executors = self._idle + self._in_use
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": len(self._waiters),
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "evicted": self._evicted,
+                "unhealthy": self._unhealthy,
+                "wait_seconds_total": self._wait_total,
+                "wait_seconds_max": self._wait_max,
+                "oldest_age_seconds": max(
+                    (pooled.age for pooled in executors), default=0.0
+                ),
+            }
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _reset_workspace(work_dir: Path, export_dir: str | Path | None) -> None:
+    if export_dir is not None:
+        Path(export_dir).mkdir(parents=True, exist_ok=True)
+    for entry in work_dir.iterdir():
+        if export_dir is None:
+            _remove(entry)
+            continue
+        target = Path(export_dir) / entry.name
+        # The latest output wins, as it would in a workspace of its own, e.g. when the run
+        # rewrote a file an earlier run exported
+        if target.exists() or target.is_symlink():
+            _remove(target)
+        shutil.move(str(entry), str(target))
+
+
+_docker_pool: CodeExecutorPool | None = None
+_docker_pool_lock = threading.Lock()
+
+
+def get_docker_executor_pool(min_idle: int = 0) -> CodeExecutorPool:
+    """
+    Returns the process-wide pool of `DockerCommandLineCodeExecutor`s, creating it on first use.
+
+    Args:
+        min_idle (int, optional): The containers the pool keeps started ahead of the runs, if it is
+            created by this call. Defaults to 0.
+
+    Returns:
+        CodeExecutorPool: The pool.
+    """
+    global _docker_pool
+    with _docker_pool_lock:
+        if _docker_pool is None:
+            # The pool outlives event loops, so containers are stopped by the pool at process
+            # exit rather than by the executor when the loop that started it closes
+            _docker_pool = CodeExecutorPool(
+                lambda work_dir: DockerCommandLineCodeExecutor(
+                    work_dir=work_dir, stop_container=False
+                ),
+                min_idle=min_idle,
+            )
+            atexit.register(lambda pool=_docker_pool: asyncio.run(pool.close()))
+        return _docker_pool
@@ -0,0 +1,327 @@
+import asyncio
+import atexit
+import dataclasses
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken, Image
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from pydantic import BaseModel
+
+from client_wrappers import DelegatingChatCompletionClient
+
+AUTO = "auto"
+"""Serves cached responses and calls the model (and caches its response) on a miss."""
+RECORD = "record"
+"""Always calls the model and overwrites the cached responses."""
+REPLAY = "replay"
+"""Only serves cached responses; a miss raises `LLMCacheMiss`, so runs are fully offline."""
+CACHE_MODES = (AUTO, RECORD, REPLAY)
+
+
+class LLMCacheMiss(LookupError):
+    """Raised in `REPLAY` mode for a request that was not recorded."""
+
+
+def _normalize(value: Any) -> Any:
+    # A JSON-compatible form of a request that does not depend on object identity or key order;
+    # images are reduced to the digest of their data
+    if isinstance(value, Image):
+        return {"image": hashlib.sha256(value.to_base64().encode()).hexdigest()}
+    if isinstance(value, BaseModel):
+        return {name: _normalize(getattr(value, name)) for name in value.model_fields}
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {
+            field.name: _normalize(getattr(value, field.name))
+            for field in dataclasses.fields(value)
+        }
+    if isinstance(value, Tool):
+        return _normalize(value.schema)
+    if isinstance(value, Mapping):
+        return {str(key): _normalize(value[key]) for key in sorted(value, key=str)}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n")
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return repr(value)
+
+
+def request_key(
+    model: str,
+    messages: Sequence[LLMMessage],
+    tools: Sequence[Tool | ToolSchema],
+    json_output: Optional[bool],
+    extra_create_args: Mapping[str, Any],
+) -> str:
+    """
+    Returns the cache key of a model request.
+
+    Args:
+        model (str): The model (or deployment) the request is sent to.
+        messages (Sequence[LLMMessage]): The messages.
+        tools (Sequence[Tool | ToolSchema]): The tools.
+        json_output (bool, optional): Whether JSON output was requested.
+        extra_create_args (Mapping[str, Any]): The sampling and other request parameters.
+
+    Returns:
+        str: The SHA-256 digest of the normalized request.
+    """
+    request = {
+        "model": model,
+        "messages": _normalize(list(messages)),
+        "tools": _normalize(list(tools)),
+        "json_output": json_output,
+        "extra_create_args": _normalize(extra_create_args),
+    }
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseStore:
+    """
+    A SQLite-backed store of model responses, bounded to `max_bytes` by evicting the least recently
+    used ones. It is safe to use from several threads, and from several processes through SQLite's locking.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int = 512 * 1024 * 1024) -> None:
+        """
+        Args:
+            path (str | Path): The database file, created if it does not exist.
+            max_bytes (int, optional): The total size of the stored responses. Defaults to 512 MiB.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)"
+        )
+        self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> str | None:
+        """Returns the response stored under `key`, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Stores a response under `key`, replacing any previous one, and evicts old ones if needed."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode()), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        # Called with the lock held; evicts down to 90% so not every `put` has to evict
+        (size,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if size <= self.max_bytes:
+            return
+        target = size - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, entry_size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY used_at"
+        ):
+            if freed >= target:
+                break
+            keys.append((key,))
+            freed += entry_size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.evictions += len(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        """Drops all stored responses and resets the counters."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self.hits = self.misses = self.evictions = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """The hit, miss and eviction counters."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class CachingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Serves model responses from a `ResponseStore`, keyed on the normalized request, so repeated runs
+    of the same task skip the model calls, and recorded runs can be replayed offline.
+
+    Identical requests within one client's lifetime are numbered, so a run that repeats a request
+    replays the responses it got in order. Cached responses have `cached=True` and no usage, since
+    they cost no tokens.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        store: ResponseStore,
+        mode: str = AUTO,
+        model: str = "",
+    ) -> None:
+        """
+        Args:
+            client (ChatCompletionClient): The client to wrap.
+            store (ResponseStore): The store of responses.
+            mode (str, optional): One of `AUTO`, `RECORD` or `REPLAY`. Defaults to `AUTO`.
+            model (str, optional): The model or deployment, part of the cache key. Defaults to "".
+
+        Raises:
+            ValueError: Raises a ValueError if the mode is unknown.
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(
+                f"Unknown cache mode {mode!r}, expected one of {CACHE_MODES}."
+            )
+        super().__init__(client)
+        self.store = store
+        self.mode = mode
+        self.model = model
+        self._occurrences: Counter[str] = Counter()
+
+    def _key(
+        self,
+        messages: Sequence[LLMMessage],
+        tools: Sequence[Tool | ToolSchema],
+        json_output: Optional[bool],
+        extra_create_args: Mapping[str, Any],
+    ) -> str:
+        key = request_key(self.model, messages, tools, json_output, extra_create_args)
+        occurrence = self._occurrences[key]
+        self._occurrences[key] += 1
+        return key if occurrence == 0 else f"{key}:{occurrence}"
+
+    async def _lookup(self, key: str) -> CreateResult | None:
+        if self.mode == RECORD:
+            return None
+        value = await asyncio.to_thread(self.store.get, key)
+        if value is None:
+            if self.mode == REPLAY:
+                raise LLMCacheMiss(f"No recorded response for request {key}.")
+            return None
+        result = CreateResult.model_validate_json(value)
+        result.cached = True
+        result.usage.prompt_tokens = result.usage.completion_tokens = 0
+        return result
+
+    async def _store(self, key: str, result: CreateResult) -> None:
+        await asyncio.to_thread(self.store.put, key, result.model_dump_json())
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        key = self._key(messages, tools, json_output, extra_create_args)
+        cached = await self._lookup(key)
+        if cached is not None:
+            return cached
+        result = await self.client.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        await self._store(key, result)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        key = self._key(messages, tools, json_output, extra_create_args)
+        cached = await self._lookup(key)
+        if cached is not None:
+            if isinstance(cached.content, str):
+                yield cached.content
+            yield cached
+            return
+        async for chunk in self.client.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                await self._store(key, chunk)
+            yield chunk
+
+
+_stores: dict[Path, ResponseStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_response_store(path: str | Path, **options: Any) -> ResponseStore:
+    """
+    Returns the process-wide `ResponseStore` of a database file, opening it on first use.
+
+    Args:
+        path (str | Path): The database file.
+        **options (Any): Passed to `ResponseStore`.
+
+    Returns:
+        ResponseStore: The store.
+    """
+    path = Path(path).resolve()
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ResponseStore(path, **options)
+            atexit.register(store.close)
+        return store
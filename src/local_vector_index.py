@@ -0,0 +1,313 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from rag_embeddings import normalize_rows
+
+
+class LocalVectorIndex:
+    """
+    An on-disk vector index with the same `parent_id`, `chunk_id`, `chunk` and `text_vector` schema as the
+    Azure AI Search indexes used by `MagenticOneRAGAgent`.
+
+    The L2-normalized `text_vector`s are stored as a raw float32 matrix that is memory-mapped for search,
+    and the other fields as JSON lines that are read only for the rows a search returns. `meta.json` holds
+    the committed row count and byte sizes, so a partially written append is ignored and overwritten, and
+    the rows deleted since, which searches skip. `compact` rewrites the data without the deleted rows into
+    the files of a new generation, which `meta.json` then switches to.
+    """
+
+    VECTORS_FILE = "text_vector.f32"
+    CHUNKS_FILE = "chunks.jsonl"
+    META_FILE = "meta.json"
+    # Rows copied at a time by `compact`
+    COMPACT_BATCH = 65536
+
+    def __init__(self, path: str | Path) -> None:
+        """
+        Opens an existing index. Use `create` to start a new one.
+
+        Args:
+            path (str | Path): The index directory.
+        """
+        self.path = Path(path)
+        meta = json.loads((self.path / self.META_FILE).read_text())
+        self.dimensions: int = meta["dimensions"]
+        self.embedder: str = meta["embedder"]
+        self._count: int = meta["count"]
+        self._chunks_bytes: int = meta["chunks_bytes"]
+        self.deleted: set[int] = set(meta.get("deleted", []))
+        self.generation: int = meta.get("generation", 0)
+        # The rows the last compaction removed
+        self._removed: list[int] = meta.get("removed", [])
+        self._meta_stamp = self._stamp()
+        self._load()
+
+    @classmethod
+    def create(
+        cls, path: str | Path, dimensions: int, embedder: str
+    ) -> "LocalVectorIndex":
+        """
+        Creates an empty index.
+
+        Args:
+            path (str | Path): The index directory, created if missing.
+            dimensions (int): The embedding dimensions.
+            embedder (str): The name of the embedder the vectors come from, e.g. `hashing:1024`.
+
+        Returns:
+            LocalVectorIndex: The index.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / cls.VECTORS_FILE).touch()
+        (path / cls.CHUNKS_FILE).touch()
+        cls._write_meta(
+            path,
+            {
+                "dimensions": dimensions,
+                "embedder": embedder,
+                "count": 0,
+                "chunks_bytes": 0,
+            },
+        )
+        return cls(path)
+
+    @classmethod
+    def exists(cls, path: str | Path) -> bool:
+        return (Path(path) / cls.META_FILE).exists()
+
+    def _files(self, generation: int) -> tuple[Path, Path]:
+        # The vector and chunk files of a generation; the first one has the unnumbered names
+        if generation == 0:
+            return self.path / self.VECTORS_FILE, self.path / self.CHUNKS_FILE
+        vectors, chunks = Path(self.VECTORS_FILE), Path(self.CHUNKS_FILE)
+        return (
+            self.path / f"{vectors.stem}.{generation}{vectors.suffix}",
+            self.path / f"{chunks.stem}.{generation}{chunks.suffix}",
+        )
+
+    @property
+    def vectors_path(self) -> Path:
+        return self._files(self.generation)[0]
+
+    @property
+    def chunks_path(self) -> Path:
+        return self._files(self.generation)[1]
+
+    def _stamp(self) -> tuple[int, int]:
+        stat = os.stat(self.path / self.META_FILE)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def is_stale(self) -> bool:
+        """Whether the index was changed on disk since it was opened, e.g. by another process ingesting into it."""
+        return self._stamp() != self._meta_stamp
+
+    @staticmethod
+    def _write_meta(path: Path, meta: dict) -> None:
+        temp_path = path / (LocalVectorIndex.META_FILE + ".tmp")
+        temp_path.write_text(json.dumps(meta))
+        os.replace(temp_path, path / LocalVectorIndex.META_FILE)
+
+    def _load(self) -> None:
+        # Byte offset of each row in the chunk store
+        offsets = np.zeros(self._count + 1, dtype=np.int64)
+        with open(self.chunks_path, "rb") as file:
+            for row in range(self._count):
+                offsets[row + 1] = offsets[row] + len(file.readline())
+        self._offsets = offsets
+        self._load_vectors()
+
+    def _load_vectors(self) -> None:
+        self.vectors: np.ndarray = (
+            np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._count, self.dimensions),
+            )
+            if self._count
+            else np.zeros((0, self.dimensions), dtype=np.float32)
+        )
+        self._deleted_rows = np.fromiter(self.deleted, dtype=np.int64)
+
+    def _commit(self) -> None:
+        self._write_meta(
+            self.path,
+            {
+                "dimensions": self.dimensions,
+                "embedder": self.embedder,
+                "count": self._count,
+                "chunks_bytes": self._chunks_bytes,
+                "deleted": sorted(self.deleted),
+                "generation": self.generation,
+                "removed": self._removed,
+            },
+        )
+        self._meta_stamp = self._stamp()
+
+    def __len__(self) -> int:
+        """The number of rows, including deleted ones."""
+        return self._count
+
+    def append(self, chunks: Sequence[dict], vectors: np.ndarray) -> range:
+        """
+        Appends chunks and their vectors without rewriting the existing data.
+
+        Args:
+            chunks (Sequence[dict]): The `parent_id`, `chunk_id` and `chunk` fields of each row.
+            vectors (np.ndarray): The `(len(chunks), dimensions)` embeddings of the chunks.
+
+        Raises:
+            ValueError: Raises a ValueError if the vectors do not match the chunks or the index dimensions.
+
+        Returns:
+            range: The row numbers of the appended chunks.
+        """
+        vectors = normalize_rows(vectors)
+        if vectors.shape != (len(chunks), self.dimensions):
+            raise ValueError(
+                f"Expected vectors of shape {(len(chunks), self.dimensions)}, got {vectors.shape}."
+            )
+
+        vector_bytes = self._count * self.dimensions * 4
+        with open(self.vectors_path, "r+b") as file:
+            file.truncate(vector_bytes)
+            file.seek(vector_bytes)
+            file.write(vectors.tobytes())
+
+        lines = [
+            json.dumps(chunk, ensure_ascii=False).encode() + b"\n" for chunk in chunks
+        ]
+        with open(self.chunks_path, "r+b") as file:
+            file.truncate(self._chunks_bytes)
+            file.seek(self._chunks_bytes)
+            file.write(b"".join(lines))
+
+        rows = range(self._count, self._count + len(chunks))
+        self._offsets = np.concatenate(
+            [
+                self._offsets,
+                self._chunks_bytes
+                + np.cumsum([len(line) for line in lines], dtype=np.int64),
+            ]
+        )
+        self._count += len(chunks)
+        self._chunks_bytes = int(self._offsets[-1])
+        self._commit()
+        self._load_vectors()
+        return rows
+
+    def delete(self, rows: Iterable[int]) -> None:
+        """
+        Marks rows as deleted. Their data stays on disk but is no longer returned by searches.
+
+        Args:
+            rows (Iterable[int]): The row numbers.
+        """
+        self.deleted.update(rows)
+        self._commit()
+        self._load_vectors()
+
+    @staticmethod
+    def _renumbering(count: int, removed: Sequence[int]) -> np.ndarray:
+        renumbering = np.full(count, -1, dtype=np.int64)
+        kept = np.setdiff1d(np.arange(count), np.asarray(removed, dtype=np.int64))
+        renumbering[kept] = np.arange(len(kept))
+        return renumbering
+
+    def compact(self) -> np.ndarray:
+        """
+        Rewrites the index without its deleted rows, renumbering the others in order.
+
+        The rows are copied to the files of the next generation, which the commit switches to. Readers that
+        opened the current generation can finish their searches, as its files are only removed by the
+        compaction after this one.
+
+        Returns:
+            np.ndarray: The new row number of each old row, or -1 for a deleted one.
+        """
+        removed = sorted(self.deleted)
+        renumbering = self._renumbering(self._count, removed)
+        kept = np.flatnonzero(renumbering >= 0)
+        vectors_path, chunks_path = self._files(self.generation + 1)
+
+        with open(vectors_path, "wb") as file:
+            for start in range(0, len(kept), self.COMPACT_BATCH):
+                rows = kept[start : start + self.COMPACT_BATCH]
+                file.write(np.ascontiguousarray(self.vectors[rows]).tobytes())
+
+        offsets = np.zeros(len(kept) + 1, dtype=np.int64)
+        with open(self.chunks_path, "rb") as source, open(chunks_path, "wb") as target:
+            for row in range(self._count):
+                line = source.readline()
+                if renumbering[row] >= 0:
+                    target.write(line)
+                    offsets[renumbering[row] + 1] = len(line)
+        offsets = np.cumsum(offsets)
+
+        self.generation += 1
+        self._count = len(kept)
+        self._chunks_bytes = int(offsets[-1])
+        self._offsets = offsets
+        self.deleted = set()
+        self._removed = removed
+        self._commit()
+        self._load_vectors()
+        if self.generation >= 2:
+            for path in self._files(self.generation - 2):
+                path.unlink(missing_ok=True)
+        return renumbering
+
+    def last_compaction(self) -> np.ndarray:
+        """
+        The renumbering of the last `compact`, for data that refers to rows of the generation before it.
+
+        Returns:
+            np.ndarray: The new row number of each row of the previous generation, or -1 for a removed one.
+        """
+        return self._renumbering(self._count + len(self._removed), self._removed)
+
+    def search(self, query_vector: np.ndarray, top: int) -> list[tuple[int, float]]:
+        """
+        Finds the rows most similar to the query by cosine similarity.
+
+        Args:
+            query_vector (np.ndarray): The query embedding.
+            top (int): The number of rows to return.
+
+        Returns:
+            list[tuple[int, float]]: The row numbers and scores, best first.
+        """
+        if self._count == 0 or top <= 0:
+            return []
+
+        query_vector = normalize_rows(query_vector.reshape(1, -1))[0]
+        scores = self.vectors @ query_vector
+        scores[self._deleted_rows] = -np.inf
+        top = min(top, self._count - len(self._deleted_rows))
+        if top <= 0:
+            return []
+        rows = np.argpartition(-scores, top - 1)[:top]
+        rows = rows[np.argsort(-scores[rows])]
+        return [(int(row), float(scores[row])) for row in rows]
+
+    def get(self, rows: Sequence[int]) -> list[dict]:
+        """
+        Reads the stored fields of rows.
+
+        Args:
+            rows (Sequence[int]): The row numbers.
+
+        Returns:
+            list[dict]: The `parent_id`, `chunk_id` and `chunk` fields of each row.
+        """
+        documents = []
+        with open(self.chunks_path, "rb") as file:
+            for row in rows:
+                file.seek(self._offsets[row])
+                documents.append(json.loads(file.readline()))
+        return documents
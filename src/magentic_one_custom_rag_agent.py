@@ -1,14 +1,15 @@
-import os
+import asyncio
+import itertools
+from typing import Iterable
 
 from autogen_agentchat.agents import AssistantAgent
 from autogen_core.models import ChatCompletionClient
-from azure.core.credentials import AzureKeyCredential
-from azure.core.credentials_async import AsyncTokenCredential
-from azure.identity.aio import AzureDeveloperCliCredential
 from azure.search.documents.aio import SearchClient
-from azure.search.documents.models import VectorizableTextQuery
 from dotenv import load_dotenv
 
+from rag_backends import AzureSearchBackend, RAGSearchOptions, SearchBackend
+from search_cache import SearchResultCache
+
 load_dotenv()
 
 MAGENTIC_ONE_RAG_DESCRIPTION = (
@@ -39,62 +40,130 @@ class MagenticOneRAGAgent(AssistantAgent):
         search_endpoint: str,
         search_key: str | None = None,
         description: str = MAGENTIC_ONE_RAG_DESCRIPTION,
+        max_connections: int = 10,
+        cache: SearchResultCache | None = None,
+        search_client: SearchClient | None = None,
+        search_options: RAGSearchOptions | None = None,
+        backend: SearchBackend | None = None,
     ):
         super().__init__(
             name,
             model_client,
             description=description,
             system_message=MAGENTIC_ONE_RAG_SYSTEM_MESSAGE,
-            tools=[self.do_search],
+            tools=[self.do_search, self.do_multi_search],
             reflect_on_tool_use=True,
         )
 
         self.index_name = index_name
         self.search_endpoint = search_endpoint
         self.search_key = search_key
-
-    def config_search(self) -> SearchClient:
-        azure_credential = (
-            AzureDeveloperCliCredential()
-            if os.getenv("AZURE_TENANT_ID") is None
-            else AzureDeveloperCliCredential(
-                tenant_id=os.getenv("AZURE_TENANT_ID"), process_timeout=60
-            )
-        )
-        search_credential: AzureKeyCredential | AsyncTokenCredential = (
-            azure_credential
-            if self.search_key is None
-            else AzureKeyCredential(self.search_key)
-        )
-        return SearchClient(
-            endpoint=self.search_endpoint,
-            index_name=self.index_name,
-            credential=search_credential,
+        self.max_connections = max_connections
+        self.cache = cache
+        self.search_options = search_options or RAGSearchOptions()
+        self.backend: SearchBackend = backend or AzureSearchBackend(
+            index_name=index_name,
+            search_endpoint=search_endpoint,
+            search_key=search_key,
+            max_connections=max_connections,
+            search_client=search_client,
         )
 
-    async def do_search(self, query: str) -> str:
-        """Search indexed data using Azure AI Search with vector-based queries."""
-        async with self.config_search() as search_client:
-            fields = "text_vector"  # TODO: Check if this is the correct field name
-            vector_query = VectorizableTextQuery(
-                text=query, k_nearest_neighbors=1, fields=fields, exhaustive=True
+    async def close(self) -> None:
+        """Closes the search backend, e.g. the search client and its connection pool."""
+        await self.backend.close()
+        await super().close()
+
+    async def _search(self, query: str, hybrid: bool = False) -> list[dict]:
+        """
+        Runs one search and returns its results, reading no further than the answer budget.
+
+        Args:
+            query (str): The query.
+            hybrid (bool, optional): Whether to combine keyword and vector search. Defaults to False.
+
+        Returns:
+            list[dict]: The selected fields of each result.
+        """
+        if self.backend.refresh() and self.cache is not None:
+            # The index changed, e.g. by an ingestion; so may the results of its searches
+            self.cache.invalidate(self.backend.source)
+
+        options = self.search_options
+        fields = [options.vector_field, *options.select_fields]
+        variant = options.cache_variant + (";hybrid" if hybrid else "")
+
+        if self.cache is not None:
+            cached = await self.cache.get(
+                self.index_name,
+                query,
+                options.k,
+                fields,
+                variant,
+                source=self.backend.source,
             )
+            if cached is not None:
+                return cached
+
+        results = self.backend.search(query, options, hybrid=hybrid)
+
+        # Results arrive page by page; stop reading (and paging) once the budget is spent
+        documents: list[dict] = []
+        remaining = options.max_chars
+        async for result in results:
+            documents.append({name: result.get(name) for name in options.select_fields})
+            remaining -= len(result["chunk"])
+            if remaining <= 0:
+                break
 
-            results = await search_client.search(
-                search_text=None,
-                vector_queries=[vector_query],
-                select=[
-                    "parent_id",
-                    "chunk_id",
-                    "chunk",
-                ],  # TODO: Check if these are the correct field names
-                top=1,  # TODO: Check if this is the correct number of results
+        if self.cache is not None and documents:
+            await self.cache.put(
+                self.index_name,
+                query,
+                options.k,
+                fields,
+                documents,
+                variant,
+                source=self.backend.source,
             )
-            answer = ""
-            async for result in results:
-                # print(f"parent_id: {result['parent_id']}")
-                # print(f"chunk_id: {result['chunk_id']}")
-                # print(f"Score: {result['@search.score']}")
-                # print(f"Content: {result['chunk']}")
-                answer = answer + result["chunk"]
-            return answer
+        return documents
+
+    def _assemble(self, documents: Iterable[dict]) -> str:
+        """Joins the chunks of the documents, truncated to the `max_chars` budget."""
+        parts: list[str] = []
+        remaining = self.search_options.max_chars
+        for document in documents:
+            chunk = document["chunk"][:remaining]
+            parts.append(chunk)
+            remaining -= len(chunk)
+            if remaining <= 0:
+                break
+        return "\n\n".join(parts)
+
+    async def do_search(self, query: str) -> str:
+        """Search indexed data with vector-based queries."""
+        return self._assemble(await self._search(query))
+
+    async def do_multi_search(self, queries: list[str], hybrid: bool = False) -> str:
+        """
+        Search indexed data for several sub-queries at once, e.g. the facets of a multi-part question.
+        Set `hybrid` to also match the sub-queries as keywords, which helps with names, codes and exact phrases.
+        """
+        batches = await asyncio.gather(
+            *(self._search(query, hybrid=hybrid) for query in queries)
+        )
+
+        # Interleave the sub-queries' results so each gets a share of the budget
+        seen: set[str] = set()
+        documents: list[dict] = []
+        for document in itertools.chain.from_iterable(itertools.zip_longest(*batches)):
+            if document is None:
+                continue
+            identity = document.get("chunk_id") or document.get("parent_id")
+            if identity is not None:
+                if identity in seen:
+                    continue
+                seen.add(identity)
+            documents.append(document)
+
+        return self._assemble(documents)
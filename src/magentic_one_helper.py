@@ -1,34 +1,228 @@
 import asyncio
+import hashlib
+import json
 import os
-import tempfile
-from typing import AsyncGenerator, Awaitable, Callable, TypedDict
-
-from autogen_agentchat.agents import AssistantAgent, CodeExecutorAgent
+import threading
+import time
+from typing import (
+    TYPE_CHECKING,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    NamedTuple,
+    TypedDict,
+)
+
+import asyncio_atexit
+
+from autogen_agentchat.agents import AssistantAgent
 from autogen_agentchat.base import TaskResult
-from autogen_agentchat.messages import AgentEvent, ChatMessage
+from autogen_agentchat.messages import AgentEvent, ChatMessage, MultiModalMessage
 from autogen_agentchat.teams import MagenticOneGroupChat
-from autogen_agentchat.ui import Console
-from autogen_core import SingleThreadedAgentRuntime
-from autogen_ext.agents.file_surfer import FileSurfer
-from autogen_ext.agents.magentic_one import MagenticOneCoderAgent
-from autogen_ext.agents.web_surfer import MultimodalWebSurfer
-from autogen_ext.code_executors.azure import ACADynamicSessionsCodeExecutor
-from autogen_ext.code_executors.docker import DockerCommandLineCodeExecutor
-from autogen_ext.code_executors.local import LocalCommandLineCodeExecutor
+from autogen_core import CancellationToken, SingleThreadedAgentRuntime
+from autogen_core.code_executor import CodeExecutor
+from autogen_core.models import ChatCompletionClient
 from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
 from azure.core.credentials import AzureKeyCredential
 from azure.core.credentials_async import AsyncTokenCredential
-from azure.identity.aio import AzureDeveloperCliCredential, get_bearer_token_provider
+from azure.identity.aio import get_bearer_token_provider
 from dotenv import load_dotenv
-from promptflow.tracing import start_trace
 
-from magentic_one_custom_agent import MagenticOneCustomAgent
-from magentic_one_custom_rag_agent import MagenticOneRAGAgent
+from agent_registry import AgentLease, agent_registry
+from client_wrappers import RateLimitedChatCompletionClient, get_rate_limiter
+from llm_cache import CachingChatCompletionClient, get_response_store
+from model_router import Deployment, ModelRouter, Route, load_deployments
+from run_budget import RunBudget, RunGuard, UsageMeter
+from screenshot_dedup import ScreenshotDedupChatCompletionClient
+from screenshot_sink import ScreenshotSink
+from streaming import (
+    AzureOpenAIStreamingClient,
+    ModelStreamChannel,
+    ModelStreamChunk,
+    StreamingChatCompletionClient,
+    merge_chunks,
+)
+from token_cache import (
+    CachedTokenCredential,
+    close_shared_credentials,
+    get_shared_credential,
+)
+
+# The dependencies of the agent types, e.g. Playwright for the WebSurfer and Docker for the Executor,
+# and PromptFlow tracing are imported when used, see `agent_registry`, not to slow down the start of
+# the app and CLI
+if TYPE_CHECKING:
+    from executor_pool import CodeExecutorPool, PooledExecutor
 
 load_dotenv()
 
-# You can view the traces in http://127.0.0.1:23333/v1.0/ui/traces/
-start_trace()
+_tracing_lock = threading.Lock()
+_tracing_started = False
+
+
+def enable_tracing() -> None:
+    """
+    Starts PromptFlow tracing of the process, once. You can view the traces in
+    http://127.0.0.1:23333/v1.0/ui/traces/.
+    """
+    global _tracing_started
+    with _tracing_lock:
+        if _tracing_started:
+            return
+        from promptflow.tracing import start_trace
+
+        start_trace()
+        _tracing_started = True
+
+
+class ClientKey(NamedTuple):
+    """The identity of a pooled model client."""
+
+    azure_endpoint: str
+    azure_deployment: str
+    api_version: str
+    auth_mode: str
+
+
+class ModelClientRegistry:
+    """
+    A process-wide registry of model clients and Azure credentials.
+
+    Clients are keyed on `ClientKey` and on the event loop they were created on, since the
+    underlying HTTP connection pool is bound to that loop. Clients of a loop are closed when
+    the loop shuts down, or explicitly through `aclose`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clients: dict[
+            tuple[ClientKey, int],
+            tuple[asyncio.AbstractEventLoop, AzureOpenAIChatCompletionClient],
+        ] = {}
+        self._hooked_loops: set[int] = set()
+
+    def get_credential(self, tenant_id: str | None = None) -> CachedTokenCredential:
+        """
+        Returns the shared, token-caching `AzureDeveloperCliCredential` for the tenant.
+
+        Args:
+            tenant_id (str, optional): The Azure tenant ID. Defaults to None.
+
+        Returns:
+            CachedTokenCredential: The credential.
+        """
+        return get_shared_credential(tenant_id)
+
+    def get_or_create(
+        self,
+        key: ClientKey,
+        factory: Callable[[], AzureOpenAIChatCompletionClient],
+    ) -> AzureOpenAIChatCompletionClient:
+        """
+        Returns the pooled client for `key` on the running event loop, creating it with `factory` on a miss.
+
+        Args:
+            key (ClientKey): The client identity.
+            factory (Callable[[], AzureOpenAIChatCompletionClient]): Builds the client on a miss.
+
+        Returns:
+            AzureOpenAIChatCompletionClient: The client.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._prune_closed_loops()
+            entry = self._clients.get((key, id(loop)))
+            if entry is not None and entry[0] is loop:
+                return entry[1]
+
+            client = factory()
+            self._clients[(key, id(loop))] = (loop, client)
+            if id(loop) not in self._hooked_loops:
+                self._hooked_loops.add(id(loop))
+                asyncio_atexit.register(self.aclose, loop=loop)
+            return client
+
+    async def aclose(self) -> None:
+        """Closes and forgets every client created on the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = [
+                client for owner, client in self._clients.values() if owner is loop
+            ]
+            self._clients = {
+                slot: entry
+                for slot, entry in self._clients.items()
+                if entry[0] is not loop
+            }
+            self._hooked_loops.discard(id(loop))
+
+        for client in clients:
+            await close_client(client)
+
+    async def aclose_all(self) -> None:
+        """Closes the clients of the running event loop and all shared credentials."""
+        await self.aclose()
+        await close_shared_credentials()
+
+    def _prune_closed_loops(self) -> None:
+        # Clients of a closed loop can no longer be closed gracefully, so they are only dropped.
+        closed = {
+            slot for slot, (owner, _) in self._clients.items() if owner.is_closed()
+        }
+        for slot in closed:
+            del self._clients[slot]
+            self._hooked_loops.discard(slot[1])
+
+
+async def close_client(client: AzureOpenAIChatCompletionClient) -> None:
+    """
+    Closes the HTTP connection pool behind a model client.
+
+    Args:
+        client (AzureOpenAIChatCompletionClient): The client to close.
+    """
+    # `AzureOpenAIChatCompletionClient` does not expose `close` itself
+    inner = getattr(client, "_client", None)
+    if inner is not None:
+        await inner.close()
+
+
+client_registry = ModelClientRegistry()
+
+MAGENTIC_ONE_DEFAULT_AGENTS = [
+    {
+        "input_key": "0001",
+        "type": "MagenticOne",
+        "name": "Coder",
+        "system_message": "",
+        "description": "",
+        "icon": "👨‍💻",
+    },
+    {
+        "input_key": "0002",
+        "type": "MagenticOne",
+        "name": "Executor",
+        "system_message": "",
+        "description": "",
+        "icon": "💻",
+    },
+    {
+        "input_key": "0003",
+        "type": "MagenticOne",
+        "name": "FileSurfer",
+        "system_message": "",
+        "description": "",
+        "icon": "📂",
+    },
+    {
+        "input_key": "0004",
+        "type": "MagenticOne",
+        "name": "WebSurfer",
+        "system_message": "",
+        "description": "",
+        "icon": "🏄‍♂️",
+    },
+]
 
 
 class MagenticOneHelper:
@@ -59,7 +253,8 @@ class MagenticOneHelper:
             api_key (str, optional): The Azure OpenAI API key. Defaults to None.
             search_key (str, optional): The admin key for the Azure AI Search service. Defaults to None.
             logs_dir (str, optional): The directory to store logs and downloads. Defaults to None.
-            save_screenshots (bool, optional): Whether to save the screenshots of web pages. Defaults to False.
+            save_screenshots (bool, optional): Whether to save the screenshots of web pages to
+                `logs_dir/screenshots`. Defaults to False.
             run_locally (bool, optional): Whether to run locally. Defaults to False.
         """
         self.model = model
@@ -72,22 +267,56 @@ class MagenticOneHelper:
 
         self.logs_dir = logs_dir
         self.runtime: SingleThreadedAgentRuntime | None = None
+        self.agents: list[AssistantAgent] = []
+        self._agent_leases: list[AgentLease] = []
+        self._executor_leases: list[tuple["CodeExecutorPool", "PooledExecutor"]] = []
         # self.log_handler: LogHandler | None = None
         self.save_screenshots = save_screenshots
         self.run_locally = run_locally
 
         self.max_rounds = 50
-        self.max_time = 25 * 60
+        self.budget = RunBudget(max_time=25 * 60)
         self.max_stalls_before_replan = 5
         self.return_final_answer = True
         self.start_page = "https://www.bing.com"
+        # Streams the responses of the orchestrator and custom agents as `ModelStreamChunk`s
+        self.stream_model_output = False
+        # "auto", "record" or "replay" to cache the model responses, see `llm_cache`
+        self.llm_cache_mode = os.getenv("LLM_CACHE_MODE", "off")
+        self.llm_cache_path = os.getenv("LLM_CACHE_PATH", "./.llm_cache.sqlite")
+        # The HTTP cache of the WebSurfer's browser, see `web_cache`; empty to disable it
+        self.web_cache_path = os.getenv("WEB_CACHE_PATH", "./.web_cache.sqlite")
+        # Replaces screenshots that repeat the previous one in requests, see `screenshot_dedup`
+        self.screenshot_dedup = os.getenv("SCREENSHOT_DEDUP", "true").lower() == "true"
+        # How `save_screenshots` saves them to `logs_dir/screenshots`, see `ScreenshotSink`
+        self.screenshot_format = os.getenv("SCREENSHOT_FORMAT", "webp")
+        self.screenshot_quality = int(os.getenv("SCREENSHOT_QUALITY", 80))
+        self.screenshot_quota_mb = float(os.getenv("SCREENSHOT_QUOTA_MB", 100))
+        # Docker containers kept started ahead of the runs, see `CodeExecutorPool`
+        self.docker_pool_min_idle = int(os.getenv("DOCKER_POOL_MIN_IDLE", 1))
+        # ACA dynamic sessions kept warm ahead of the runs; off by default, as idle sessions are billed
+        self.aca_pool_min_idle = int(os.getenv("ACA_POOL_MIN_IDLE", 0))
+        # Traces the runs with PromptFlow, see `enable_tracing`
+        self.tracing = os.getenv("PROMPTFLOW_TRACING", "false").lower() == "true"
+
+        # The models agents may use, by name; `model` is served by the deployment above
+        # unless `MODEL_DEPLOYMENTS` lists its deployments
+        self.deployments = load_deployments(
+            os.getenv("MODEL_DEPLOYMENTS"),
+            Deployment(
+                azure_endpoint=azure_endpoint,
+                azure_deployment=azure_deployment,
+                api_version=api_version,
+                model=model,
+                requests_per_minute=float(os.getenv("AZURE_OPENAI_RPM", 0)) or None,
+                tokens_per_minute=float(os.getenv("AZURE_OPENAI_TPM", 0)) or None,
+            ),
+        )
+        # The model of the orchestrator, if not `model`
+        self.orchestrator_model: str | None = os.getenv("ORCHESTRATOR_MODEL")
 
         self.azure_credential: AzureKeyCredential | AsyncTokenCredential = (
-            AzureDeveloperCliCredential()
-            if os.getenv("AZURE_TENANT_ID") is None
-            else AzureDeveloperCliCredential(
-                tenant_id=os.getenv("AZURE_TENANT_ID"), process_timeout=60
-            )
+            client_registry.get_credential(os.getenv("AZURE_TENANT_ID"))
         )
         self.azure_open_ai_credential = (
             self.azure_credential if api_key is None else AzureKeyCredential(api_key)
@@ -96,15 +325,94 @@ class MagenticOneHelper:
         if not os.path.exists(self.logs_dir):
             os.makedirs(self.logs_dir)
 
-    async def create_client(self) -> AzureOpenAIChatCompletionClient:
+    async def create_client(
+        self, model: str | None = None, deployment: str | None = None
+    ) -> ChatCompletionClient:
         """
-        Creates the `AzureOpenAIChatCompletionClient` client using the provided credential.
+        Creates the client of a model of `deployments`, or of a deployment. A model served by several
+        deployments gets a `ModelRouter` that load-balances over them and fails over between them.
+
+        Unless `llm_cache_mode` is "off", responses are served from and recorded to the
+        `ResponseStore` at `llm_cache_path` by a `CachingChatCompletionClient`. With
+        `screenshot_dedup`, a `ScreenshotDedupChatCompletionClient` drops repeated screenshots first.
+
+        Args:
+            model (str, optional): The model name. Defaults to `model`.
+            deployment (str, optional): The deployment name, of `deployments` or on `azure_endpoint`,
+                instead of a model. Defaults to None.
+
+        Raises:
+            ValueError: Raises a ValueError if the model is unknown.
+
+        Returns:
+            ChatCompletionClient: The client.
+        """
+        if deployment is not None:
+            targets = list(
+                dict.fromkeys(
+                    target
+                    for targets in self.deployments.values()
+                    for target in targets
+                    if target.azure_deployment == deployment
+                )
+            ) or [
+                Deployment(
+                    azure_endpoint=self.azure_endpoint,
+                    azure_deployment=deployment,
+                    api_version=self.api_version,
+                    model=self.model,
+                )
+            ]
+        else:
+            model = model or self.model
+            if model not in self.deployments:
+                raise ValueError(
+                    f"Unknown model {model!r}, expected one of {sorted(self.deployments)}."
+                )
+            targets = self.deployments[model]
+
+        if len(targets) == 1:
+            client = await self.create_deployment_client(targets[0])
+        else:
+            # The router fails over to another deployment instead of retrying a throttled one
+            client = ModelRouter(
+                [
+                    Route(target, await self.create_deployment_client(target, 0))
+                    for target in targets
+                ]
+            )
+
+        if self.llm_cache_mode != "off":
+            client = CachingChatCompletionClient(
+                client,
+                get_response_store(self.llm_cache_path),
+                mode=self.llm_cache_mode,
+                model=deployment or model,
+            )
+        if self.screenshot_dedup:
+            client = ScreenshotDedupChatCompletionClient(client)
+        return client
+
+    async def create_deployment_client(
+        self, deployment: Deployment, max_retries: int = 6
+    ) -> ChatCompletionClient:
+        """
+        Creates the `AzureOpenAIChatCompletionClient` client of a deployment using the provided credential.
+        The client is pooled in `client_registry` and shared with other helpers using the same
+        endpoint, deployment, API version and auth mode.
+
+        Calls are throttled and retried by a `RateLimitedChatCompletionClient` sharing the
+        deployment's process-wide `RateLimiter`.
+
+        Args:
+            deployment (Deployment): The deployment.
+            max_retries (int, optional): The retries of a throttled or failed call. Defaults to 6.
 
         Raises:
             TypeError: Raises a TypeError if the credential type is invalid.
 
         Returns:
-            AzureOpenAIChatCompletionClient: The client.
+            ChatCompletionClient: The client.
         """
 
         class AuthArgs(TypedDict, total=False):
@@ -114,206 +422,515 @@ class MagenticOneHelper:
         auth_args = AuthArgs()
         if isinstance(self.azure_open_ai_credential, AzureKeyCredential):
             auth_args["api_key"] = self.azure_open_ai_credential.key
+            key_digest = hashlib.sha256(
+                self.azure_open_ai_credential.key.encode()
+            ).hexdigest()
+            auth_mode = f"api_key:{key_digest[:16]}"
+        elif isinstance(self.azure_open_ai_credential, CachedTokenCredential):
+            auth_args["azure_ad_token_provider"] = (
+                self.azure_open_ai_credential.bearer_token_provider(
+                    "https://cognitiveservices.azure.com/.default"
+                )
+            )
+            auth_mode = f"aad:{os.getenv('AZURE_TENANT_ID') or ''}"
         elif isinstance(self.azure_open_ai_credential, AsyncTokenCredential):
             auth_args["azure_ad_token_provider"] = get_bearer_token_provider(
                 self.azure_open_ai_credential,
                 "https://cognitiveservices.azure.com/.default",
             )
+            auth_mode = f"aad:{os.getenv('AZURE_TENANT_ID') or ''}"
         else:
             raise TypeError("Invalid credential type.")
 
-        return AzureOpenAIChatCompletionClient(
-            model=self.model,
-            azure_deployment=self.azure_deployment,
-            api_version=self.api_version,
-            azure_endpoint=self.azure_endpoint,
-            model_info={
-                "vision": True,
-                "function_calling": True,
-                "json_output": True,
-            },
-            **auth_args,
+        key = ClientKey(
+            azure_endpoint=deployment.azure_endpoint,
+            azure_deployment=deployment.azure_deployment,
+            api_version=deployment.api_version,
+            auth_mode=auth_mode,
+        )
+        client = client_registry.get_or_create(
+            key,
+            lambda: AzureOpenAIStreamingClient(
+                model=deployment.model,
+                azure_deployment=deployment.azure_deployment,
+                api_version=deployment.api_version,
+                azure_endpoint=deployment.azure_endpoint,
+                model_info={
+                    "vision": True,
+                    "function_calling": True,
+                    "json_output": True,
+                },
+                # Throttling is retried by the rate limiter, which sees it across all clients
+                max_retries=0,
+                **auth_args,
+            ),
+        )
+        limiter = get_rate_limiter(
+            (deployment.azure_endpoint, deployment.azure_deployment),
+            requests_per_minute=deployment.requests_per_minute,
+            tokens_per_minute=deployment.tokens_per_minute,
         )
+        return RateLimitedChatCompletionClient(client, limiter, max_retries=max_retries)
 
-    async def initialize(self, agents: list[dict]) -> None:
+    @classmethod
+    def from_env(
+        cls, logs_dir: str, save_screenshots: bool = False, run_locally: bool = False
+    ) -> "MagenticOneHelper":
+        """
+        Creates a helper for the Azure OpenAI deployment and Azure AI Search service configured in the
+        environment (`AZURE_OPENAI_*` and `AZURE_SEARCH_*` variables, see `.env`).
+
+        Args:
+            logs_dir (str): The directory to store logs and downloads.
+            save_screenshots (bool, optional): Whether to save the screenshots of web pages. Defaults to False.
+            run_locally (bool, optional): Whether to run locally. Defaults to False.
+
+        Returns:
+            MagenticOneHelper: The helper.
+        """
+        return cls(
+            model=os.getenv("AZURE_OPENAI_MODEL"),
+            azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            search_endpoint=os.getenv("AZURE_SEARCH_SERVICE_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            search_key=os.getenv("AZURE_SEARCH_ADMIN_KEY"),
+            logs_dir=logs_dir,
+            save_screenshots=save_screenshots,
+            run_locally=run_locally,
+        )
+
+    async def initialize(
+        self, agents: list[dict], model_client: ChatCompletionClient | None = None
+    ) -> None:
         """
         Initializes the `MagenticOne` system, setting up agents and runtime.
 
         Args:
             agents (list[dict]): A list of dictionaries containing configurations.
+            model_client (ChatCompletionClient, optional): The model client to use instead of the
+                Azure OpenAI one, e.g. a fake one in tests. Defaults to None.
         """
+        # Unknown agents fail before any client or agent is created
+        agent_registry.validate(agents)
+
+        if self.tracing:
+            enable_tracing()
+
         # Create the runtime
         self.runtime = SingleThreadedAgentRuntime()
 
-        self.client = await self.create_client()
+        # Counts this run's tokens on the shared client, for `budget`
+        self.client = UsageMeter(model_client or await self.create_client())
+        # Agents and the orchestrator only pick their own model with the Azure OpenAI clients
+        self._route_models = model_client is None
+        self.orchestrator_client = await self.model_client(
+            {"model": self.orchestrator_model}, self.client
+        )
+
+        self.model_stream = ModelStreamChannel()
 
         # Set up agents
         self.agents = await self.setup_agents(agents, self.client, self.logs_dir)
         print("Agents setup complete!")
 
+    async def model_client(
+        self, agent: dict, default: ChatCompletionClient
+    ) -> ChatCompletionClient:
+        """
+        Returns the client of an agent: that of its `model` or `deployment` key if it has one,
+        metered with the run's other clients, or `default`.
+
+        Args:
+            agent (dict): The agent's configuration.
+            default (ChatCompletionClient): The client of agents without a model of their own.
+
+        Returns:
+            ChatCompletionClient: The client.
+        """
+        if not self._route_models or not (
+            agent.get("model") or agent.get("deployment")
+        ):
+            return default
+        return self.client.share(
+            await self.create_client(
+                model=agent.get("model"), deployment=agent.get("deployment")
+            )
+        )
+
+    def streamed(
+        self, client: ChatCompletionClient, source: str
+    ) -> ChatCompletionClient:
+        """Returns `client`, streaming its responses to `model_stream` if `stream_model_output` is set."""
+        if not self.stream_model_output:
+            return client
+        return StreamingChatCompletionClient(client, source, self.model_stream)
+
     async def setup_agents(
-        self, agents: list[dict], client: AzureOpenAIChatCompletionClient, logs_dir: str
+        self, agents: list[dict], client: ChatCompletionClient, logs_dir: str
     ) -> list[AssistantAgent]:
+        """
+        Checks the agents out of `agent_registry`: an agent whose configuration a previous run used
+        is reused, the others are built by the factory of their type.
+
+        Args:
+            agents (list[dict]): The agents' configurations.
+            client (ChatCompletionClient): The model client of agents without a model of their own.
+            logs_dir (str): The directory to store logs and downloads.
+
+        Raises:
+            ValueError: Raises a ValueError if an agent's type is unknown.
+
+        Returns:
+            list[AssistantAgent]: The agents.
+        """
+        agent_registry.validate(agents)
         agent_list = []
         for agent in agents:
-            # This is default `MagenticOne` agent - `Coder`
-            if agent["type"] == "MagenticOne" and agent["name"] == "Coder":
-                coder = MagenticOneCoderAgent("Coder", model_client=client)
-                agent_list.append(coder)
-                print("Coder added!")
-
-            # This is default `MagenticOne` agent - `Executor`
-            elif agent["type"] == "MagenticOne" and agent["name"] == "Executor":
-                # If run locally; local docker execution
-                if self.run_locally:
-                    # Docker
-                    code_executor = DockerCommandLineCodeExecutor(work_dir=logs_dir)
-                    await code_executor.start()
-
-                    executor = CodeExecutorAgent(
-                        "Executor", code_executor=code_executor
-                    )
-
-                # If run remotely; Azure Container Apps (ACA) Dynamic Sessions execution
-                else:
-                    pool_endpoint = os.getenv("POOL_MANAGEMENT_ENDPOINT")
-                    assert (
-                        pool_endpoint
-                    ), "`POOL_MANAGEMENT_ENDPOINT` environment variable is not set."
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        executor = CodeExecutorAgent(
-                            "Executor",
-                            code_executor=ACADynamicSessionsCodeExecutor(
-                                pool_management_endpoint=pool_endpoint,
-                                credential=self.azure_open_ai_credential,
-                                work_dir=temp_dir,
-                            ),
-                        )
-
-                agent_list.append(executor)
-                print("Executor added!")
-
-            # This is default MagenticOne agent - WebSurfer
-            elif agent["type"] == "MagenticOne" and agent["name"] == "WebSurfer":
-                web_surfer = MultimodalWebSurfer("WebSurfer", model_client=client)
-                agent_list.append(web_surfer)
-                print("WebSurfer added!")
-
-            # This is default MagenticOne agent - FileSurfer
-            elif agent["type"] == "MagenticOne" and agent["name"] == "FileSurfer":
-                file_surfer = FileSurfer("FileSurfer", model_client=client)
-                agent_list.append(file_surfer)
-                print("FileSurfer added!")
-
-            # This is custom agent - simple SYSTEM message and DESCRIPTION is used inherited from AssistantAgent
-            elif agent["type"] == "Custom":
-                custom_agent = MagenticOneCustomAgent(
-                    agent["name"],
-                    model_client=client,
-                    system_message=agent["system_message"],
-                    description=agent["description"],
-                )
+            agent_client = await self.model_client(agent, client)
+            if agent_registry.factory(agent).streamed:
+                agent_client = self.streamed(agent_client, agent["name"])
+            lease = await agent_registry.acquire(self, agent, agent_client)
+            self._agent_leases.append(lease)
+            agent_list.append(lease.agent)
+            print(f'{agent["name"]} {"reused" if lease.reused else "added"}!')
 
-                agent_list.append(custom_agent)
-                print(f'{agent["name"]} (custom) added!')
-
-            # This is custom agent — RAG agent — you need to specify `index_name` and
-            # Azure AI Search service endpoint and admin key in .env file
-            elif agent["type"] == "RAG":
-                # RAG agent
-                rag_agent = MagenticOneRAGAgent(
-                    agent["name"],
-                    model_client=client,
-                    index_name=agent["index_name"],
-                    description=agent["description"],
-                    search_key=self.search_key,
-                    search_endpoint=self.search_endpoint,
-                )
-                agent_list.append(rag_agent)
-                print(f'{agent["name"]} (RAG) added!')
+        return agent_list
 
-            else:
-                raise ValueError("Unknown Agent!")
+    async def lease_executor(self) -> CodeExecutor:
+        """
+        Checks a code executor out for this run: a Docker one if `run_locally`, else an Azure
+        Container Apps (ACA) dynamic session. It is returned to its pool by `close`.
 
-        return agent_list
+        Returns:
+            CodeExecutor: The executor.
+        """
+        if self.run_locally:
+            from executor_pool import get_docker_executor_pool
+
+            # Docker, from the pool of started containers
+            pool = get_docker_executor_pool(self.docker_pool_min_idle)
+        else:
+            from aca_sessions import get_aca_session_pool
+
+            pool_endpoint = os.getenv("POOL_MANAGEMENT_ENDPOINT")
+            assert (
+                pool_endpoint
+            ), "`POOL_MANAGEMENT_ENDPOINT` environment variable is not set."
+            # One session per run, from the warm sessions of the session pool
+            pool = get_aca_session_pool(
+                pool_endpoint, self.azure_credential, self.aca_pool_min_idle
+            )
+
+        lease = await pool.acquire()
+        self._executor_leases.append((pool, lease))
+        return lease.executor
+
+    async def main(
+        self, task: str, cancellation_token: CancellationToken | None = None
+    ) -> AsyncGenerator[AgentEvent | ChatMessage | ModelStreamChunk | TaskResult, None]:
+        """
+        Runs the team on a task within `budget`, yielding its messages and then its `TaskResult`.
+        With `stream_model_output`, the streamed responses are yielded as `ModelStreamChunk`s
+        before the messages they make up.
 
-    def main(
-        self, task: str
-    ) -> AsyncGenerator[AgentEvent | ChatMessage | TaskResult, None]:
+        If the run is cancelled, by `cancellation_token` or because a turn exceeded its deadline, the
+        model calls and code executions in flight are cancelled and a `TaskResult` with the messages so
+        far is still yielded. The agents' resources are released when the run ends either way.
+
+        With `save_screenshots`, the images of the run's multimodal messages are saved to
+        `logs_dir/screenshots` in the background, see `ScreenshotSink`.
+
+        Args:
+            task (str): The task.
+            cancellation_token (CancellationToken, optional): Cancels the run. Defaults to None.
+        """
+        guard = RunGuard(self.budget, meter=self.client)
+        if cancellation_token is not None:
+            cancellation_token.add_callback(guard.cancel)
         team = MagenticOneGroupChat(
             participants=self.agents,
-            model_client=self.client,
+            model_client=self.streamed(
+                self.orchestrator_client, "MagenticOneOrchestrator"
+            ),
+            termination_condition=guard.termination_condition(),
             max_turns=self.max_rounds,
             max_stalls=self.max_stalls_before_replan,
         )
-        stream = team.run_stream(task=task)
-        return stream
+        messages: list[AgentEvent | ChatMessage] = []
+        sink = (
+            ScreenshotSink(
+                os.path.join(self.logs_dir, "screenshots"),
+                format=self.screenshot_format,
+                quality=self.screenshot_quality,
+                max_bytes=int(self.screenshot_quota_mb * 2**20),
+            )
+            if self.save_screenshots
+            else None
+        )
+        guard.start(team)
+        try:
+            async for message in merge_chunks(
+                team.run_stream(task=task, cancellation_token=guard.cancellation_token),
+                self.model_stream,
+            ):
+                if isinstance(message, TaskResult):
+                    if guard.reason is not None:
+                        message.stop_reason = guard.reason
+                # Chunks preview a message to come, they are not part of the result
+                elif not isinstance(message, ModelStreamChunk):
+                    messages.append(message)
+                    guard.turn()
+                    if sink is not None and isinstance(message, MultiModalMessage):
+                        sink.submit(message)
+                yield message
+        except asyncio.CancelledError:
+            # Only a cancellation by the guard becomes a partial result
+            if not guard.cancelled or asyncio.current_task().cancelling():
+                raise
+            yield TaskResult(messages=messages, stop_reason=guard.reason)
+        finally:
+            await guard.close()
+            if sink is not None:
+                await sink.aclose()
+                stats = sink.stats
+                print(
+                    f"Saved {stats['saved']} screenshots ({stats['bytes'] / 1024:.0f} KiB), "
+                    f"skipped {stats['duplicates']} duplicates and dropped {stats['dropped']}."
+                )
+            await self.close()
+
+    async def close(self) -> None:
+        """
+        Returns the agents of this run to `agent_registry`, which resets them for the next run (or
+        closes them, e.g. their search clients and the WebSurfer's browser, if they are not reused),
+        and the code executors to their pool with the files they produced moved to `logs_dir`.
+        Pooled model clients stay open for the next run.
+        """
+        leases, self._agent_leases = self._agent_leases, []
+        for lease in leases:
+            await agent_registry.release(lease)
+
+        leases, self._executor_leases = self._executor_leases, []
+        for pool, lease in leases:
+            await pool.release(lease, export_dir=self.logs_dir)
 
 
 async def main(agents: list[dict], task: str, run_locally: bool) -> None:
-    magentic_one = MagenticOneHelper(logs_dir=".", run_locally=run_locally)
+    from autogen_agentchat.ui import Console
+
+    magentic_one = MagenticOneHelper.from_env(logs_dir=".", run_locally=run_locally)
     await magentic_one.initialize(agents)
 
-    team = MagenticOneGroupChat(
-        participants=magentic_one.agents,
-        model_client=magentic_one.client,
-        max_turns=magentic_one.max_rounds,
-        max_stalls=magentic_one.max_stalls_before_replan,
-    )
+    await Console(magentic_one.main(task=task))
+
+
+def read_batch(path: str) -> list[dict]:
+    """
+    Reads the tasks of a batch from a JSONL file, one `{"id": ..., "task": ..., "agents": [...]}` object per
+    line. `agents` is optional. Without an `id`, the task is identified by a hash of its text.
+
+    Args:
+        path (str): The JSONL file.
+
+    Raises:
+        ValueError: Raises a ValueError if a line has no task or two tasks share an ID.
+
+    Returns:
+        list[dict]: The tasks, each with an `id`.
+    """
+    tasks, seen = [], set()
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not isinstance(entry.get("task"), str):
+                raise ValueError(f"Line {number} of {path} has no `task`.")
+            entry["id"] = str(
+                entry.get("id")
+                or hashlib.sha256(entry["task"].encode()).hexdigest()[:16]
+            )
+            if entry["id"] in seen:
+                raise ValueError(
+                    f"Line {number} of {path} repeats the ID {entry['id']}."
+                )
+            seen.add(entry["id"])
+            tasks.append(entry)
+    return tasks
+
+
+def read_finished(path: str) -> set[str]:
+    """Returns the IDs of the tasks with a result in an output JSONL file, other than failures."""
+    if not os.path.exists(path):
+        return set()
+    finished = set()
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line of an interrupted batch
+                continue
+            if record.get("status") != "failed":
+                finished.add(record["id"])
+    return finished
+
+
+async def run_batch(
+    tasks_path: str,
+    output_path: str,
+    agents: list[dict],
+    run_locally: bool,
+    concurrency: int = 4,
+    logs_dir: str = "./logs",
+    model_client_factory: Callable[[], ChatCompletionClient] | None = None,
+) -> dict[str, int]:
+    """
+    Runs the tasks of a JSONL file, `concurrency` at a time, appending each result to `output_path` as
+    soon as the task finishes. Tasks that already have a result there, other than a failure, are skipped,
+    so an interrupted batch is resumed by running it again.
+
+    All tasks share the pooled model clients and code executors; a task's downloads and files go to
+    `logs_dir/<id>`.
+
+    Args:
+        tasks_path (str): The tasks, see `read_batch`.
+        output_path (str): The results, one JSON object per line.
+        agents (list[dict]): The agents of tasks that do not list their own.
+        run_locally (bool): Whether to run locally.
+        concurrency (int, optional): The tasks run at once. Defaults to 4.
+        logs_dir (str, optional): The directory to store logs and downloads. Defaults to "./logs".
+        model_client_factory (Callable[[], ChatCompletionClient], optional): Creates the model client of
+            each task instead of the Azure OpenAI one. Defaults to None.
+
+    Returns:
+        dict[str, int]: The number of tasks per status, including `skipped`.
+    """
+    tasks = read_batch(tasks_path)
+    finished = read_finished(output_path)
+    pending = [entry for entry in tasks if entry["id"] not in finished]
+    counts = {"skipped": len(tasks) - len(pending)}
+    print(f"{len(pending)} tasks to run, {counts['skipped']} already done.")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    partial = False
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            partial = file.read(1) != b"\n"
+    output = open(output_path, "a", encoding="utf-8")
+    if partial:
+        # End the partial last line of an interrupted batch, so the next result is not glued to it
+        output.write("\n")
+
+    async def run(entry: dict) -> None:
+        async with semaphore:
+            started = time.monotonic()
+            record = {"id": entry["id"], "task": entry["task"]}
+            magentic_one = MagenticOneHelper.from_env(
+                logs_dir=os.path.join(logs_dir, entry["id"]), run_locally=run_locally
+            )
+            result: TaskResult | None = None
+            initialized = False
+            try:
+                await magentic_one.initialize(
+                    entry.get("agents") or agents,
+                    model_client=(
+                        model_client_factory() if model_client_factory else None
+                    ),
+                )
+                initialized = True
+                async for message in magentic_one.main(task=entry["task"]):
+                    if isinstance(message, TaskResult):
+                        result = message
+                record["status"] = "completed"
+            except Exception as e:
+                record["status"] = "failed"
+                record["error"] = f"{type(e).__name__}: {e}"
+                # `main` releases the agents itself
+                if not initialized:
+                    await magentic_one.close()
+
+            if result is not None:
+                last = result.messages[-1] if result.messages else None
+                record["final_answer"] = getattr(last, "content", None)
+                record["stop_reason"] = result.stop_reason
+            if isinstance(getattr(magentic_one, "client", None), UsageMeter):
+                usage = magentic_one.client.usage
+                record["usage"] = {
+                    "prompt_tokens": usage.prompt_tokens,
+                    "completion_tokens": usage.completion_tokens,
+                }
+            record["duration"] = round(time.monotonic() - started, 3)
+
+            output.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+            done = sum(counts.values()) - counts["skipped"]
+            print(
+                f"[{done}/{len(pending)}] {entry['id']}: {record['status']} in {record['duration']:.1f}s"
+            )
 
-    await Console(team.run_stream(task=task))
+    try:
+        await asyncio.gather(*(run(entry) for entry in pending))
+    finally:
+        output.close()
+    return counts
 
 
 if __name__ == "__main__":
     import argparse
 
-    MAGENTIC_ONE_DEFAULT_AGENTS = [
-        {
-            "input_key": "0001",
-            "type": "MagenticOne",
-            "name": "Coder",
-            "system_message": "",
-            "description": "",
-            "icon": "👨‍💻",
-        },
-        {
-            "input_key": "0002",
-            "type": "MagenticOne",
-            "name": "Executor",
-            "system_message": "",
-            "description": "",
-            "icon": "💻",
-        },
-        {
-            "input_key": "0003",
-            "type": "MagenticOne",
-            "name": "FileSurfer",
-            "system_message": "",
-            "description": "",
-            "icon": "📂",
-        },
-        {
-            "input_key": "0004",
-            "type": "MagenticOne",
-            "name": "WebSurfer",
-            "system_message": "",
-            "description": "",
-            "icon": "🏄‍♂️",
-        },
-    ]
-
     parser = argparse.ArgumentParser(
         description="Run `MagenticOneHelper` with specified task and run_locally option.",
         epilog="Example: python magnetic_one_helper.py --task 'Find me a French restaurant in Dubai with 2 Michelin stars?'",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
-    parser.add_argument(
+    task_group = parser.add_mutually_exclusive_group(required=True)
+    task_group.add_argument(
         "--task",
         "-t",
         type=str,
-        required=True,
         help="The task to run, e.g. 'How much taxes has Elon Musk paid?'",
     )
+    task_group.add_argument(
+        "--tasks-file",
+        type=str,
+        help="A JSONL file of tasks to run as a batch, one {'id': ..., 'task': ...} object per line",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="results.jsonl",
+        help="Where a batch appends its results; tasks with a result there are skipped",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="The tasks of a batch run at once",
+    )
+    parser.add_argument(
+        "--logs-dir",
+        type=str,
+        default="./logs",
+        help="The directory to store the logs and downloads of a batch",
+    )
+    parser.add_argument(
+        "--llm-cache",
+        choices=["off", "auto", "record", "replay"],
+        default=os.getenv("LLM_CACHE_MODE", "off"),
+        help="Caches the model responses: 'replay' runs offline from a 'record'ed run",
+    )
+    parser.add_argument(
+        "--trace",
+        action=argparse.BooleanOptionalAction,
+        default=os.getenv("PROMPTFLOW_TRACING", "false").lower() == "true",
+        help="Traces the runs with PromptFlow, viewable in http://127.0.0.1:23333/v1.0/ui/traces/",
+    )
     parser.add_argument(
         "--run_locally",
         action=argparse.BooleanOptionalAction,
@@ -322,5 +939,21 @@ if __name__ == "__main__":
     )
 
     args = parser.parse_args()
-
-    asyncio.run(main(MAGENTIC_ONE_DEFAULT_AGENTS, args.task, args.run_locally))
+    os.environ["LLM_CACHE_MODE"] = args.llm_cache
+    os.environ["PROMPTFLOW_TRACING"] = str(args.trace).lower()
+
+    if args.tasks_file:
+        print(
+            asyncio.run(
+                run_batch(
+                    args.tasks_file,
+                    args.output,
+                    MAGENTIC_ONE_DEFAULT_AGENTS,
+                    args.run_locally,
+                    concurrency=args.concurrency,
+                    logs_dir=args.logs_dir,
+                )
+            )
+        )
+    else:
+        asyncio.run(main(MAGENTIC_ONE_DEFAULT_AGENTS, args.task, args.run_locally))
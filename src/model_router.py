@@ -0,0 +1,281 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from client_wrappers import DelegatingChatCompletionClient, is_retryable, retry_after
+
+
+@dataclass(frozen=True)
+class Deployment:
+    """An Azure OpenAI deployment serving a logical model."""
+
+    azure_endpoint: str
+    azure_deployment: str
+    api_version: str
+    model: str
+    weight: float = 1.0
+    """The deployment's share of the requests relative to the model's other deployments."""
+    requests_per_minute: float | None = None
+    """The deployment's request quota, see `RateLimiter`."""
+    tokens_per_minute: float | None = None
+    """The deployment's token quota, see `RateLimiter`."""
+
+
+def load_deployments(
+    path: str | None, default: Deployment | None = None
+) -> dict[str, list[Deployment]]:
+    """
+    Loads the catalog of logical models and their deployments.
+
+    The file maps each model name to its deployments, e.g.
+    `{"gpt-4o": [{"azure_endpoint": ..., "azure_deployment": ..., "api_version": ...}, ...]}`, with
+    optional `model`, `weight`, `rpm` and `tpm` keys. `api_version` defaults to that of `default`,
+    and `model` to the name.
+
+    Args:
+        path (str, optional): The JSON file, or None for only the default deployment.
+        default (Deployment, optional): The deployment configured in the environment, served as its
+            model unless the file lists that model. Defaults to None.
+
+    Raises:
+        ValueError: Raises a ValueError if a model has no deployments or a deployment lacks its endpoint or name.
+
+    Returns:
+        dict[str, list[Deployment]]: The deployments of each model.
+    """
+    catalog: dict[str, list[Deployment]] = {}
+    if path:
+        with open(path, encoding="utf-8") as file:
+            config = json.load(file)
+        for name, entries in config.items():
+            if not entries:
+                raise ValueError(f"Model {name!r} has no deployments.")
+            deployments = []
+            for entry in entries:
+                if not {"azure_endpoint", "azure_deployment"} <= entry.keys():
+                    raise ValueError(
+                        f"Each deployment of {name!r} needs an `azure_endpoint` and an `azure_deployment`."
+                    )
+                deployments.append(
+                    Deployment(
+                        azure_endpoint=entry["azure_endpoint"],
+                        azure_deployment=entry["azure_deployment"],
+                        api_version=entry.get("api_version")
+                        or (default.api_version if default else ""),
+                        model=entry.get("model", name),
+                        weight=float(entry.get("weight", 1.0)),
+                        requests_per_minute=entry.get("rpm"),
+                        tokens_per_minute=entry.get("tpm"),
+                    )
+                )
+            catalog[name] = deployments
+    if default is not None:
+        catalog.setdefault(default.model, [default])
+    return catalog
+
+
+class _RouteState:
+    """The process-wide load and health of one deployment, shared by all routers that use it."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+
+_route_states: dict[Deployment, _RouteState] = {}
+_route_states_lock = threading.Lock()
+
+
+def _route_state(deployment: Deployment) -> _RouteState:
+    with _route_states_lock:
+        state = _route_states.get(deployment)
+        if state is None:
+            state = _route_states[deployment] = _RouteState()
+        return state
+
+
+@dataclass
+class Route:
+    """A deployment and the client that calls it."""
+
+    deployment: Deployment
+    client: ChatCompletionClient
+    state: _RouteState = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.state = _route_state(self.deployment)
+
+
+class ModelRouter(DelegatingChatCompletionClient):
+    """
+    Load-balances one logical model over several deployments, possibly on different endpoints.
+
+    Each call goes to the available deployment with the fewest outstanding requests (relative to its
+    weight), counted across all routers of the process. A deployment that throttles or fails is
+    cooled down, for its `retry-after` if it sent one, and the call fails over to the next one.
+    """
+
+    def __init__(
+        self,
+        routes: Sequence[Route],
+        max_attempts: int | None = None,
+        cooldown: float = 5,
+        max_cooldown: float = 60,
+    ) -> None:
+        """
+        Args:
+            routes (Sequence[Route]): The deployments of the model.
+            max_attempts (int, optional): The calls made before giving up. Defaults to twice the routes.
+            cooldown (float, optional): Seconds a failed deployment is skipped, doubled per consecutive
+                failure. Defaults to 5.
+            max_cooldown (float, optional): The maximum cooldown in seconds. Defaults to 60.
+
+        Raises:
+            ValueError: Raises a ValueError if there are no routes.
+        """
+        if not routes:
+            raise ValueError("A model router needs at least one route.")
+        super().__init__(routes[0].client)
+        self.routes = list(routes)
+        self.max_attempts = max_attempts or 2 * len(self.routes)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+    async def _pick(self) -> Route:
+        while True:
+            now = time.monotonic()
+            available = [
+                route for route in self.routes if route.state.cooldown_until <= now
+            ]
+            if available:
+                random.shuffle(available)
+                route = min(
+                    available,
+                    key=lambda route: route.state.outstanding / route.deployment.weight,
+                )
+                with route.state.lock:
+                    route.state.outstanding += 1
+                return route
+            # All deployments are cooling down; wait for the first to come back
+            await asyncio.sleep(
+                min(route.state.cooldown_until for route in self.routes) - now
+            )
+
+    def _done(self, route: Route, error: Exception | None = None) -> None:
+        state = route.state
+        with state.lock:
+            state.outstanding -= 1
+            if error is None:
+                state.failures = 0
+                return
+            state.failures += 1
+            delay = retry_after(error)
+            if delay is None:
+                delay = min(
+                    self.max_cooldown, self.cooldown * 2 ** (state.failures - 1)
+                )
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + delay)
+        print(
+            f"Deployment {route.deployment.azure_deployment} at "
+            f"{route.deployment.azure_endpoint} failed, failing over: {error}"
+        )
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        for attempt in range(self.max_attempts):
+            route = await self._pick()
+            try:
+                result = await route.client.create(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                )
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    with route.state.lock:
+                        route.state.outstanding -= 1
+                    raise
+                self._done(route, e)
+                continue
+            except BaseException:
+                with route.state.lock:
+                    route.state.outstanding -= 1
+                raise
+            self._done(route)
+            return result
+        raise AssertionError("unreachable")
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        # Fails over only until the first chunk; a stream cut short afterwards is raised
+        for attempt in range(self.max_attempts):
+            route = await self._pick()
+            started = False
+            try:
+                async for chunk in route.client.create_stream(
+                    messages,
+                    tools=tools,
+                    json_output=json_output,
+                    extra_create_args=extra_create_args,
+                    cancellation_token=cancellation_token,
+                ):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not is_retryable(e) or attempt == self.max_attempts - 1:
+                    with route.state.lock:
+                        route.state.outstanding -= 1
+                    raise
+                self._done(route, e)
+                continue
+            except BaseException:
+                with route.state.lock:
+                    route.state.outstanding -= 1
+                raise
+            self._done(route)
+            return
+
+    def actual_usage(self) -> RequestUsage:
+        usages = [route.client.actual_usage() for route in self.routes]
+        return RequestUsage(
+            prompt_tokens=sum(usage.prompt_tokens for usage in usages),
+            completion_tokens=sum(usage.completion_tokens for usage in usages),
+        )
+
+    def total_usage(self) -> RequestUsage:
+        usages = [route.client.total_usage() for route in self.routes]
+        return RequestUsage(
+            prompt_tokens=sum(usage.prompt_tokens for usage in usages),
+            completion_tokens=sum(usage.completion_tokens for usage in usages),
+        )
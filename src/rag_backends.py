@@ -0,0 +1,279 @@
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Protocol
+
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.credentials_async import AsyncTokenCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+from azure.search.documents.models import VectorizableTextQuery
+
+from local_vector_index import LocalVectorIndex
+from rag_embeddings import Embedder, create_embedder
+from token_cache import get_shared_credential
+
+
+@dataclass
+class RAGSearchOptions:
+    """
+    Retrieval settings of a `MagenticOneRAGAgent`.
+
+    Attributes:
+        k (int): The number of nearest neighbors the vector query returns.
+        top (int): The number of results the search returns.
+        exhaustive (bool): Whether to brute-force scan all vectors instead of using the HNSW index.
+        vector_field (str): The field holding the chunk embeddings.
+        select_fields (list[str]): The fields returned per result; must include `chunk`.
+        max_chars (int): The character budget of the answer; results beyond it are not read.
+    """
+
+    k: int = 3
+    top: int = 3
+    exhaustive: bool = False
+    vector_field: str = "text_vector"
+    select_fields: list[str] = field(
+        default_factory=lambda: ["parent_id", "chunk_id", "chunk"]
+    )
+    max_chars: int = 8000
+
+    def __post_init__(self) -> None:
+        # The answer is assembled from the chunks, so a search without them would fail on its
+        # first result rather than here
+        if "chunk" not in self.select_fields:
+            raise ValueError(
+                f"The RAG select_fields {self.select_fields} must include the 'chunk' field."
+            )
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RAGSearchOptions":
+        """
+        Reads the options present in an agent configuration dictionary.
+
+        Args:
+            config (dict): The agent configuration, e.g. `{"type": "RAG", "k": 5, ...}`.
+
+        Returns:
+            RAGSearchOptions: The options, with defaults for the missing keys.
+
+        Raises:
+            ValueError: Raises a ValueError if `select_fields` does not include `chunk`.
+        """
+        return cls(
+            **{
+                name: config[name]
+                for name in cls.__dataclass_fields__
+                if config.get(name) is not None
+            }
+        )
+
+    @property
+    def cache_variant(self) -> str:
+        return f"top={self.top};exhaustive={self.exhaustive};max_chars={self.max_chars}"
+
+
+class SearchBackend(Protocol):
+    """Where a `MagenticOneRAGAgent` retrieves its chunks from."""
+
+    source: str
+    """Identifies the search service or index files, so the search cache keeps indexes of the same name apart."""
+
+    def search(
+        self, query: str, options: RAGSearchOptions, hybrid: bool = False
+    ) -> AsyncIterator[dict]:
+        """
+        Searches the index, yielding results best first with at least the `options.select_fields`.
+        Consumers may stop iterating early, which must not fetch further results.
+        """
+        ...
+
+    def refresh(self) -> bool:
+        """Picks up changes of the index made elsewhere, returning whether there were any, so results cached before are dropped."""
+        ...
+
+    async def close(self) -> None: ...
+
+
+class AzureSearchBackend:
+    """Searches an Azure AI Search index through a long-lived, pooled `SearchClient`."""
+
+    def __init__(
+        self,
+        index_name: str,
+        search_endpoint: str,
+        search_key: str | None = None,
+        max_connections: int = 10,
+        search_client: SearchClient | None = None,
+    ) -> None:
+        """
+        Args:
+            index_name (str): The search index.
+            search_endpoint (str): The Azure AI Search service endpoint.
+            search_key (str, optional): The admin key for the Azure AI Search service. Defaults to None.
+            max_connections (int, optional): The connection pool size. Defaults to 10.
+            search_client (SearchClient, optional): A client to use as is (e.g. an in-memory fake),
+                owned by the caller. Defaults to None.
+        """
+        self.index_name = index_name
+        self.search_endpoint = search_endpoint
+        self.search_key = search_key
+        self.max_connections = max_connections
+        self.source = f"azure:{search_endpoint}"
+
+        self._owns_search_client = search_client is None
+        self._search_client: SearchClient | None = search_client
+        self._search_client_loop: asyncio.AbstractEventLoop | None = None
+
+    def config_search(self, transport: AioHttpTransport | None = None) -> SearchClient:
+        azure_credential = get_shared_credential(os.getenv("AZURE_TENANT_ID"))
+        search_credential: AzureKeyCredential | AsyncTokenCredential = (
+            azure_credential
+            if self.search_key is None
+            else AzureKeyCredential(self.search_key)
+        )
+        return SearchClient(
+            endpoint=self.search_endpoint,
+            index_name=self.index_name,
+            credential=search_credential,
+            transport=transport,
+        )
+
+    async def get_search_client(self) -> SearchClient:
+        """
+        Returns the long-lived `SearchClient`, creating it on first use.
+
+        The client keeps a pooled keep-alive connection to the search service, so repeated tool
+        calls skip the TCP and TLS handshakes. It is bound to the event loop it was created on.
+
+        Returns:
+            SearchClient: The search client.
+        """
+        if not self._owns_search_client:
+            return self._search_client
+
+        loop = asyncio.get_running_loop()
+        if self._search_client is not None and self._search_client_loop is not loop:
+            # The previous loop is gone together with its connections
+            self._search_client = None
+
+        if self._search_client is None:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+            )
+            self._search_client = self.config_search(
+                transport=AioHttpTransport(session=session, session_owner=True)
+            )
+            self._search_client_loop = loop
+        return self._search_client
+
+    async def search(
+        self, query: str, options: RAGSearchOptions, hybrid: bool = False
+    ) -> AsyncIterator[dict]:
+        search_client = await self.get_search_client()
+        vector_query = VectorizableTextQuery(
+            text=query,
+            k_nearest_neighbors=options.k,
+            fields=options.vector_field,
+            exhaustive=options.exhaustive,
+        )
+        results = await search_client.search(
+            search_text=query if hybrid else None,
+            vector_queries=[vector_query],
+            select=options.select_fields,
+            top=options.top,
+        )
+        async for result in results:
+            yield result
+
+    def refresh(self) -> bool:
+        # The service's index changes without notice; cached results expire with their TTL
+        return False
+
+    async def close(self) -> None:
+        """Closes the search client and its connection pool."""
+        if self._owns_search_client and self._search_client is not None:
+            search_client, self._search_client = self._search_client, None
+            self._search_client_loop = None
+            await search_client.close()
+
+
+class LocalSearchBackend:
+    """
+    Searches a `LocalVectorIndex` in-process, without a network hop.
+
+    Every search is an exact, vectorized scan of the memory-mapped embeddings, so `options.exhaustive`
+    has no effect. A hybrid search re-ranks the vector candidates by their keyword overlap with the query.
+    """
+
+    # Above this many matrix cells, the scan runs in a worker thread to keep the event loop responsive
+    THREAD_THRESHOLD = 4_000_000
+
+    def __init__(
+        self, index: LocalVectorIndex | str | Path, embedder: Embedder | None = None
+    ) -> None:
+        """
+        Args:
+            index (LocalVectorIndex | str | Path): The index, or its directory.
+            embedder (Embedder, optional): Embeds the queries. Defaults to the embedder recorded in the index.
+        """
+        self.index = (
+            index if isinstance(index, LocalVectorIndex) else LocalVectorIndex(index)
+        )
+        self.embedder = embedder or create_embedder(self.index.embedder)
+        self.source = f"local:{self.index.path.resolve()}"
+        if self.embedder.name != self.index.embedder:
+            raise ValueError(
+                f"The index was built with {self.index.embedder}, not {self.embedder.name}."
+            )
+
+    def refresh(self) -> bool:
+        """Reopens the index if it was changed on disk, e.g. by `rag_ingest`, returning whether it was."""
+        if not self.index.is_stale():
+            return False
+        self.index = LocalVectorIndex(self.index.path)
+        return True
+
+    @staticmethod
+    def _rank(
+        index: LocalVectorIndex,
+        query: str,
+        query_vector,
+        options: RAGSearchOptions,
+        hybrid: bool,
+    ) -> list[dict]:
+        if not hybrid:
+            # As a vector query of Azure AI Search: the `k` nearest neighbors, of which `top` are returned
+            rows = index.search(query_vector, min(options.k, options.top))
+            return index.get([row for row, _ in rows])
+
+        candidates = index.search(query_vector, max(options.k, options.top) * 4)
+        documents = index.get([row for row, _ in candidates])
+        terms = set(re.findall(r"\w+", query.lower()))
+        scored = []
+        for (_, score), document in zip(candidates, documents):
+            words = set(re.findall(r"\w+", document["chunk"].lower()))
+            overlap = len(terms & words) / len(terms) if terms else 0.0
+            scored.append((score + 0.5 * overlap, document))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [document for _, document in scored[: options.top]]
+
+    async def search(
+        self, query: str, options: RAGSearchOptions, hybrid: bool = False
+    ) -> AsyncIterator[dict]:
+        query_vector = (await self.embedder.embed([query]))[0]
+        # A refresh replaces `self.index`; the search sticks to the index it started with
+        index = self.index
+        if len(index) * index.dimensions > self.THREAD_THRESHOLD:
+            documents = await asyncio.to_thread(
+                self._rank, index, query, query_vector, options, hybrid
+            )
+        else:
+            documents = self._rank(index, query, query_vector, options, hybrid)
+        for document in documents:
+            yield document
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+from typing import Protocol, Sequence
+
+import numpy as np
+from openai import AsyncAzureOpenAI
+
+from token_cache import get_shared_credential
+
+
+class Embedder(Protocol):
+    """Turns texts into embedding vectors."""
+
+    name: str
+    """Identifies the embedding space; indexes record it so queries are embedded the same way."""
+
+    dimensions: int
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Returns a `(len(texts), dimensions)` float32 matrix of L2-normalized embeddings."""
+        ...
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalizes each row, leaving all-zero rows untouched.
+
+    Args:
+        vectors (np.ndarray): The vectors, one per row.
+
+    Returns:
+        np.ndarray: The normalized float32 vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """
+    A deterministic, dependency-free embedder based on signed feature hashing of word unigrams and bigrams.
+
+    It captures lexical overlap only, which is enough for offline runs and tests.
+    """
+
+    def __init__(self, dimensions: int = 1024) -> None:
+        self.dimensions = dimensions
+        self.name = f"hashing:{dimensions}"
+
+    def _features(self, text: str) -> list[str]:
+        words = re.findall(r"\w+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value >> 63 else -1.0
+                vectors[row, value % self.dimensions] += sign
+        return normalize_rows(vectors)
+
+
+class AzureOpenAIEmbedder:
+    """Embeds texts with an Azure OpenAI embedding deployment, e.g. `text-embedding-3-small`."""
+
+    def __init__(
+        self,
+        azure_deployment: str,
+        dimensions: int,
+        azure_endpoint: str | None = None,
+        api_version: str | None = None,
+        api_key: str | None = None,
+    ) -> None:
+        """
+        Args:
+            azure_deployment (str): The embedding deployment name.
+            dimensions (int): The embedding dimensions to request.
+            azure_endpoint (str, optional): The Azure OpenAI endpoint. Defaults to `AZURE_OPENAI_ENDPOINT`.
+            api_version (str, optional): The API version. Defaults to `AZURE_OPENAI_API_VERSION`.
+            api_key (str, optional): The Azure OpenAI API key. Defaults to `AZURE_OPENAI_API_KEY`,
+                or the shared Azure AD credential if that is not set either.
+        """
+        self.azure_deployment = azure_deployment
+        self.dimensions = dimensions
+        self.name = f"azure_openai:{azure_deployment}:{dimensions}"
+
+        api_key = api_key or os.getenv("AZURE_OPENAI_API_KEY")
+        self._client = AsyncAzureOpenAI(
+            azure_endpoint=azure_endpoint or os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_version=api_version or os.getenv("AZURE_OPENAI_API_VERSION"),
+            api_key=api_key,
+            azure_ad_token_provider=(
+                None
+                if api_key
+                else get_shared_credential(
+                    os.getenv("AZURE_TENANT_ID")
+                ).bearer_token_provider("https://cognitiveservices.azure.com/.default")
+            ),
+        )
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        response = await self._client.embeddings.create(
+            model=self.azure_deployment, input=list(texts), dimensions=self.dimensions
+        )
+        return normalize_rows([item.embedding for item in response.data])
+
+
+def create_embedder(name: str) -> Embedder:
+    """
+    Creates the embedder recorded in an index, e.g. `hashing:1024` or `azure_openai:<deployment>:<dimensions>`.
+
+    Args:
+        name (str): The embedder name.
+
+    Raises:
+        ValueError: Raises a ValueError if the embedder is unknown.
+
+    Returns:
+        Embedder: The embedder.
+    """
+    kind, _, argument = name.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(argument or 1024))
+    if kind == "azure_openai":
+        deployment, _, dimensions = argument.rpartition(":")
+        return AzureOpenAIEmbedder(deployment, int(dimensions))
+    raise ValueError(f"Unknown embedder: {name}")
@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+
+from local_vector_index import LocalVectorIndex
+from rag_embeddings import Embedder, create_embedder
+
+TEXT_SUFFIXES = {".txt", ".md", ".rst", ".csv", ".json", ".html", ".htm", ".xml"}
+# Converted to text with `markitdown`
+CONVERTED_SUFFIXES = {".pdf", ".docx", ".pptx", ".xlsx"}
+
+MANIFEST_FILE = "sources.json"
+
+
+@dataclass
+class IngestionStats:
+    files_seen: int = 0
+    files_unchanged: int = 0
+    files_indexed: int = 0
+    files_removed: int = 0
+    chunks_embedded: int = 0
+    rows_compacted: int = 0
+
+
+def iter_files(paths: Iterable[str | Path]) -> Iterator[Path]:
+    """
+    Yields the supported files among `paths`, walking directories recursively in a stable order.
+
+    Args:
+        paths (Iterable[str | Path]): Files and directories.
+    """
+    for path in map(Path, paths):
+        candidates = sorted(path.rglob("*")) if path.is_dir() else [path]
+        for candidate in candidates:
+            suffix = candidate.suffix.lower()
+            if candidate.is_file() and suffix in TEXT_SUFFIXES | CONVERTED_SUFFIXES:
+                yield candidate
+
+
+def read_text(path: Path) -> str:
+    if path.suffix.lower() in CONVERTED_SUFFIXES:
+        from markitdown import MarkItDown
+
+        return MarkItDown().convert(str(path)).text_content
+    return path.read_text(encoding="utf-8", errors="replace")
+
+
+def chunk_text(text: str, chunk_size: int = 2000, overlap: int = 200) -> Iterator[str]:
+    """
+    Splits text into overlapping chunks, preferring to break at paragraphs, then at whitespace.
+
+    Args:
+        text (str): The text.
+        chunk_size (int, optional): The maximum characters per chunk. Defaults to 2000.
+        overlap (int, optional): The characters shared by consecutive chunks. Defaults to 200.
+    """
+    text = text.strip()
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            split = text.rfind("\n\n", start + chunk_size // 2, end)
+            if split == -1:
+                split = text.rfind(" ", start + chunk_size // 2, end)
+            if split != -1:
+                end = split
+        chunk = text[start:end].strip()
+        if chunk:
+            yield chunk
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _Manifest:
+    """
+    The content hash and index rows of every ingested file, stored next to the index, and the index
+    generation the rows refer to.
+    """
+
+    def __init__(self, index_dir: Path) -> None:
+        self.path = index_dir / MANIFEST_FILE
+        data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        if "sources" not in data:
+            # Written before the index could be compacted
+            data = {"generation": 0, "sources": data}
+        self.generation: int = data["generation"]
+        self.sources: dict[str, dict] = data["sources"]
+
+    def rows(self, parent_id: str) -> range:
+        start, stop = self.sources.get(parent_id, {}).get("rows", (0, 0))
+        return range(start, stop)
+
+    def renumber(self, renumbering: np.ndarray, generation: int) -> None:
+        # The rows of an ingested file are contiguous and never deleted, so they stay contiguous
+        for source in self.sources.values():
+            start, stop = source["rows"]
+            if stop > start:
+                source["rows"] = [
+                    int(renumbering[start]),
+                    int(renumbering[stop - 1]) + 1,
+                ]
+        self.generation = generation
+
+    def save(self) -> None:
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps(
+                {"generation": self.generation, "sources": self.sources}, indent=1
+            )
+        )
+        os.replace(temp_path, self.path)
+
+
+async def ingest(
+    index_dir: str | Path,
+    paths: Sequence[str | Path],
+    embedder: Embedder,
+    batch_size: int = 64,
+    chunk_size: int = 2000,
+    overlap: int = 200,
+    max_in_flight: int = 2,
+    prune: bool = False,
+    compact_threshold: float = 0.25,
+) -> IngestionStats:
+    """
+    Ingests files into a local vector index, re-embedding only files whose content hash changed.
+
+    New chunks are appended to the index; the rows of a file's previous version are marked deleted
+    once its new version is fully appended. Chunks stream through the pipeline file by file and are
+    embedded in batches, with up to `max_in_flight` batches being embedded at once. Once deleted rows
+    make up `compact_threshold` of the index, it is compacted.
+
+    Args:
+        index_dir (str | Path): The index directory, created if missing.
+        paths (Sequence[str | Path]): The files and directories to ingest.
+        embedder (Embedder): Embeds the chunks; must match the embedder of an existing index.
+        batch_size (int, optional): The chunks per embedding request. Defaults to 64.
+        chunk_size (int, optional): The maximum characters per chunk. Defaults to 2000.
+        overlap (int, optional): The characters shared by consecutive chunks. Defaults to 200.
+        max_in_flight (int, optional): The maximum concurrent embedding requests. Defaults to 2.
+        prune (bool, optional): Whether to remove previously ingested files that are no longer found. Defaults to False.
+        compact_threshold (float, optional): The share of deleted rows that triggers a compaction; above 1 never. Defaults to 0.25.
+
+    Raises:
+        ValueError: Raises a ValueError if the index was built with a different embedder, or was compacted
+            more than once since the manifest was saved.
+
+    Returns:
+        IngestionStats: What was ingested.
+    """
+    index_dir = Path(index_dir)
+    index = (
+        LocalVectorIndex(index_dir)
+        if LocalVectorIndex.exists(index_dir)
+        else LocalVectorIndex.create(index_dir, embedder.dimensions, embedder.name)
+    )
+    if index.embedder != embedder.name:
+        raise ValueError(
+            f"The index was built with {index.embedder}, not {embedder.name}."
+        )
+    manifest = _Manifest(index_dir)
+    if manifest.generation != index.generation:
+        # A run was interrupted after compacting the index, before saving the renumbered manifest
+        if manifest.generation != index.generation - 1:
+            raise ValueError(
+                f"The manifest refers to generation {manifest.generation} of the index, "
+                f"which is at generation {index.generation}; rebuild the index."
+            )
+        manifest.renumber(index.last_compaction(), index.generation)
+        manifest.save()
+    stats = IngestionStats()
+
+    # Rows of an interrupted previous run that never made it into the manifest
+    referenced = set(
+        itertools.chain.from_iterable(map(manifest.rows, manifest.sources))
+    )
+    orphans = set(range(len(index))) - referenced - index.deleted
+    if orphans:
+        index.delete(orphans)
+
+    seen: set[str] = set()
+    changed: list[tuple[str, Path, str]] = []
+    for path in iter_files(paths):
+        parent_id = path.as_posix()
+        seen.add(parent_id)
+        stats.files_seen += 1
+        digest = file_digest(path)
+        if manifest.sources.get(parent_id, {}).get("sha256") == digest:
+            stats.files_unchanged += 1
+        else:
+            changed.append((parent_id, path, digest))
+
+    def stream() -> Iterator[tuple[str, str, dict | None]]:
+        # Yields each chunk of the changed files, then `None` once a file is complete
+        for parent_id, path, digest in changed:
+            for number, chunk in enumerate(
+                chunk_text(read_text(path), chunk_size, overlap)
+            ):
+                yield parent_id, digest, {
+                    "parent_id": parent_id,
+                    "chunk_id": f"{digest[:16]}_{number}",
+                    "chunk": chunk,
+                }
+            yield parent_id, digest, None
+
+    appended: dict[str, list[int]] = {}
+    pending: deque[tuple[list[dict], asyncio.Future, list[tuple[str, str]]]] = deque()
+
+    def embed(chunks: list[dict]) -> asyncio.Future:
+        if not chunks:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(np.zeros((0, embedder.dimensions), dtype=np.float32))
+            return future
+        return asyncio.ensure_future(embedder.embed([c["chunk"] for c in chunks]))
+
+    async def drain(limit: int) -> None:
+        # Appends embedded batches in order, then records the files they completed
+        while len(pending) > limit:
+            chunks, vectors, completed = pending.popleft()
+            rows = index.append(chunks, await vectors)
+            stats.chunks_embedded += len(chunks)
+            for chunk, row in zip(chunks, rows):
+                appended.setdefault(chunk["parent_id"], []).append(row)
+
+            for parent_id, digest in completed:
+                previous = manifest.rows(parent_id)
+                if previous:
+                    index.delete(previous)
+                rows = appended.pop(parent_id, [])
+                manifest.sources[parent_id] = {
+                    "sha256": digest,
+                    "rows": [rows[0], rows[-1] + 1] if rows else [0, 0],
+                }
+                stats.files_indexed += 1
+            manifest.save()
+
+    batch: list[dict] = []
+    completed: list[tuple[str, str]] = []
+    for parent_id, digest, chunk in stream():
+        if chunk is None:
+            completed.append((parent_id, digest))
+            continue
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            pending.append((batch, embed(batch), completed))
+            batch, completed = [], []
+            await drain(max_in_flight - 1)
+
+    if batch or completed:
+        pending.append((batch, embed(batch), completed))
+    await drain(0)
+
+    if prune:
+        for parent_id in set(manifest.sources) - seen:
+            index.delete(manifest.rows(parent_id))
+            del manifest.sources[parent_id]
+            stats.files_removed += 1
+        manifest.save()
+
+    if index.deleted and len(index.deleted) >= compact_threshold * len(index):
+        stats.rows_compacted = len(index.deleted)
+        manifest.renumber(index.compact(), index.generation)
+        manifest.save()
+
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Incrementally ingest documents into a local vector index for RAG agents.",
+        epilog="Example: python rag_ingest.py --index-dir ./indexes/kb ./docs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("paths", nargs="+", help="Files and directories to ingest")
+    parser.add_argument(
+        "--index-dir", required=True, help="The local vector index directory"
+    )
+    parser.add_argument(
+        "--embedder",
+        default="hashing:1024",
+        help="The embedder, e.g. 'hashing:1024' or 'azure_openai:<deployment>:<dimensions>'",
+    )
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    parser.add_argument(
+        "--prune",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Removes previously ingested files that are no longer found",
+    )
+    parser.add_argument(
+        "--compact-threshold",
+        type=float,
+        default=0.25,
+        help="Compacts the index once this share of its rows is deleted; 0 always, above 1 never",
+    )
+
+    args = parser.parse_args()
+
+    print(
+        asyncio.run(
+            ingest(
+                args.index_dir,
+                args.paths,
+                create_embedder(args.embedder),
+                batch_size=args.batch_size,
+                chunk_size=args.chunk_size,
+                overlap=args.overlap,
+                max_in_flight=args.max_in_flight,
+                prune=args.prune,
+                compact_threshold=args.compact_threshold,
+            )
+        )
+    )
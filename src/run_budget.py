@@ -0,0 +1,253 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Callable, Mapping, Optional, Sequence, Union
+
+from autogen_agentchat.base import TerminationCondition
+from autogen_agentchat.conditions import ExternalTermination, TimeoutTermination
+from autogen_agentchat.teams import BaseGroupChat
+from autogen_core import CancellationToken
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    RequestUsage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from client_wrappers import DelegatingChatCompletionClient
+
+
+@dataclass
+class RunBudget:
+    """The wall-clock, per-turn and token/cost limits of one team run. `None` disables a limit."""
+
+    max_time: float | None = 25 * 60
+    """Seconds the run may take; the team stops at the next turn after it, and is cancelled `grace` seconds later."""
+    max_turn_time: float | None = 5 * 60
+    """Seconds a single agent turn may take before the run is cancelled."""
+    max_tokens: int | None = None
+    """Prompt and completion tokens the run may use, including the orchestrator's."""
+    max_cost: float | None = None
+    """The cost the run may incur at `prompt_price` and `completion_price`."""
+    prompt_price: float = 0.0
+    """The price of 1,000 prompt tokens."""
+    completion_price: float = 0.0
+    """The price of 1,000 completion tokens."""
+    grace: float = 30
+    """Seconds a stopped run may take to finish its current turn before it is cancelled."""
+
+    def cost(self, usage: RequestUsage) -> float:
+        return (
+            usage.prompt_tokens * self.prompt_price
+            + usage.completion_tokens * self.completion_price
+        ) / 1000
+
+
+class UsageMeter(DelegatingChatCompletionClient):
+    """
+    Wraps a (shared) model client to count the tokens of one run, and notifies `on_usage` after
+    every call so budgets are enforced as soon as they are spent, not only between turns.
+
+    The other clients of the run, e.g. of agents using another model, are metered by `share`.
+    """
+
+    def __init__(
+        self, client: ChatCompletionClient, parent: "UsageMeter | None" = None
+    ) -> None:
+        super().__init__(client)
+        self.parent = parent
+        self.usage = RequestUsage(prompt_tokens=0, completion_tokens=0)
+        self.on_usage: Callable[[RequestUsage], None] | None = None
+
+    def share(self, client: ChatCompletionClient) -> "UsageMeter":
+        """Returns a meter of `client` whose tokens also count towards this meter's."""
+        return UsageMeter(client, parent=self)
+
+    def _record(self, usage: RequestUsage) -> None:
+        self.usage = RequestUsage(
+            prompt_tokens=self.usage.prompt_tokens + usage.prompt_tokens,
+            completion_tokens=self.usage.completion_tokens + usage.completion_tokens,
+        )
+        if self.parent is not None:
+            self.parent._record(usage)
+        if self.on_usage is not None:
+            self.on_usage(self.usage)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        result = await self.client.create(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+        self._record(result.usage)
+        return result
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        async for chunk in self.client.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                self._record(chunk.usage)
+            yield chunk
+
+    def actual_usage(self) -> RequestUsage:
+        return self.usage
+
+    def total_usage(self) -> RequestUsage:
+        return self.usage
+
+
+class RunGuard:
+    """
+    Enforces a `RunBudget` on a team run.
+
+    A run that runs out of time or tokens is first stopped gracefully: its termination condition fires
+    at the next turn, so the team ends with its regular `TaskResult`. A run that stays stuck in one turn,
+    or is cancelled, is cancelled cooperatively: the cancellation token of `run_stream` is cancelled and
+    the model calls and code executions in flight in the team's runtime are cancelled with it.
+    """
+
+    def __init__(self, budget: RunBudget, meter: UsageMeter | None = None) -> None:
+        """
+        Args:
+            budget (RunBudget): The limits.
+            meter (UsageMeter, optional): Counts the run's tokens. Defaults to None (no token or cost limit).
+        """
+        self.budget = budget
+        self.meter = meter
+        self.cancellation_token = CancellationToken()
+        self.external_termination = ExternalTermination()
+        self.reason: str | None = None
+        self.cancelled = False
+
+        self._team: BaseGroupChat | None = None
+        self._turn_started = time.monotonic()
+        self._tasks: set[asyncio.Task] = set()
+
+    def termination_condition(self) -> TerminationCondition:
+        """The condition to pass to the team."""
+        if self.budget.max_time is None:
+            return self.external_termination
+        return self.external_termination | TimeoutTermination(self.budget.max_time)
+
+    def _on_usage(self, usage: RequestUsage) -> None:
+        budget = self.budget
+        total_tokens = usage.prompt_tokens + usage.completion_tokens
+        if budget.max_tokens is not None and total_tokens >= budget.max_tokens:
+            self.stop(f"Token budget of {budget.max_tokens} tokens reached.")
+        elif budget.max_cost is not None and budget.cost(usage) >= budget.max_cost:
+            self.stop(f"Cost budget of {budget.max_cost} reached.")
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stop(self, reason: str) -> None:
+        """Stops the run at the next turn, and cancels it if it is still running after `grace` seconds."""
+        if self.reason is not None:
+            return
+        self.reason = reason
+        self.external_termination.set()
+        self._spawn(self._cancel_after(self.budget.grace, reason))
+
+    def cancel(self, reason: str = "Cancelled.") -> None:
+        """Cancels the run now, including the model calls and code executions in flight."""
+        if self.cancelled:
+            return
+        self.reason = self.reason or reason
+        self.cancelled = True
+        self.external_termination.set()
+        self.cancellation_token.cancel()
+        if self._team is not None:
+            self._spawn(self._cancel_in_flight(self._team))
+
+    async def _cancel_after(self, delay: float, reason: str) -> None:
+        await asyncio.sleep(delay)
+        self.cancel(reason)
+
+    @staticmethod
+    async def _cancel_in_flight(team: BaseGroupChat) -> None:
+        # The agents' handlers run as tasks of the team's runtime and do not see the token of
+        # `run_stream`; cancelling them lets the runtime become idle so `run_stream` can return.
+        # The team's `_runtime` and its `_background_tasks` are private to autogen-core 0.4.1, as
+        # pinned in pyproject.toml. Should they change, the run is cancelled through its
+        # cancellation token alone, which `cancel` has cancelled already
+        runtime = getattr(team, "_runtime", None)
+        background_tasks = getattr(runtime, "_background_tasks", None)
+        if background_tasks is None:
+            return
+        for _ in range(10):
+            tasks = [task for task in background_tasks if not task.done()]
+            if not tasks:
+                return
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _watch(self) -> None:
+        budget = self.budget
+        deadline = (
+            None if budget.max_time is None else time.monotonic() + budget.max_time
+        )
+        while not self.cancelled:
+            now = time.monotonic()
+            wakeups = []
+            if deadline is not None and self.reason is None:
+                if now >= deadline:
+                    self.stop(f"Time budget of {budget.max_time} seconds reached.")
+                    continue
+                wakeups.append(deadline)
+            if budget.max_turn_time is not None:
+                turn_deadline = self._turn_started + budget.max_turn_time
+                if now >= turn_deadline:
+                    self.cancel(
+                        f"An agent turn took longer than {budget.max_turn_time} seconds."
+                    )
+                    return
+                wakeups.append(turn_deadline)
+            if not wakeups:
+                return
+            await asyncio.sleep(min(wakeups) - now)
+
+    def turn(self) -> None:
+        """Marks the start of the next turn, restarting the per-turn deadline."""
+        self._turn_started = time.monotonic()
+
+    def start(self, team: BaseGroupChat) -> None:
+        """Starts enforcing the budget on a team that is about to run."""
+        self._team = team
+        self._turn_started = time.monotonic()
+        if self.meter is not None:
+            self.meter.on_usage = self._on_usage
+        self._spawn(self._watch())
+
+    async def close(self) -> None:
+        if self.meter is not None:
+            self.meter.on_usage = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,373 @@
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from autogen_core import CancellationToken
+
+RunFactory = Callable[[CancellationToken], AsyncIterator[Any]]
+"""Starts a run given its cancellation token, e.g. `lambda token: helper.main(task, token)`."""
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+FINISHED = (COMPLETED, CANCELLED, FAILED)
+
+
+@dataclass
+class RunEvent:
+    """An event of a run, numbered from 0 in the order it was produced."""
+
+    seq: int
+    message: Any
+    timestamp: float = field(default_factory=time.time)
+
+
+@dataclass
+class RunSnapshot:
+    """What `RunManager.poll` returns: the new events of a run and its state."""
+
+    run_id: str
+    status: str
+    events: list[RunEvent]
+    missed: int
+    """The events after the requested sequence number that were already dropped from the buffer."""
+    error: str | None = None
+
+
+class Run:
+    """A task submitted to a `RunManager`, with a bounded buffer of its most recent events."""
+
+    def __init__(self, run_id: str, task: str | None, max_events: int) -> None:
+        self.run_id = run_id
+        self.task = task
+        self.status = PENDING
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.cancellation_token = CancellationToken()
+
+        self.events: deque[RunEvent] = deque(maxlen=max_events)
+        self.next_seq = 0
+        self.last_seen = time.monotonic()
+
+        self._changed = threading.Condition()
+        self._waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def _notify(self) -> None:
+        # Called with `_changed` held
+        self._changed.notify_all()
+        waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(
+                    lambda f=future: f.done() or f.set_result(None)
+                )
+
+    def _append(self, message: Any) -> None:
+        with self._changed:
+            self.events.append(RunEvent(self.next_seq, message))
+            self.next_seq += 1
+            self._notify()
+
+    def _set_status(self, status: str, error: str | None = None) -> None:
+        with self._changed:
+            self.status = status
+            self.error = error
+            if status == RUNNING:
+                self.started_at = time.time()
+            if status in FINISHED:
+                self.finished_at = time.time()
+            self._notify()
+
+    def _snapshot(self, after: int) -> RunSnapshot:
+        # Called with `_changed` held
+        first = self.events[0].seq if self.events else self.next_seq
+        return RunSnapshot(
+            run_id=self.run_id,
+            status=self.status,
+            events=[event for event in self.events if event.seq > after],
+            missed=max(0, first - after - 1),
+            error=self.error,
+        )
+
+
+class RunManager:
+    """
+    Runs tasks on a long-lived event loop in a background thread, independently of the callers.
+
+    `submit` returns a run ID right away. The caller, or any other one, follows the run with `poll`
+    (blocking, from any thread) or `subscribe` (from any event loop), and may `cancel` it. Each run
+    keeps its last `max_events` events, so a caller that attaches late or falls behind gets the most
+    recent events and the number it missed. Runs nobody polled or subscribed to for `orphan_timeout`
+    seconds are cancelled.
+    """
+
+    def __init__(
+        self,
+        max_events: int = 1000,
+        max_finished: int = 100,
+        max_concurrent: int | None = None,
+        orphan_timeout: float | None = 300,
+    ) -> None:
+        """
+        Args:
+            max_events (int, optional): The events buffered per run. Defaults to 1000.
+            max_finished (int, optional): The finished runs kept for polling. Defaults to 100.
+            max_concurrent (int, optional): The runs executed at once, later ones wait. Defaults to None (no limit).
+            orphan_timeout (float, optional): Seconds without a poll or subscriber after which a run is
+                cancelled. Defaults to 300.
+        """
+        self.max_events = max_events
+        self.max_finished = max_finished
+        self.max_concurrent = max_concurrent
+        self.orphan_timeout = orphan_timeout
+
+        self._lock = threading.Lock()
+        self._runs: OrderedDict[str, Run] = OrderedDict()
+        self._tasks: dict[str, asyncio.Future] = {}
+        self._subscribers: dict[str, int] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._reaper: asyncio.Task | None = None
+        self._ids = itertools.count()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The event loop the runs execute on, started on first use."""
+        with self._lock:
+            if self._loop is None:
+                ready = threading.Event()
+
+                def serve() -> None:
+                    asyncio.set_event_loop(self._loop)
+                    self._loop.call_soon(ready.set)
+                    self._loop.run_forever()
+
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=serve, name="run-manager", daemon=True
+                )
+                self._thread.start()
+                ready.wait()
+                if self.max_concurrent is not None:
+                    self._semaphore = asyncio.Semaphore(self.max_concurrent)
+                if self.orphan_timeout is not None:
+                    self._loop.call_soon_threadsafe(self._start_reaper)
+            return self._loop
+
+    def submit(self, factory: RunFactory, task: str | None = None) -> str:
+        """
+        Starts a run.
+
+        Args:
+            factory (RunFactory): Produces the run's events given its cancellation token. It is called
+                on the manager's event loop, so loop-bound resources such as clients must be created inside.
+            task (str, optional): The task, for display. Defaults to None.
+
+        Returns:
+            str: The run ID.
+        """
+        loop = self.loop
+        run_id = f"{next(self._ids)}-{uuid.uuid4().hex[:12]}"
+        run = Run(run_id, task, self.max_events)
+        with self._lock:
+            self._runs[run_id] = run
+        self._tasks[run_id] = asyncio.run_coroutine_threadsafe(
+            self._execute(run, factory), loop
+        )
+        return run_id
+
+    async def _execute(self, run: Run, factory: RunFactory) -> None:
+        try:
+            if self._semaphore is not None:
+                async with self._semaphore:
+                    await self._consume(run, factory)
+            else:
+                await self._consume(run, factory)
+        finally:
+            self._tasks.pop(run.run_id, None)
+            self._evict_finished()
+
+    async def _consume(self, run: Run, factory: RunFactory) -> None:
+        if run.cancellation_token.is_cancelled():
+            run._set_status(CANCELLED)
+            return
+        run._set_status(RUNNING)
+        try:
+            async for message in factory(run.cancellation_token):
+                run._append(message)
+        except asyncio.CancelledError:
+            run._set_status(CANCELLED)
+        except Exception as e:
+            run._set_status(FAILED, f"{type(e).__name__}: {e}")
+        else:
+            run._set_status(
+                CANCELLED if run.cancellation_token.is_cancelled() else COMPLETED
+            )
+
+    def _evict_finished(self) -> None:
+        with self._lock:
+            finished = [run_id for run_id, run in self._runs.items() if run.finished]
+            for run_id in finished[: max(0, len(finished) - self.max_finished)]:
+                del self._runs[run_id]
+
+    def _start_reaper(self) -> None:
+        self._reaper = asyncio.ensure_future(self._reap())
+
+    async def _stop_reaper(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            await asyncio.gather(self._reaper, return_exceptions=True)
+            self._reaper = None
+
+    async def _reap(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.orphan_timeout, 30))
+            now = time.monotonic()
+            with self._lock:
+                runs = list(self._runs.values())
+            for run in runs:
+                if (
+                    not run.finished
+                    and not self._subscribers.get(run.run_id)
+                    and now - run.last_seen > self.orphan_timeout
+                ):
+                    print(f"Cancelling run {run.run_id}, nobody followed it.")
+                    run.cancellation_token.cancel()
+
+    def get(self, run_id: str) -> Run:
+        """
+        Returns a run.
+
+        Raises:
+            KeyError: Raises a KeyError if the run is unknown or was evicted.
+        """
+        with self._lock:
+            return self._runs[run_id]
+
+    def touch(self, run_id: str) -> Run:
+        """
+        Returns a run, and records that a client is following it, e.g. by polling its result, so it
+        is not cancelled as orphaned.
+
+        Raises:
+            KeyError: Raises a KeyError if the run is unknown or was evicted.
+        """
+        run = self.get(run_id)
+        run.last_seen = time.monotonic()
+        return run
+
+    def runs(self) -> list[Run]:
+        with self._lock:
+            return list(self._runs.values())
+
+    @property
+    def active(self) -> int:
+        """The number of pending and running runs."""
+        with self._lock:
+            return sum(not run.finished for run in self._runs.values())
+
+    def poll(self, run_id: str, after: int = -1, timeout: float = 0) -> RunSnapshot:
+        """
+        Returns the events of a run after the sequence number `after`, waiting up to `timeout` seconds
+        for one if there is none yet and the run is not finished.
+
+        Args:
+            run_id (str): The run ID.
+            after (int, optional): The sequence number of the last event seen. Defaults to -1 (all buffered events).
+            timeout (float, optional): Seconds to wait for a new event. Defaults to 0.
+
+        Returns:
+            RunSnapshot: The new events and the run's state.
+        """
+        run = self.touch(run_id)
+        with run._changed:
+            run._changed.wait_for(
+                lambda: run.next_seq - 1 > after or run.finished, timeout=timeout
+            )
+            return run._snapshot(after)
+
+    async def subscribe(self, run_id: str, after: int = -1) -> AsyncIterator[RunEvent]:
+        """
+        Yields the events of a run after the sequence number `after` as they are produced, until it finishes.
+        Events dropped from the buffer in between are skipped.
+
+        Args:
+            run_id (str): The run ID.
+            after (int, optional): The sequence number of the last event seen. Defaults to -1 (all buffered events).
+        """
+        run = self.get(run_id)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers[run_id] = self._subscribers.get(run_id, 0) + 1
+        future: asyncio.Future | None = None
+        try:
+            while True:
+                with run._changed:
+                    snapshot = run._snapshot(after)
+                    if not snapshot.events and not run.finished:
+                        future = loop.create_future()
+                        run._waiters.append((loop, future))
+                    else:
+                        future = None
+                for event in snapshot.events:
+                    yield event
+                    after = event.seq
+                if future is not None:
+                    await future
+                elif run.finished and not snapshot.events:
+                    return
+        finally:
+            # A subscriber that leaves while waiting, e.g. a disconnected client, drops its waiter
+            if future is not None:
+                with run._changed:
+                    if (loop, future) in run._waiters:
+                        run._waiters.remove((loop, future))
+            run.last_seen = time.monotonic()
+            with self._lock:
+                self._subscribers[run_id] -= 1
+                if not self._subscribers[run_id]:
+                    del self._subscribers[run_id]
+
+    def cancel(self, run_id: str) -> None:
+        """
+        Cancels a run; its events so far stay available.
+
+        Args:
+            run_id (str): The run ID.
+        """
+        run = self.get(run_id)
+        self.loop.call_soon_threadsafe(run.cancellation_token.cancel)
+
+    def close(self, timeout: float = 30) -> None:
+        """Cancels all runs, waits up to `timeout` seconds for them to finish and stops the event loop."""
+        with self._lock:
+            loop, runs = self._loop, list(self._runs.values())
+        if loop is None:
+            return
+        for run in runs:
+            loop.call_soon_threadsafe(run.cancellation_token.cancel)
+        deadline = time.monotonic() + timeout
+        for task in list(self._tasks.values()):
+            try:
+                task.result(max(0, deadline - time.monotonic()))
+            except Exception:
+                pass
+        asyncio.run_coroutine_threadsafe(self._stop_reaper(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+        with self._lock:
+            self._loop = self._thread = None
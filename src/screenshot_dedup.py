@@ -0,0 +1,217 @@
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Mapping, Optional, Sequence, Union
+
+import PIL.Image
+import PIL.ImageChops
+from autogen_core import CancellationToken, Image
+from autogen_core.models import (
+    ChatCompletionClient,
+    CreateResult,
+    LLMMessage,
+    UserMessage,
+)
+from autogen_core.tools import Tool, ToolSchema
+
+from client_wrappers import DelegatingChatCompletionClient
+
+UNCHANGED_SCREENSHOT = "(The screenshot is unchanged from the previous one.)"
+
+
+def dhash(image: PIL.Image.Image, size: int = 16) -> int:
+    """
+    Returns the difference hash of an image: one bit per pair of horizontally adjacent pixels of its
+    grayscale thumbnail, set where the left one is brighter. Similar images have hashes that differ
+    in few bits.
+
+    Args:
+        image (PIL.Image.Image): The image.
+        size (int, optional): The hash has `size * size` bits. Defaults to 16.
+
+    Returns:
+        int: The hash.
+    """
+    pixels = image.resize((size + 1, size), PIL.Image.Resampling.BILINEAR)
+    pixels = pixels.convert("L").tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            bits = bits << 1 | (left > pixels[row * (size + 1) + col + 1])
+    return bits
+
+
+class EncodedImage(Image):
+    """An `Image` that encodes itself once, however many requests it is sent in."""
+
+    def __init__(self, image: Image) -> None:
+        # `Image` would copy the picture to convert it, though it is RGB already
+        self.image = image.image
+        self._base64: str | None = None
+
+    def to_base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = super().to_base64()
+        return self._base64
+
+
+@dataclass
+class _Seen:
+    encoded: EncodedImage
+    hash: int
+    same_as: "weakref.WeakKeyDictionary[Image, bool]" = field(
+        default_factory=weakref.WeakKeyDictionary
+    )
+
+
+class ScreenshotDedupChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Drops the images of a request that show the same as the image before them, e.g. the WebSurfer's
+    screenshots of a viewport that did not change, which the orchestrator otherwise sends to the model
+    again with every request. They are replaced by `UNCHANGED_SCREENSHOT`.
+
+    Images whose `dhash` is within `max_distance` bits of the previous one's are compared pixel by
+    pixel: the hash of a thumbnail misses small changes, e.g. a typed word. They count as the same if
+    the pixels that differ fit in a box of at most `max_changed_area` of the image, such as a blinking
+    cursor. The images kept are sent as `EncodedImage`s, so an image is encoded once rather than with
+    every request it is part of. The hashing and comparing run in a worker thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        max_distance: int = 4,
+        max_changed_area: float = 0.0001,
+    ) -> None:
+        """
+        Args:
+            client (ChatCompletionClient): The client to wrap.
+            max_distance (int, optional): The bits the hashes of the same images may differ in.
+                Defaults to 4.
+            max_changed_area (float, optional): The fraction of the image the differences of the same
+                images may span. Defaults to 0.0001.
+        """
+        super().__init__(client)
+        self.max_distance = max_distance
+        self.max_changed_area = max_changed_area
+        self._seen: weakref.WeakKeyDictionary[Image, _Seen] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self.images = 0
+        self.deduplicated = 0
+
+    def _see(self, image: Image) -> _Seen:
+        with self._lock:
+            seen = self._seen.get(image)
+        if seen is None:
+            seen = _Seen(EncodedImage(image), dhash(image.image))
+            with self._lock:
+                seen = self._seen.setdefault(image, seen)
+        return seen
+
+    def _same(self, image: Image, seen: _Seen, previous: Image) -> bool:
+        same = seen.same_as.get(previous)
+        if same is None:
+            before = self._see(previous)
+            same = (seen.hash ^ before.hash).bit_count() <= self.max_distance
+            if same and image.image.size == previous.image.size:
+                box = PIL.ImageChops.difference(image.image, previous.image).getbbox()
+                if box is not None:
+                    width, height = image.image.size
+                    changed = (box[2] - box[0]) * (box[3] - box[1])
+                    same = changed <= self.max_changed_area * width * height
+            else:
+                same = False
+            seen.same_as[previous] = same
+        return same
+
+    def deduplicate(self, messages: Sequence[LLMMessage]) -> list[LLMMessage]:
+        """
+        Returns the messages with the images that repeat the previous one replaced, and the others
+        as `EncodedImage`s.
+
+        Args:
+            messages (Sequence[LLMMessage]): The messages of a request.
+
+        Returns:
+            list[LLMMessage]: The messages to send.
+        """
+        deduplicated = []
+        previous: Image | None = None
+        images = replaced = 0
+        for message in messages:
+            if not isinstance(message, UserMessage) or isinstance(message.content, str):
+                deduplicated.append(message)
+                continue
+            content: list[str | Image] = []
+            for item in message.content:
+                if not isinstance(item, Image):
+                    content.append(item)
+                    continue
+                images += 1
+                seen = self._see(item)
+                if previous is not None and self._same(item, seen, previous):
+                    replaced += 1
+                    content.append(UNCHANGED_SCREENSHOT)
+                else:
+                    content.append(seen.encoded)
+                    previous = item
+            deduplicated.append(UserMessage(content=content, source=message.source))
+        with self._lock:
+            self.images += images
+            self.deduplicated += replaced
+        return deduplicated
+
+    async def _deduplicate(self, messages: Sequence[LLMMessage]) -> list[LLMMessage]:
+        # Requests without images skip the thread hop
+        if not any(
+            isinstance(message, UserMessage)
+            and not isinstance(message.content, str)
+            and any(isinstance(item, Image) for item in message.content)
+            for message in messages
+        ):
+            return list(messages)
+        return await asyncio.to_thread(self.deduplicate, messages)
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        return await self.client.create(
+            await self._deduplicate(messages),
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        )
+
+    async def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        async for chunk in self.client.create_stream(
+            await self._deduplicate(messages),
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            yield chunk
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """The images seen in requests, and those replaced."""
+        return {"images": self.images, "deduplicated": self.deduplicated}
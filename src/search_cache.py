@@ -0,0 +1,261 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, NamedTuple, Sequence
+
+Embedder = Callable[[str], Awaitable[Sequence[float]]]
+
+
+class SearchCacheKey(NamedTuple):
+    """The identity of a cached search."""
+
+    index_name: str
+    query: str
+    k: int
+    fields: tuple[str, ...]
+    variant: str = ""
+    source: str = ""
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: float
+    embedding: Sequence[float] | None
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query so trivially different phrasings share a cache entry.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        str: The lowercased query with collapsed whitespace and no trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!.").strip().lower()
+
+
+def _cosine_similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class SearchResultCache:
+    """
+    A TTL and LRU bounded cache of RAG search results.
+
+    Entries are matched exactly on `SearchCacheKey`. If an `embedder` is given, a miss falls back
+    to the most similar cached query of the same index, `k` and fields whose cosine similarity is at
+    least `similarity_threshold`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 600,
+        embedder: Embedder | None = None,
+        similarity_threshold: float = 0.95,
+    ) -> None:
+        """
+        Args:
+            max_entries (int, optional): The maximum number of cached results. Defaults to 256.
+            ttl (float, optional): Seconds a result stays valid. Defaults to 600.
+            embedder (Embedder, optional): Embeds queries for the similarity tier. Defaults to None (exact matches only).
+            similarity_threshold (float, optional): The minimum cosine similarity of a similarity hit. Defaults to 0.95.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[SearchCacheKey, _Entry] = OrderedDict()
+        # The embedding of the last missed query, reused when its result is `put`
+        self._last_embedding: tuple[str, Sequence[float]] | None = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        index_name: str,
+        query: str,
+        k: int,
+        fields: Sequence[str],
+        variant: str = "",
+        source: str = "",
+    ) -> SearchCacheKey:
+        return SearchCacheKey(
+            index_name, normalize_query(query), k, tuple(fields), variant, source
+        )
+
+    async def get(
+        self,
+        index_name: str,
+        query: str,
+        k: int,
+        fields: Sequence[str],
+        variant: str = "",
+        source: str = "",
+    ) -> Any | None:
+        """
+        Looks up the result of a search.
+
+        Args:
+            index_name (str): The search index.
+            query (str): The query.
+            k (int): The number of nearest neighbors searched.
+            fields (Sequence[str]): The vector and selected fields of the search.
+            variant (str, optional): Any other search options that change the result. Defaults to "".
+            source (str, optional): The search service or index files searched, so indexes of the
+                same name elsewhere do not share results. Defaults to "".
+
+        Returns:
+            Any | None: The cached result, or None on a miss.
+        """
+        key = self.make_key(index_name, query, k, fields, variant, source)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if entry is not None:
+                del self._entries[key]
+
+        if self.embedder is not None:
+            embedding = await self.embedder(key.query)
+            with self._lock:
+                self._last_embedding = (key.query, embedding)
+                best_key, best_score = None, self.similarity_threshold
+                for candidate, entry in self._entries.items():
+                    if (
+                        entry.embedding is None
+                        or entry.expires_at <= now
+                        or candidate._replace(query=key.query) != key
+                    ):
+                        continue
+                    score = _cosine_similarity(embedding, entry.embedding)
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.semantic_hits += 1
+                    return self._entries[best_key].value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def put(
+        self,
+        index_name: str,
+        query: str,
+        k: int,
+        fields: Sequence[str],
+        value: Any,
+        variant: str = "",
+        source: str = "",
+    ) -> None:
+        """
+        Caches the result of a search, evicting the least recently used results beyond `max_entries`.
+
+        Args:
+            index_name (str): The search index.
+            query (str): The query.
+            k (int): The number of nearest neighbors searched.
+            fields (Sequence[str]): The vector and selected fields of the search.
+            value (Any): The result to cache.
+            variant (str, optional): Any other search options that change the result. Defaults to "".
+            source (str, optional): The search service or index files searched. Defaults to "".
+        """
+        key = self.make_key(index_name, query, k, fields, variant, source)
+        embedding = None
+        if self.embedder is not None:
+            with self._lock:
+                last = self._last_embedding
+            embedding = (
+                last[1]
+                if last is not None and last[0] == key.query
+                else await self.embedder(key.query)
+            )
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, source: str) -> int:
+        """
+        Drops the cached results of a search service or index, e.g. after it changed.
+
+        Args:
+            source (str): The `source` the results were cached with.
+
+        Returns:
+            int: The number of results dropped.
+        """
+        with self._lock:
+            stale = [key for key in self._entries if key.source == source]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self) -> None:
+        """Drops all cached results and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.semantic_hits = self.misses = self.evictions = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """The hit, similarity hit, miss and eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+
+_caches: dict[str | None, SearchResultCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_search_cache(embedder: str | None = None) -> SearchResultCache:
+    """
+    Returns the process-wide cache of RAG search results, shared by all RAG agents so cached results
+    outlive a single run, creating it on first use. Each embedder of the similarity tier has a cache
+    of its own.
+
+    Args:
+        embedder (str, optional): The embedder of the similarity tier, e.g.
+            `azure_openai:<deployment>:<dimensions>`, see `rag_embeddings.create_embedder`.
+            Defaults to None (exact matches only).
+
+    Returns:
+        SearchResultCache: The cache.
+    """
+    with _caches_lock:
+        cache = _caches.get(embedder)
+        if cache is None:
+            embed = None
+            if embedder is not None:
+                from rag_embeddings import create_embedder
+
+                query_embedder = create_embedder(embedder)
+
+                async def embed(query: str) -> Sequence[float]:
+                    return (await query_embedder.embed([query]))[0]
+
+            cache = _caches[embedder] = SearchResultCache(embedder=embed)
+        return cache
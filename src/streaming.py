@@ -0,0 +1,201 @@
+import asyncio
+import time
+import uuid
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from autogen_core import CancellationToken
+from autogen_core.models import ChatCompletionClient, CreateResult, LLMMessage
+from autogen_core.tools import Tool, ToolSchema
+from autogen_ext.models.openai import AzureOpenAIChatCompletionClient
+from pydantic import BaseModel
+
+from client_wrappers import DelegatingChatCompletionClient
+
+
+class ModelStreamChunk(BaseModel):
+    """
+    A piece of a model response while it is streamed, before the message of the agent with the
+    whole response. The chunks of one response share their `stream_id`.
+    """
+
+    source: str
+    stream_id: str
+    content: str
+    type: Literal["ModelStreamChunk"] = "ModelStreamChunk"
+
+
+class ModelStreamChannel:
+    """Carries the chunks streamed by the model clients of a run to `MagenticOneHelper.main`."""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[ModelStreamChunk] = asyncio.Queue()
+
+    def publish(self, chunk: ModelStreamChunk) -> None:
+        self.queue.put_nowait(chunk)
+
+
+class StreamingChatCompletionClient(DelegatingChatCompletionClient):
+    """
+    Serves `create` by streaming the response, so the agents that only call `create` still show their
+    response as it is produced: its text is published to `channel` in chunks of at most `interval`
+    seconds, and the complete result is returned as usual. JSON responses are not streamed.
+    """
+
+    def __init__(
+        self,
+        client: ChatCompletionClient,
+        source: str,
+        channel: ModelStreamChannel,
+        interval: float = 0.2,
+    ) -> None:
+        """
+        Args:
+            client (ChatCompletionClient): The client to wrap.
+            source (str): The name of the agent using the client, the chunks' `source`.
+            channel (ModelStreamChannel): Where the chunks are published.
+            interval (float, optional): Seconds the text is coalesced into one chunk, so fast streams do
+                not flood the run's events. Defaults to 0.2.
+        """
+        super().__init__(client)
+        self.source = source
+        self.channel = channel
+        self.interval = interval
+
+    async def create(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> CreateResult:
+        if json_output:
+            return await self.client.create(
+                messages,
+                tools=tools,
+                json_output=json_output,
+                extra_create_args=extra_create_args,
+                cancellation_token=cancellation_token,
+            )
+
+        stream_id = uuid.uuid4().hex
+        result: CreateResult | None = None
+        deltas: list[str] = []
+        pending: list[str] = []
+        # The first text is published right away, the rest coalesced
+        flushed_at = 0.0
+
+        def flush() -> None:
+            nonlocal flushed_at
+            if pending:
+                self.channel.publish(
+                    ModelStreamChunk(
+                        source=self.source,
+                        stream_id=stream_id,
+                        content="".join(pending),
+                    )
+                )
+                pending.clear()
+            flushed_at = time.monotonic()
+
+        async for chunk in self.client.create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args=extra_create_args,
+            cancellation_token=cancellation_token,
+        ):
+            if isinstance(chunk, CreateResult):
+                result = chunk
+                continue
+            deltas.append(chunk)
+            pending.append(chunk)
+            if time.monotonic() - flushed_at >= self.interval:
+                flush()
+        flush()
+
+        if result is None:
+            raise RuntimeError("The model stream ended without a result.")
+        # A stream of a single text chunk comes back without its text from some clients
+        if not result.content and deltas:
+            result.content = "".join(deltas)
+        return result
+
+
+class AzureOpenAIStreamingClient(AzureOpenAIChatCompletionClient):
+    """
+    An `AzureOpenAIChatCompletionClient` whose streams report their usage and tolerate the chunks without
+    choices Azure OpenAI sends, e.g. its content filter results and the final usage chunk.
+    """
+
+    def create_stream(
+        self,
+        messages: Sequence[LLMMessage],
+        *,
+        tools: Sequence[Tool | ToolSchema] = [],
+        json_output: Optional[bool] = None,
+        extra_create_args: Mapping[str, Any] = {},
+        cancellation_token: Optional[CancellationToken] = None,
+        max_consecutive_empty_chunk_tolerance: int = 10,
+    ) -> AsyncGenerator[Union[str, CreateResult], None]:
+        return super().create_stream(
+            messages,
+            tools=tools,
+            json_output=json_output,
+            extra_create_args={
+                "stream_options": {"include_usage": True},
+                **extra_create_args,
+            },
+            cancellation_token=cancellation_token,
+            max_consecutive_empty_chunk_tolerance=max_consecutive_empty_chunk_tolerance,
+        )
+
+
+async def merge_chunks(
+    stream: AsyncIterator[Any], channel: ModelStreamChannel
+) -> AsyncIterator[Any]:
+    """
+    Yields the items of `stream` and, as they are published, the chunks of `channel`. The chunks
+    published before an item are yielded before it.
+
+    Args:
+        stream (AsyncIterator[Any]): The stream, e.g. of a team run.
+        channel (ModelStreamChannel): The chunks.
+    """
+    next_item: asyncio.Future | None = None
+    next_chunk: asyncio.Future | None = None
+    try:
+        while True:
+            if next_item is None:
+                next_item = asyncio.ensure_future(anext(stream))
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(channel.queue.get())
+            done, _ = await asyncio.wait(
+                {next_item, next_chunk}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_chunk in done:
+                yield next_chunk.result()
+                next_chunk = None
+                continue
+            try:
+                item = next_item.result()
+            except StopAsyncIteration:
+                break
+            next_item = None
+            while not channel.queue.empty():
+                yield channel.queue.get_nowait()
+            yield item
+    finally:
+        for future in (next_item, next_chunk):
+            if future is not None and not future.done():
+                future.cancel()
@@ -0,0 +1,195 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+from azure.core.credentials import AccessToken
+from azure.core.credentials_async import AsyncTokenCredential
+from azure.identity.aio import AzureDeveloperCliCredential
+
+TokenKey = tuple[tuple[str, ...], str | None]
+
+
+class CachedTokenCredential:
+    """
+    An `AsyncTokenCredential` that caches the tokens of another credential in-process.
+
+    Tokens are refreshed in the background `refresh_margin` seconds (minus up to `jitter` seconds)
+    before they expire, and concurrent fetches of the same scopes share a single request. Once a
+    token has been fetched, callers are served from the cache and never wait on the wrapped
+    credential (e.g. the `azd auth token` subprocess) until the token actually expires.
+    """
+
+    def __init__(
+        self,
+        credential: AsyncTokenCredential,
+        refresh_margin: float = 300,
+        jitter: float = 60,
+    ) -> None:
+        """
+        Args:
+            credential (AsyncTokenCredential): The credential to fetch tokens with.
+            refresh_margin (float, optional): Seconds before expiry to refresh a token. Defaults to 300.
+            jitter (float, optional): Maximum random seconds to refresh earlier than the margin. Defaults to 60.
+        """
+        self.credential = credential
+        self.refresh_margin = refresh_margin
+        self.jitter = jitter
+
+        self._lock = threading.Lock()
+        self._tokens: dict[TokenKey, tuple[AccessToken, float]] = {}
+        self._inflight: dict[tuple[TokenKey, int], asyncio.Future[AccessToken]] = {}
+        self._timers: dict[tuple[TokenKey, int], asyncio.TimerHandle] = {}
+
+    async def get_token(
+        self,
+        *scopes: str,
+        claims: str | None = None,
+        tenant_id: str | None = None,
+        **kwargs: Any,
+    ) -> AccessToken:
+        # A claims challenge always needs a fresh token
+        if claims is not None:
+            return await self.credential.get_token(
+                *scopes, claims=claims, tenant_id=tenant_id, **kwargs
+            )
+
+        key: TokenKey = (scopes, tenant_id)
+        with self._lock:
+            cached = self._tokens.get(key)
+
+        now = time.time()
+        if cached is not None:
+            token, refresh_at = cached
+            if now < refresh_at:
+                return token
+            # Still valid: serve it and refresh in the background
+            if now < token.expires_on - 30:
+                self._fetch(key)
+                return token
+
+        return await asyncio.shield(self._fetch(key))
+
+    def peek_token(
+        self, *scopes: str, tenant_id: str | None = None
+    ) -> AccessToken | None:
+        """
+        Returns the cached, unexpired token for the scopes without fetching one.
+
+        Args:
+            *scopes (str): The scopes of the token.
+            tenant_id (str, optional): The tenant of the token. Defaults to None.
+
+        Returns:
+            AccessToken | None: The token, or None if none is cached.
+        """
+        with self._lock:
+            cached = self._tokens.get((scopes, tenant_id))
+        if cached is not None and time.time() < cached[0].expires_on - 30:
+            return cached[0]
+        return None
+
+    def bearer_token_provider(self, *scopes: str) -> Callable[[], Awaitable[str]]:
+        """
+        Returns a callable that provides a bearer token for the scopes, like `get_bearer_token_provider`.
+
+        Args:
+            *scopes (str): The scopes required for the bearer token.
+
+        Returns:
+            Callable[[], Awaitable[str]]: The token provider.
+        """
+
+        async def wrapper() -> str:
+            return (await self.get_token(*scopes)).token
+
+        return wrapper
+
+    def _fetch(self, key: TokenKey) -> asyncio.Future[AccessToken]:
+        """Starts a fetch for `key` on the running loop, or joins the one already in flight."""
+        loop = asyncio.get_running_loop()
+        slot = (key, id(loop))
+        with self._lock:
+            future = self._inflight.get(slot)
+            if future is not None and not future.done():
+                return future
+            future = loop.create_task(self._refresh(key))
+            # Background refreshes are not awaited; their errors surface on the next blocking fetch
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[slot] = future
+        return future
+
+    async def _refresh(self, key: TokenKey) -> AccessToken:
+        scopes, tenant_id = key
+        loop = asyncio.get_running_loop()
+        slot = (key, id(loop))
+        try:
+            token = await self.credential.get_token(*scopes, tenant_id=tenant_id)
+        finally:
+            with self._lock:
+                self._inflight.pop(slot, None)
+
+        lead = self.refresh_margin + random.uniform(0, self.jitter)
+        refresh_at = max(time.time(), token.expires_on - lead)
+        with self._lock:
+            self._tokens[key] = (token, refresh_at)
+            timer = self._timers.pop(slot, None)
+            if timer is not None:
+                timer.cancel()
+            self._timers[slot] = loop.call_at(
+                loop.time() + (refresh_at - time.time()), self._fetch, key
+            )
+        return token
+
+    async def close(self) -> None:
+        with self._lock:
+            timers = list(self._timers.values())
+            self._timers.clear()
+            self._tokens.clear()
+        for timer in timers:
+            timer.cancel()
+        await self.credential.close()
+
+    async def __aenter__(self) -> "CachedTokenCredential":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+
+_shared_lock = threading.Lock()
+_shared_credentials: dict[str | None, CachedTokenCredential] = {}
+
+
+def get_shared_credential(tenant_id: str | None = None) -> CachedTokenCredential:
+    """
+    Returns the process-wide cached `AzureDeveloperCliCredential` for the tenant.
+
+    Args:
+        tenant_id (str, optional): The Azure tenant ID. Defaults to None.
+
+    Returns:
+        CachedTokenCredential: The shared credential.
+    """
+    with _shared_lock:
+        credential = _shared_credentials.get(tenant_id)
+        if credential is None:
+            credential = CachedTokenCredential(
+                AzureDeveloperCliCredential()
+                if tenant_id is None
+                else AzureDeveloperCliCredential(
+                    tenant_id=tenant_id, process_timeout=60
+                )
+            )
+            _shared_credentials[tenant_id] = credential
+        return credential
+
+
+async def close_shared_credentials() -> None:
+    """Closes and forgets all shared credentials."""
+    with _shared_lock:
+        credentials = list(_shared_credentials.values())
+        _shared_credentials.clear()
+    for credential in credentials:
+        await credential.close()
@@ -1,5 +1,7 @@
 from datetime import datetime
+import io
 import random
+import PIL.Image
 import streamlit as st
 
 # Used for displaying messages from the agents
@@ -11,6 +13,14 @@ from autogen_agentchat.messages import (
 )
 from autogen_agentchat.base import TaskResult
 
+from streaming import ModelStreamChunk
+
+# The expanders shown of a run's events, and how many more "Show earlier messages" shows
+LOG_WINDOW = 20
+# The longest side and JPEG quality of the screenshot thumbnails
+THUMBNAIL_SIZE = 640
+THUMBNAIL_QUALITY = 80
+
 
 def generate_random_agent_emoji() -> str:
     emoji_list = ["🤖", "🔄", "😊", "🚀", "🌟", "🔥", "💡", "🎉", "👍"]
@@ -39,7 +49,170 @@ def get_agent_icon(agent_name: str) -> str:
     return agent_icon
 
 
-def display_log_message(log_entry, logs_dir):
+def get_event_source(log_entry) -> str | None:
+    # The agent whose expander shows the entry; None for entries without one, e.g. the TaskResult
+    if isinstance(log_entry, TaskResult):
+        return None
+    return getattr(log_entry, "source", None)
+
+
+def screenshot_thumbnail(image: PIL.Image.Image, size: int = THUMBNAIL_SIZE) -> bytes:
+    # A downsampled JPEG of the screenshot, a fraction of the full resolution PNG sent to the browser
+    thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((size, size))
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+class _EventGroup:
+    """Consecutive events of one agent, shown in one expander."""
+
+    def __init__(self, source: str, timestamp: float) -> None:
+        self.source = source
+        self.timestamp = timestamp
+        # (seq, message) pairs, or dicts with the text of a response being streamed
+        self.items: list = []
+        self.slot = None
+        self.body = None
+        self.placeholders: dict[int, object] = {}
+
+    @property
+    def rendered(self) -> bool:
+        return self.slot is not None
+
+
+class EventLog:
+    """
+    Renders the events of a run as they arrive, in a bounded window.
+
+    Consecutive events of an agent share one expander, and only the last `window` expanders are on
+    the page: older ones are removed as new ones arrive, and shown again on "Show earlier messages".
+    Screenshots are shown as thumbnails, with their full resolution on demand.
+    """
+
+    def __init__(self, run_id: str, logs_dir: str, window: int = LOG_WINDOW) -> None:
+        """
+        Args:
+            run_id (str): The run, which scopes the widget keys and the window size in the session state.
+            logs_dir (str): The logs directory of the run.
+            window (int, optional): The expanders shown until more are requested. Defaults to LOG_WINDOW.
+        """
+        self.run_id = run_id
+        self.logs_dir = logs_dir
+        self.window_key = f"log_window_{run_id}"
+        st.session_state.setdefault(self.window_key, window)
+        self.groups: list[_EventGroup] = []
+        # Drawn above the window, and once something is hidden
+        self.earlier = st.empty()
+        self.show_more = st.empty()
+        self.has_show_more = False
+        self.container = st.container()
+
+    @property
+    def window(self) -> int:
+        return st.session_state[self.window_key]
+
+    def extend(self, events: list) -> None:
+        """
+        Adds the events of the run, and renders those that end up in the window. The backlog of a
+        run, e.g. after a rerun, is added at once, so its events that would be hidden right away are
+        never drawn.
+
+        Args:
+            events (list): The new `RunEvent`s, in order.
+        """
+        for event in events:
+            self._add(event)
+        for group in self.groups[-self.window :]:
+            if not group.rendered:
+                self._render(group)
+        self._evict()
+        self._update_earlier()
+
+    def _add(self, event) -> None:
+        message = event.message
+        source = get_event_source(message)
+        if source is None:
+            display_log_message(message, self.logs_dir)
+            return
+
+        group = self.groups[-1] if self.groups else None
+        if group is None or group.source != source:
+            group = _EventGroup(source, event.timestamp)
+            self.groups.append(group)
+
+        last = group.items[-1] if group.items else None
+        streaming = isinstance(last, dict)
+        if isinstance(message, ModelStreamChunk):
+            if not streaming:
+                last = {"stream_id": message.stream_id, "text": ""}
+                group.items.append(last)
+            elif last["stream_id"] != message.stream_id:
+                # Further responses of the agent until its message continue the same text
+                last["stream_id"] = message.stream_id
+                last["text"] += "\n\n"
+            last["text"] += message.content
+        elif streaming:
+            # The message of an agent whose response was streamed replaces the streamed text
+            group.items[-1] = (event.seq, message)
+        else:
+            group.items.append((event.seq, message))
+
+        if group.body is not None:
+            self._render_item(group, len(group.items) - 1)
+
+    def _render(self, group: _EventGroup) -> None:
+        with self.container:
+            group.slot = st.empty()
+        agent_icon = get_agent_icon(group.source)
+        timestamp = datetime.fromtimestamp(group.timestamp).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        group.body = group.slot.expander(
+            f"{agent_icon} {group.source} @ {timestamp}", expanded=True
+        )
+        for index in range(len(group.items)):
+            self._render_item(group, index)
+
+    def _render_item(self, group: _EventGroup, index: int) -> None:
+        placeholder = group.placeholders.get(index)
+        if placeholder is None:
+            placeholder = group.placeholders[index] = group.body.empty()
+        item = group.items[index]
+        if isinstance(item, dict):
+            placeholder.markdown(item["text"] + " ▌")
+            return
+        seq, message = item
+        with placeholder.container():
+            display_log_message(message, self.logs_dir, key=f"{self.run_id}_{seq}")
+
+    def _evict(self) -> None:
+        rendered = [group for group in self.groups if group.rendered]
+        for group in rendered[: max(0, len(rendered) - self.window)]:
+            group.slot.empty()
+            group.slot = group.body = None
+            group.placeholders.clear()
+
+    def _update_earlier(self) -> None:
+        hidden = sum(len(group.items) for group in self.groups if not group.rendered)
+        if not hidden:
+            return
+        self.earlier.caption(f"{hidden} earlier messages are collapsed.")
+        if not self.has_show_more:
+            # Created once, as a widget must not be drawn twice in a script run
+            self.has_show_more = True
+            self.show_more.button(
+                "Show earlier messages",
+                key=f"show_more_{self.run_id}",
+                on_click=self._show_more,
+            )
+
+    def _show_more(self) -> None:
+        st.session_state[self.window_key] += LOG_WINDOW
+
+
+def display_log_message(log_entry, logs_dir, key: str | None = None):
     # _log_entry_json  = json.loads(log_entry)
     _log_entry_json = log_entry
 
@@ -50,12 +223,13 @@ def display_log_message(log_entry, logs_dir):
         # display last message
         _type = "TaskResult"
         _source = "TaskResult"
-        _content = _log_entry_json.messages[-1]
+        # A cancelled run may end before any message
+        _content = _log_entry_json.messages[-1] if _log_entry_json.messages else None
         _stop_reason = _log_entry_json.stop_reason
         _timestamp = get_current_time()
         icon_result = "🎯"
         # do not display the final answer just yet, only set it in the session state
-        st.session_state["final_answer"] = _content.content
+        st.session_state["final_answer"] = _content.content if _content else None
         st.session_state["stop_reason"] = _stop_reason
 
     elif isinstance(_log_entry_json, MultiModalMessage):
@@ -67,11 +241,16 @@ def display_log_message(log_entry, logs_dir):
         _content = _log_entry_json.content
         _timestamp = get_current_time()
 
-        agent_icon = get_agent_icon(_source)
-        with st.expander(f"{agent_icon} {_source} @ {_timestamp}", expanded=True):
-            st.write("Message:")
-            st.write(_content[0])
+        st.write("Message:")
+        st.write(_content[0])
+        # Screenshots are sent as thumbnails unless their full resolution is asked for
+        _full_resolution = key is not None and st.toggle(
+            "Full resolution", key=f"full_resolution_{key}"
+        )
+        if _full_resolution:
             st.image(_content[1].image)
+        else:
+            st.image(screenshot_thumbnail(_content[1].image))
 
     elif isinstance(_log_entry_json, TextMessage):
         # message type, e.g.: TextMessage,'MultiModalMessage'
@@ -82,10 +261,8 @@ def display_log_message(log_entry, logs_dir):
         _content = _log_entry_json.content
         _timestamp = get_current_time()
 
-        agent_icon = get_agent_icon(_source)
-        with st.expander(f"{agent_icon} {_source} @ {_timestamp}", expanded=True):
-            st.write("Message:")
-            st.write(_content)
+        st.write("Message:")
+        st.write(_content)
     elif isinstance(_log_entry_json, ToolCallExecutionEvent):
         # message type, ToolCallRequestEvent, ToolCallExecutionEvent
         _type = _log_entry_json.type
@@ -95,10 +272,8 @@ def display_log_message(log_entry, logs_dir):
         _content = _log_entry_json.content
         _timestamp = get_current_time()
 
-        agent_icon = get_agent_icon(_source)
-        with st.expander(f"{agent_icon} {_source} @ {_timestamp}", expanded=True):
-            st.write("Message:")
-            st.write(_content)
+        st.write("Message:")
+        st.write(_content)
 
     elif isinstance(_log_entry_json, ToolCallRequestEvent):
         # message type, ToolCallRequestEvent, ToolCallExecutionEvent
@@ -110,9 +285,7 @@ def display_log_message(log_entry, logs_dir):
         _timestamp = get_current_time()
         _models_usage = _log_entry_json.models_usage
 
-        agent_icon = get_agent_icon(_source)
-        with st.expander(f"{agent_icon} {_source} @ {_timestamp}", expanded=True):
-            st.write("Message:")
-            st.write(_content)
+        st.write("Message:")
+        st.write(_content)
     else:
         st.caption("🤔 Agents mumbling...")
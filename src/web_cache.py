@@ -0,0 +1,383 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Mapping
+
+from playwright.async_api import Request, Route
+
+# The statuses whose responses may be stored, given explicit freshness or a validator
+CACHEABLE_STATUSES = {200, 203, 300, 301, 308, 404, 410}
+
+# Headers describing the transfer rather than the stored (decoded) body
+_TRANSFER_HEADERS = {
+    "connection",
+    "content-encoding",
+    "content-length",
+    "keep-alive",
+    "transfer-encoding",
+}
+
+
+def cache_control(value: str | None) -> dict[str, str | None]:
+    """
+    Parses a `Cache-Control` header.
+
+    Args:
+        value (str, optional): The header.
+
+    Returns:
+        dict[str, str | None]: The directives, lowercased, with their argument if they have one.
+    """
+    directives: dict[str, str | None] = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def freshness(status: int, headers: Mapping[str, str]) -> float | None:
+    """
+    Returns for how long a response may be served without asking the server, following its cache
+    headers as a shared cache does (the pool's contexts belong to different runs).
+
+    Args:
+        status (int): The response's status.
+        headers (Mapping[str, str]): The response's headers, with lowercase names.
+
+    Returns:
+        float | None: The seconds it stays fresh, 0 if it must be revalidated before every use, or
+            None if it must not be stored.
+    """
+    directives = cache_control(headers.get("cache-control"))
+    if (
+        status not in CACHEABLE_STATUSES
+        or "no-store" in directives
+        or "private" in directives
+        or "set-cookie" in headers
+    ):
+        return None
+    vary = {field.strip().lower() for field in headers.get("vary", "").split(",")}
+    # The cache is keyed on the URL alone
+    if vary - {"", "accept-encoding"}:
+        return None
+
+    lifetime = None
+    for directive in ("s-maxage", "max-age"):
+        if directive in directives:
+            try:
+                lifetime = float(directives[directive])
+            except (TypeError, ValueError):
+                lifetime = 0
+            break
+    if lifetime is None and "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+            date = (
+                parsedate_to_datetime(headers["date"]).timestamp()
+                if "date" in headers
+                else time.time()
+            )
+            lifetime = expires - date
+        except (TypeError, ValueError):
+            lifetime = 0
+    if "no-cache" in directives:
+        lifetime = 0
+    if lifetime is not None:
+        try:
+            lifetime -= float(headers.get("age", 0))
+        except ValueError:
+            pass
+        lifetime = max(lifetime, 0)
+
+    validated = "etag" in headers or "last-modified" in headers
+    if not lifetime and not validated:
+        return None
+    return lifetime or 0
+
+
+@dataclass
+class CachedResponse:
+    """A response stored by the `HttpCache`."""
+
+    url: str
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+
+class HttpCache:
+    """
+    A SQLite-backed cache of the responses the pool's browser contexts load, bounded to `max_bytes` by
+    evicting the least recently used ones, so pages revisited across runs (the start page, documentation
+    sites) load from disk.
+
+    Only GET responses that their headers allow a shared cache to store are kept (see `freshness`).
+    Fresh responses are served without a request; stale ones with an `ETag` or `Last-Modified` are
+    revalidated, and a `304 Not Modified` answer serves the stored body. Install it on a context with
+    `route`. It is safe to use from several threads, and from several processes through SQLite's
+    locking.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_entry_bytes: int = 8 * 1024 * 1024,
+    ) -> None:
+        """
+        Args:
+            path (str | Path): The database file, created if it does not exist.
+            max_bytes (int, optional): The total size of the stored bodies. Defaults to 256 MiB.
+            max_entry_bytes (int, optional): The largest body stored. Defaults to 8 MiB.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, "
+            "headers TEXT NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)"
+        )
+        self._db.commit()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url: str) -> CachedResponse | None:
+        """Returns the response stored for `url`, fresh or not, or None."""
+        key = self.key(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, body, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._db.commit()
+        status, headers, body, expires_at = row
+        return CachedResponse(url, status, json.loads(headers), body, expires_at)
+
+    def put(self, response: CachedResponse) -> None:
+        """Stores a response, replacing any previous one for its URL, and evicts old ones if needed."""
+        if len(response.body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(response.url),
+                    response.url,
+                    response.status,
+                    json.dumps(response.headers),
+                    response.body,
+                    len(response.body),
+                    response.expires_at,
+                    time.time(),
+                ),
+            )
+            self.stored += 1
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url: str, expires_at: float, headers: Mapping[str, str]) -> None:
+        """Extends the freshness of a revalidated response, updating its headers."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT headers FROM responses WHERE key = ?", (self.key(url),)
+            ).fetchone()
+            if row is None:
+                return
+            stored = {**json.loads(row[0]), **_stored_headers(headers)}
+            self._db.execute(
+                "UPDATE responses SET headers = ?, expires_at = ? WHERE key = ?",
+                (json.dumps(stored), expires_at, self.key(url)),
+            )
+            self._db.commit()
+
+    def _evict(self) -> None:
+        # Called with the lock held; evicts down to 90% so not every `put` has to evict
+        (size,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if size <= self.max_bytes:
+            return
+        target = size - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, entry_size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY used_at"
+        ):
+            if freed >= target:
+                break
+            keys.append((key,))
+            freed += entry_size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self.evictions += len(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def clear(self) -> None:
+        """Drops all stored responses and resets the counters."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self.hits = self.revalidated = self.misses = 0
+            self.stored = self.evictions = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """The hit, revalidation, miss, store and eviction counters."""
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "stored": self.stored,
+            "evictions": self.evictions,
+        }
+
+    async def route(self, route: Route, request: Request) -> None:
+        """
+        The handler of a context's requests: `await context.route("**/*", cache.route)`.
+
+        Args:
+            route (Route): The intercepted route.
+            request (Request): Its request.
+        """
+        request_directives = cache_control(request.headers.get("cache-control"))
+        if (
+            request.method != "GET"
+            or not request.url.startswith(("http://", "https://"))
+            or "authorization" in request.headers
+            or "no-store" in request_directives
+        ):
+            await route.fallback()
+            return
+
+        cached = None
+        if "no-cache" not in request_directives:
+            cached = await asyncio.to_thread(self.get, request.url)
+        if cached is not None and cached.fresh:
+            self.hits += 1
+            await route.fulfill(
+                status=cached.status, headers=cached.headers, body=cached.body
+            )
+            return
+
+        headers = None
+        if cached is not None:
+            validators = {}
+            if "etag" in cached.headers:
+                validators["if-none-match"] = cached.headers["etag"]
+            if "last-modified" in cached.headers:
+                validators["if-modified-since"] = cached.headers["last-modified"]
+            if validators:
+                headers = {**request.headers, **validators}
+        try:
+            response = await route.fetch(headers=headers)
+        except Exception:
+            # The page went away, or the network failed; the browser reports it as for any request
+            try:
+                await route.abort("failed")
+            except Exception:
+                pass
+            return
+
+        if response.status == 304 and cached is not None:
+            self.revalidated += 1
+            lifetime = freshness(cached.status, {**cached.headers, **response.headers})
+            await asyncio.to_thread(
+                self.refresh,
+                request.url,
+                time.time() + (lifetime or 0),
+                response.headers,
+            )
+            await route.fulfill(
+                status=cached.status, headers=cached.headers, body=cached.body
+            )
+            return
+
+        self.misses += 1
+        lifetime = freshness(response.status, response.headers)
+        if lifetime is not None:
+            await asyncio.to_thread(
+                self.put,
+                CachedResponse(
+                    request.url,
+                    response.status,
+                    _stored_headers(response.headers),
+                    await response.body(),
+                    time.time() + lifetime,
+                ),
+            )
+        await route.fulfill(response=response)
+
+
+def _stored_headers(headers: Mapping[str, str]) -> dict[str, str]:
+    # The body is stored decoded, so its encoding and length headers no longer apply
+    return {
+        name: value
+        for name, value in headers.items()
+        if name.lower() not in _TRANSFER_HEADERS
+    }
+
+
+_caches: dict[Path, HttpCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_http_cache(path: str | Path, **options: Any) -> HttpCache:
+    """
+    Returns the process-wide `HttpCache` of a database file, opening it on first use.
+
+    Args:
+        path (str | Path): The database file.
+        **options (Any): Passed to `HttpCache`.
+
+    Returns:
+        HttpCache: The cache.
+    """
+    path = Path(path).resolve()
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = HttpCache(path, **options)
+            atexit.register(cache.close)
+        return cache